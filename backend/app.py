@@ -1,61 +1,367 @@
 # backend/app.py
+import atexit
 import os
 import random
 import string
+import threading
+import time
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
-from flask import Flask, jsonify, request
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, request
 from flask_cors import CORS
 from flask_jwt_extended import (
-    JWTManager, create_access_token,
-    jwt_required, get_jwt_identity, decode_token
+    create_access_token, jwt_required,
+    get_jwt_identity, decode_token
 )
 from flask_mail import Mail, Message
-from flask_socketio import SocketIO, emit, join_room
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from marshmallow import ValidationError
 
-from db import (
-    add_recent_room, delete_otp, get_messages,
-    get_otp, get_recent_rooms, get_user,
-    otps_collection, save_message, save_otp,
-    save_user, users_collection
+import db
+from broadcast_batcher import create_broadcast_batcher
+from data_store import create_data_store
+from history_cache import HistoryCache, create_history_cache
+from history_export import export_chunks, gzip_chunks
+from indexes import ensure_indexes
+from inprocess_manager import InProcessManager
+from logging_pipeline import configure_logging, log_event
+from mail_dispatcher import MailDispatcher
+from password_pool import PasswordPoolBusy, create_password_pool, needs_rehash
+from presence import create_presence_broadcaster, create_presence_index
+from rate_limiter import create_rate_limiter
+from recent_rooms import create_recent_rooms_writer
+from message_writer import create_message_writer
+from metrics import (
+    http_request_seconds, http_requests_total, registry,
+    smtp_send_seconds, socketio_event_seconds
 )
+from outbound_limits import create_outbound_limiter
 from schemas import LoginSchema, RegisterSchema
-
-# Load environment variables from .env
-load_dotenv()
-
-# Initialize Flask app
-app = Flask(__name__)
-
-# Configuration
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
-app.config['MAIL_SERVER'] = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-app.config['MAIL_PORT'] = int(os.getenv('SMTP_PORT', 587))
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = os.getenv('SMTP_USERNAME')
-app.config['MAIL_PASSWORD'] = os.getenv('SMTP_PASSWORD')
-app.config['MAIL_DEFAULT_SENDER'] = os.getenv('SMTP_USERNAME')
-
-# Initialize Flask-Mail
-mail = Mail(app)
-
-# Configure CORS
-CORS(app, resources={
-    r"/api/*": {
-        "origins": "http://localhost:5173",
-        "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
-        "expose_headers": ["Content-Type", "Authorization"]
+from search import highlight, query_terms
+from serialization import SerializedMessage, SocketJSON, encode_history_page, serialize_messages
+from session_store import create_session_store
+from token_cache import CachingJWTManager
+
+# Bound to an app by create_app(); the handlers below are registered on them
+socketio = SocketIO(json=SocketJSON)
+api = Blueprint('api', __name__)
+
+# Caches verified claims for socket connects and protected routes. Set
+# jwt.token_cache.is_revoked to enforce revocation.
+jwt = CachingJWTManager()
+
+# Largest delta sent to a client resuming from a message it already has;
+# beyond this it gets a fresh page instead
+RESUME_MAX_MESSAGES = int(os.getenv('RESUME_MAX_MESSAGES', 200))
+
+
+def config_from_env():
+    """Settings read from the environment (and .env, loaded by db)."""
+    return {
+        'SECRET_KEY': os.getenv('SECRET_KEY'),
+        'JWT_SECRET_KEY': os.getenv('JWT_SECRET_KEY'),
+        'MAIL_SERVER': os.getenv('SMTP_SERVER', 'smtp.gmail.com'),
+        'MAIL_PORT': int(os.getenv('SMTP_PORT', 587)),
+        'MAIL_USE_TLS': os.getenv('SMTP_USE_TLS', 'true').lower() == 'true',
+        'MAIL_USERNAME': os.getenv('SMTP_USERNAME'),
+        'MAIL_PASSWORD': os.getenv('SMTP_PASSWORD'),
+        'MAIL_DEFAULT_SENDER': os.getenv('SMTP_USERNAME'),
+        # MAIL_DISPATCHER_WORKERS=0 sends emails inline instead
+        'MAIL_DISPATCHER_WORKERS': int(os.getenv('MAIL_DISPATCHER_WORKERS', 2)),
+        # threading by default; serve.py switches to gevent after monkey-patching.
+        'SOCKETIO_ASYNC_MODE': os.getenv('SOCKETIO_ASYNC_MODE', 'threading'),
+        # Message queue shared by all workers and nodes (e.g.
+        # redis://localhost:6379/0). memory:// uses an in-process fake queue,
+        # for running several servers in one process.
+        'SOCKETIO_MESSAGE_QUEUE': os.getenv('SOCKETIO_MESSAGE_QUEUE'),
+        # memory:// for the in-memory data layer, empty for MongoDB. An
+        # object with the functions of db.py is used as it is.
+        'DATA_STORE': os.getenv('DATA_STORE_URL', ''),
+        # Full-text search (/api/search) needs one document per message, so
+        # it must be turned off with MESSAGE_STORAGE=buckets
+        'MESSAGE_SEARCH': os.getenv('MESSAGE_SEARCH', '1') == '1',
+        # Index the collections and start the mail dispatcher in the
+        # background right after startup
+        'WARM_UP': os.getenv('WARM_UP', '1') == '1',
     }
-}, supports_credentials=True)
 
-# Initialize SocketIO with specific CORS settings
-socketio = SocketIO(app, cors_allowed_origins="http://localhost:5173")
 
-# Initialize JWT Manager
-jwt = JWTManager(app)
+class _component:
+    """A ChatServices attribute built by the decorated method on first access."""
+
+    def __init__(self, build):
+        self.build = build
+        self.name = build.__name__
+        self.__doc__ = build.__doc__
+
+    def __get__(self, services, owner=None):
+        if services is None:
+            return self
+        # Once built, the instance attribute shadows this descriptor
+        with services._lock:
+            if self.name not in services.__dict__:
+                services.__dict__[self.name] = self.build(services)
+        return services.__dict__[self.name]
+
+
+class ChatServices:
+    """
+    The components of one app, reached through services(). Those that start
+    threads or open connections are built on first use, so creating the app
+    stays cheap and a worker only pays for what its traffic needs.
+    """
+
+    def __init__(self, app, store):
+        self.app = app
+        self.store = store
+        self.startup_seconds = 0.0
+        self.first_request_seconds = 0.0
+        self.outbound_limiter = None
+        self._lock = threading.RLock()
+
+    @_component
+    def mail(self):
+        """Flask-Mail, used to send inline when the dispatcher is disabled."""
+        return Mail(self.app)
+
+    @_component
+    def mail_dispatcher(self):
+        """Background mail dispatcher with persistent SMTP connections, or None."""
+        config = self.app.config
+        if config['MAIL_DISPATCHER_WORKERS'] <= 0:
+            return None
+        dispatcher = MailDispatcher(
+            host=config['MAIL_SERVER'],
+            port=config['MAIL_PORT'],
+            sender=config['MAIL_DEFAULT_SENDER'],
+            use_tls=config['MAIL_USE_TLS'],
+            username=config['MAIL_USERNAME'],
+            password=config['MAIL_PASSWORD'],
+            workers=config['MAIL_DISPATCHER_WORKERS'],
+            store=self.store
+        )
+        dispatcher.start()
+        atexit.register(dispatcher.stop)
+        return dispatcher
+
+    @_component
+    def password_pool(self):
+        """Process pool for password hashing, forked on first use (PASSWORD_POOL_SIZE=0 hashes inline)."""
+        pool = create_password_pool()
+        pool.start()
+        atexit.register(pool.shutdown)
+        return pool
+
+    @_component
+    def history_cache(self):
+        """
+        The newest messages of each room. Disabled when workers share a
+        message queue, since it only sees the messages sent through this app.
+        """
+        if self.app.config['SOCKETIO_MESSAGE_QUEUE']:
+            return HistoryCache(per_room=0)
+        return create_history_cache()
+
+    @_component
+    def recent_rooms_writer(self):
+        """
+        Debounced recent-room writes. Written through when workers share a
+        message queue, since unwritten joins are only seen by this app.
+        """
+        flush_interval = 0 if self.app.config['SOCKETIO_MESSAGE_QUEUE'] else None
+        writer = create_recent_rooms_writer(self.store, flush_interval)
+        atexit.register(writer.stop)
+        return writer
+
+    @_component
+    def message_writer(self):
+        """Write-behind persistence for chat messages (None unless MESSAGE_WRITE_BEHIND is set)."""
+        writer = create_message_writer(on_failure=self._handle_failed_write, store=self.store)
+        if writer:
+            atexit.register(writer.stop)
+        return writer
+
+    def _handle_failed_write(self, msg):
+        """Tells the room that a write-behind message could not be saved."""
+        # The cached history contains the lost message; drop it so the next
+        # read comes from the data store.
+        self.history_cache.invalidate(msg['roomid'])
+        socketio.emit('message_failed', {'id': str(msg['_id'])}, room=msg['roomid'])
+
+    @_component
+    def broadcast_batcher(self):
+        """Coalesces bursts in hot rooms into receive_messages frames (None unless BROADCAST_BATCHING is set)."""
+        batcher = create_broadcast_batcher(socketio.emit)
+        if batcher:
+            atexit.register(batcher.stop)
+        return batcher
+
+    @_component
+    def rate_limiter(self):
+        """
+        Token buckets for socket events and auth endpoints, shared between
+        workers when RATE_LIMIT_STORE_URL points at Redis (None if
+        RATE_LIMITING=0).
+        """
+        return create_rate_limiter()
+
+    @_component
+    def users(self):
+        """
+        Store mapping session ids to users, shared between workers when
+        SESSION_STORE_URL points at Redis.
+        """
+        return create_session_store()
+
+    @_component
+    def presence(self):
+        """
+        Room members counted per session, shared between workers when
+        PRESENCE_STORE_URL (or SESSION_STORE_URL) points at Redis.
+        """
+        return create_presence_index()
+
+    @_component
+    def presence_broadcaster(self):
+        """Coalesces joins and leaves into presence_delta events, one per room and PRESENCE_WINDOW."""
+        broadcaster = create_presence_broadcaster(socketio.emit, count=self.presence.count)
+        atexit.register(broadcaster.stop)
+        return broadcaster
+
+    @_component
+    def register_schema(self):
+        return RegisterSchema()
+
+    @_component
+    def login_schema(self):
+        return LoginSchema()
+
+
+def services():
+    """The ChatServices of the current app."""
+    return current_app.extensions['vibee']
+
+
+def _warm_up(chat):
+    """
+    Connects to MongoDB, makes sure it is indexed (idempotent), and starts
+    the mail dispatcher and the password hashing workers.
+    """
+    if chat.store is db:
+        ensure_indexes()
+    chat.mail_dispatcher
+    chat.password_pool
+
+
+def create_app(config=None):
+    """
+    Builds the chat app.
+
+    Nothing here connects to MongoDB, Redis or an SMTP server: those
+    components are created on first use, or by a background warm-up task
+    right after startup (WARM_UP).
+
+    Args:
+        config (dict): Settings applied on top of config_from_env(), e.g.
+            {'DATA_STORE': 'memory://', 'WARM_UP': False} for a test app.
+
+    Returns:
+        Flask: The app; serve it with socketio.run(app).
+    """
+    started = time.perf_counter()
+    # Log records are written by a background thread, flushed at exit
+    configure_logging()
+
+    app = Flask(__name__)
+    app.config.from_mapping(config_from_env())
+    app.config.update(config or {})
+
+    # Configure CORS
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": "http://localhost:5173",
+            "methods": ["GET", "POST", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization"],
+            "expose_headers": ["Content-Type", "Authorization"]
+        }
+    }, supports_credentials=True)
+
+    # init_app() keeps the options of earlier calls, so the queue settings are
+    # always given, or an app would inherit the queue of the previous one.
+    socketio_options = {
+        'async_mode': app.config['SOCKETIO_ASYNC_MODE'],
+        'message_queue': None,
+        'client_manager': None,
+    }
+    message_queue = app.config['SOCKETIO_MESSAGE_QUEUE']
+    if message_queue == 'memory://':
+        socketio_options['client_manager'] = InProcessManager()
+    elif message_queue:
+        # Without client_manager, Flask-SocketIO builds one for the URL
+        socketio_options['message_queue'] = message_queue
+        del socketio_options['client_manager']
+
+    # Initialize SocketIO with specific CORS settings
+    socketio.init_app(app, cors_allowed_origins="http://localhost:5173", **socketio_options)
+    jwt.init_app(app)
+    app.register_blueprint(api)
+
+    store = app.config['DATA_STORE']
+    if isinstance(store, str):
+        store = create_data_store(store)
+    if store.MESSAGE_STORAGE == 'buckets' and app.config['MESSAGE_SEARCH']:
+        # Fail at startup rather than on every search request
+        raise ValueError("Bucketed message storage cannot be searched; set MESSAGE_SEARCH=0")
+    chat = app.extensions['vibee'] = ChatServices(app, store)
+
+    # Bounds the frames queued for each connection so a slow client cannot grow
+    # the server's memory (disabled with OUTBOUND_MAX_MESSAGES=0)
+    chat.outbound_limiter = create_outbound_limiter(socketio.server)
+
+    registry.gauge('vibee_socketio_connections', 'Open Socket.IO connections in this process',
+                   lambda: len(socketio.server.eio.sockets))
+    registry.gauge('vibee_socketio_rooms', 'Chat rooms with members in this process', count_rooms)
+    registry.gauge('vibee_history_cache_hits', 'History reads served from the cache since startup',
+                   lambda: chat.history_cache.hits)
+    registry.gauge('vibee_history_cache_misses', 'History reads that went to the data store since startup',
+                   lambda: chat.history_cache.misses)
+    registry.gauge('vibee_history_cache_evictions', 'Rooms evicted from the history cache since startup',
+                   lambda: chat.history_cache.evictions)
+    registry.gauge('vibee_history_cache_rooms', 'Rooms held in the history cache',
+                   lambda: chat.history_cache.stats()['rooms'])
+    registry.gauge('vibee_history_cache_bytes', 'Bytes of messages held in the history cache',
+                   lambda: chat.history_cache.stats()['bytes'])
+    registry.gauge('vibee_token_cache_hits', 'Tokens accepted from the verified-claims cache since startup',
+                   lambda: jwt.token_cache.hits)
+    registry.gauge('vibee_token_cache_misses', 'Tokens that needed a signature check since startup',
+                   lambda: jwt.token_cache.misses)
+    registry.gauge('vibee_token_cache_evictions', 'Claims evicted from the verified-claims cache since startup',
+                   lambda: jwt.token_cache.evictions)
+    registry.gauge('vibee_token_cache_entries', 'Verified claims held in the cache',
+                   lambda: jwt.token_cache.stats()['entries'])
+    if chat.outbound_limiter:
+        limiter = chat.outbound_limiter
+        registry.gauge('vibee_outbound_queued_messages', 'Frames queued for all connections',
+                       lambda: sum(c['messages'] for c in limiter.stats()['connections'].values()))
+        registry.gauge('vibee_outbound_queued_bytes', 'Bytes queued for all connections',
+                       lambda: sum(c['bytes'] for c in limiter.stats()['connections'].values()))
+        registry.gauge('vibee_outbound_max_queue_depth', 'Frames queued for the most backed-up connection',
+                       lambda: max((c['messages'] for c in limiter.stats()['connections'].values()), default=0))
+        registry.gauge('vibee_outbound_dropped_messages', 'Frames dropped for slow consumers since startup',
+                       lambda: limiter.dropped)
+        registry.gauge('vibee_outbound_disconnects', 'Slow consumers disconnected since startup',
+                       lambda: limiter.disconnects)
+    registry.gauge('vibee_startup_seconds', 'Time spent in create_app()',
+                   lambda: chat.startup_seconds)
+    registry.gauge('vibee_first_request_seconds', 'Latency of the first HTTP request served',
+                   lambda: chat.first_request_seconds)
+
+    if app.config['WARM_UP']:
+        socketio.start_background_task(_warm_up, chat)
+
+    chat.startup_seconds = time.perf_counter() - started
+    return app
 
 
 # Utility Functions
@@ -64,36 +370,126 @@ def generate_otp(length=6):
     return ''.join(random.choices(string.digits, k=length))
 
 def send_otp_via_email(email, otp):
-    """Sends OTP to the user's email."""
+    """Sends OTP to the user's email, or queues it when the dispatcher runs."""
     subject = 'Your OTP Code for ViBee'
     body = f'Your OTP code is {otp}. It expires in 10 minutes.'
 
+    chat = services()
+    if chat.mail_dispatcher:
+        return chat.mail_dispatcher.enqueue(email, subject, body)
+
+    mail = chat.mail  # Message() reads the default sender from the extension
     msg = Message(subject=subject, recipients=[email], body=body)
 
+    started = time.perf_counter()
     try:
         mail.send(msg)
-        print(f"OTP sent to {email}")
+        smtp_send_seconds.labels('ok').observe(time.perf_counter() - started)
+        log_event(current_app.logger, 'otp_sent', email=email)
         return True
     except Exception as e:
-        print(f"Failed to send OTP: {e}")
+        smtp_send_seconds.labels('error').observe(time.perf_counter() - started)
+        current_app.logger.error("Failed to send OTP: %s", e)
         return False
 
-# Dictionary to store user sessions
-users = {}
-
-# Initialize Schemas
-register_schema = RegisterSchema()
-login_schema = LoginSchema()
+def check_rate_limit(event, **identities):
+    """Returns a 429 response if the caller is over its limit for `event`, else None."""
+    rate_limiter = services().rate_limiter
+    if rate_limiter is None:
+        return None
+    retry_after = rate_limiter.check(event, ip=request.remote_addr, **identities)
+    if retry_after is None:
+        return None
+    response = jsonify({'msg': 'Too many requests, please try again later', 'retry_after': round(retry_after, 3)})
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response, 429
+
+def socket_rate_limited(event, username):
+    """Emits rate_limited to the caller and returns True if it is over its limit for `event`."""
+    rate_limiter = services().rate_limiter
+    if rate_limiter is None:
+        return False
+    retry_after = rate_limiter.check(event, sid=request.sid, user=username)
+    if retry_after is None:
+        return False
+    emit('rate_limited', {'event': event, 'retry_after': round(retry_after, 3)})
+    return True
+
+def load_messages(roomid, limit):
+    """
+    Loads and serializes the newest messages of a room from the data store,
+    including write-behind messages that have not been saved yet.
+    """
+    chat = services()
+    # Taken before the read: a message saved in between is in the read
+    # instead, and duplicates are dropped below.
+    unsaved = chat.message_writer.unsaved(roomid) if chat.message_writer else []
+    documents = chat.store.get_messages(roomid, limit=limit)
+    if unsaved:
+        merged = {document['_id']: document for document in documents}
+        merged.update((document['_id'], document) for document in unsaved)
+        documents = sorted(merged.values(), key=lambda document: (document['timestamp'], document['_id']))[-limit:]
+    return serialize_messages(documents)
+
+def load_messages_since(roomid, since):
+    """
+    Loads the messages of a room newer than the message id `since`, or
+    returns None if the client has to resync (unknown id or too large a gap).
+    """
+    try:
+        message_id = ObjectId(since)
+    except (InvalidId, TypeError):
+        return None
+
+    chat = services()
+    messages = chat.history_cache.get_since(roomid, message_id)
+    if messages is None:
+        documents = chat.store.get_messages_since(roomid, message_id, limit=RESUME_MAX_MESSAGES + 1)
+        if documents is None:
+            return None
+        messages = serialize_messages(documents)
+    if len(messages) > RESUME_MAX_MESSAGES:
+        return None
+    return messages
+
+def count_rooms():
+    """Rooms of the default namespace with members in this process, excluding each session's own room."""
+    rooms = socketio.server.manager.rooms.get('/', {})
+    sids = rooms.get(None, {})
+    return sum(1 for room in list(rooms) if room is not None and room not in sids)
+
+# Request timing for /metrics
+@api.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@api.after_app_request
+def observe_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_request_seconds.labels(route, request.method).observe(elapsed)
+        http_requests_total.labels(route, request.method, str(response.status_code)).inc()
+        chat = services()
+        if not chat.first_request_seconds:
+            chat.first_request_seconds = elapsed
+    return response
 
 # Routes
+## Metrics in the Prometheus text format
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), status=200, mimetype='text/plain; version=0.0.4')
+
 ## User Registration
-@app.route('/api/register', methods=['POST', 'OPTIONS'])
+@api.route('/api/register', methods=['POST', 'OPTIONS'])
 def register():
     if request.method == 'OPTIONS':
         return jsonify({'msg': 'Preflight request successful'}), 200
 
     try:
-        data = register_schema.load(request.get_json())
+        data = services().register_schema.load(request.get_json())
     except ValidationError as err:
         return jsonify(err.messages), 400
 
@@ -101,10 +497,20 @@ def register():
     email = data['email']
     password = data['password']
 
-    if get_user(username):
+    limited = check_rate_limit('register')
+    if limited:
+        return limited
+
+    store = services().store
+    if store.user_exists(username):
         return jsonify({'msg': 'User already exists'}), 409
 
-    success = save_user(username, email, password)
+    try:
+        password_hash = services().password_pool.hash(password)
+    except PasswordPoolBusy:
+        return jsonify({'msg': 'Server busy, please try again later'}), 503
+
+    success = store.save_user(username, email, password, password_hash=password_hash)
     if not success:
         return jsonify({'msg': 'Failed to create user'}), 500
 
@@ -113,7 +519,7 @@ def register():
     expires_at = datetime.utcnow() + timedelta(minutes=10)
 
     # Save OTP
-    otp_saved = save_otp(email, otp, expires_at)
+    otp_saved = store.save_otp(email, otp, expires_at)
     if not otp_saved:
         return jsonify({'msg': 'Failed to generate OTP'}), 500
 
@@ -125,22 +531,41 @@ def register():
     return jsonify({'msg': 'User registered successfully. Please verify your email with the OTP sent.'}), 201
 
 ## User Login
-@app.route('/api/login', methods=['POST', 'OPTIONS'])
+@api.route('/api/login', methods=['POST', 'OPTIONS'])
 def login():
     if request.method == 'OPTIONS':
         return jsonify({'msg': 'Preflight request successful'}), 200
 
     try:
-        data = login_schema.load(request.get_json())
+        data = services().login_schema.load(request.get_json())
     except ValidationError as err:
         return jsonify(err.messages), 400
 
     username = data['username']
     password_input = data['password']
 
-    user = get_user(username)
-    if user and user.check_password(password_input):
-        if user.is_active:
+    # Per user and IP, so others cannot lock the user out by failing for them
+    limited = check_rate_limit('login', user_ip=f'{username}|{request.remote_addr}')
+    if limited:
+        return limited
+
+    chat = services()
+    store = chat.store
+    user = store.get_user_auth(username)
+    try:
+        valid = user is not None and chat.password_pool.verify(user['password_hash'], password_input)
+    except PasswordPoolBusy:
+        return jsonify({'msg': 'Server busy, please try again later'}), 503
+
+    if valid:
+        if needs_rehash(user['password_hash']):
+            # Upgrade hashes made under an older policy; a failure here must
+            # not block the login.
+            try:
+                store.update_password_hash(username, chat.password_pool.hash(password_input))
+            except PasswordPoolBusy:
+                pass
+        if user['is_active']:
             access_token = create_access_token(identity=username)
             return jsonify({'access_token': access_token}), 200
         return jsonify({'msg': 'Account not verified. Please verify your email with the OTP sent.'}), 403
@@ -148,7 +573,7 @@ def login():
         return jsonify({'msg': 'Invalid credentials'}), 401
 
 ## Protected Route
-@app.route('/api/protected', methods=['GET', 'OPTIONS'])
+@api.route('/api/protected', methods=['GET', 'OPTIONS'])
 @jwt_required()
 def protected():
     if request.method == 'OPTIONS':
@@ -158,15 +583,18 @@ def protected():
     return jsonify(logged_in_as=current_user), 200
 
 ## Fetch Recent Rooms
-@app.route('/api/recent_rooms', methods=['GET'])
+@api.route('/api/recent_rooms', methods=['GET'])
 @jwt_required()
 def recent_rooms():
     current_user = get_jwt_identity()
-    rooms = get_recent_rooms(current_user)
-    return jsonify({'recent_rooms': rooms}), 200
+    chat = services()
+    rooms = chat.recent_rooms_writer.get(current_user)
+    # One batched read of room sequences and read cursors for all rooms
+    unread = chat.store.get_unread_counts(current_user, rooms)
+    return jsonify({'recent_rooms': rooms, 'unread': unread}), 200
 
 ## Fetch Messages from a Room
-@app.route('/api/messages/<roomid>', methods=['GET'])
+@api.route('/api/messages/<roomid>', methods=['GET'])
 @jwt_required()
 def fetch_messages(roomid):
     current_user = get_jwt_identity()
@@ -176,19 +604,112 @@ def fetch_messages(roomid):
     except ValueError:
         return jsonify({'msg': 'Invalid limit or offset'}), 400
 
-    messages = get_messages(roomid, limit=limit, offset=offset)
-    formatted_messages = [
-        {
-            'username': msg['username'],
-            'message': msg['message'],
-            'timestamp': msg['timestamp'].isoformat() + 'Z'
-        }
-        for msg in messages
-    ]
-    return jsonify({'messages': formatted_messages}), 200
+    before = request.args.get('before')
+    after = request.args.get('after')
+    if before and after:
+        return jsonify({'msg': 'Use either before or after, not both'}), 400
+
+    try:
+        if before or after or offset:
+            messages = serialize_messages(
+                services().store.get_messages(roomid, limit=limit, offset=offset, before=before, after=after)
+            )
+        else:
+            messages = services().history_cache.get_messages(roomid, limit, load_messages)
+    except ValueError:
+        return jsonify({'msg': 'Invalid cursor'}), 400
+
+    # The next cursor continues in the same direction as the request:
+    # towards older messages by default, towards newer ones for `after`.
+    next_cursor = None
+    if messages and len(messages) == limit:
+        next_cursor = db.encode_cursor((messages[-1] if after else messages[0]).cursor_fields())
+
+    # The page is assembled from pre-encoded messages
+    return Response(encode_history_page(messages, next_cursor), status=200, mimetype='application/json')
+
+## Export a Room's History
+@api.route('/api/export/<roomid>', methods=['GET'])
+@jwt_required()
+def export_messages(roomid):
+    # NDJSON, oldest first, gzipped if the client accepts it. `since` (a
+    # message ID, e.g. of the last line received) resumes an export.
+    current_user = get_jwt_identity()
+    limited = check_rate_limit('export', user=current_user)
+    if limited:
+        return limited
+
+    store = services().store
+    after = None
+    since = request.args.get('since')
+    if since:
+        try:
+            anchor = store.find_message(roomid, ObjectId(since))
+        except (InvalidId, TypeError):
+            anchor = None
+        if anchor is None:
+            return jsonify({'msg': 'Unknown message'}), 404
+        after = db.encode_cursor(anchor)
+
+    # Written batch by batch from one database cursor, in constant memory
+    chunks = export_chunks(store, roomid, after=after)
+    headers = {'Vary': 'Accept-Encoding'}
+    if request.accept_encodings['gzip']:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(chunks, status=200, mimetype='application/x-ndjson', headers=headers)
+
+## Members of a Room
+@api.route('/api/presence/<roomid>', methods=['GET'])
+@jwt_required()
+def room_presence(roomid):
+    # The roster to start from; presence_delta events keep it current
+    members = services().presence.members(roomid)
+    return jsonify({'roomid': roomid, 'members': members, 'count': len(members)}), 200
+
+## Search Messages in a Room
+@api.route('/api/search', methods=['GET'])
+@jwt_required()
+def search():
+    current_user = get_jwt_identity()
+    roomid = request.args.get('roomid')
+    query = request.args.get('q', '').strip()
+    if not roomid or not query:
+        return jsonify({'msg': 'roomid and q are required'}), 400
+    if not current_app.config['MESSAGE_SEARCH']:
+        return jsonify({'msg': 'Search is disabled on this server'}), 501
+    store = services().store
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+    except ValueError:
+        return jsonify({'msg': 'Invalid limit'}), 400
+
+    limited = check_rate_limit('search', user=current_user)
+    if limited:
+        return limited
+
+    try:
+        results = store.search_messages(roomid, query, limit=limit, after=request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'msg': 'Invalid cursor'}), 400
+
+    terms = query_terms(query)
+    hits = []
+    for result in results:
+        snippet, highlights = highlight(result['message'], terms)
+        hits.append({
+            'id': str(result['_id']),
+            'username': result['username'],
+            'timestamp': result['timestamp'].isoformat() + 'Z',
+            'score': result['score'],
+            'snippet': snippet,
+            'highlights': highlights
+        })
+    next_cursor = db.encode_search_cursor(results[-1]) if results and len(results) == limit else None
+    return jsonify({'results': hits, 'next_cursor': next_cursor}), 200
 
 ## Verify OTP
-@app.route('/api/verify-otp', methods=['POST', 'OPTIONS'])
+@api.route('/api/verify-otp', methods=['POST', 'OPTIONS'])
 def verify_otp():
     if request.method == 'OPTIONS':
         return jsonify({'msg': 'Preflight request successful'}), 200
@@ -200,7 +721,8 @@ def verify_otp():
     if not email or not otp:
         return jsonify({'msg': 'Email and OTP are required.'}), 400
 
-    otp_entry = get_otp(email, otp)
+    store = services().store
+    otp_entry = store.get_otp(email, otp)
     if not otp_entry:
         return jsonify({'msg': 'Invalid OTP.'}), 400
 
@@ -208,19 +730,16 @@ def verify_otp():
         return jsonify({'msg': 'OTP has expired.'}), 400
 
     # Activate the user
-    try:
-        users_collection.update_one({'email': email}, {'$set': {'is_active': True}})
-    except Exception as e:
-        print(f"Error activating user: {e}")
+    if not store.activate_user(email):
         return jsonify({'msg': 'Failed to activate account.'}), 500
 
     # Delete the OTP entry
-    delete_otp(email, otp)
+    store.delete_otp(email, otp)
 
     return jsonify({'msg': 'Account verified successfully.'}), 200
 
 ## Resend OTP
-@app.route('/api/resend-otp', methods=['POST', 'OPTIONS'])
+@api.route('/api/resend-otp', methods=['POST', 'OPTIONS'])
 def resend_otp():
     if request.method == 'OPTIONS':
         return jsonify({'msg': 'Preflight request successful'}), 200
@@ -231,12 +750,17 @@ def resend_otp():
     if not email:
         return jsonify({'msg': 'Email is required.'}), 400
 
+    limited = check_rate_limit('resend_otp', user=email)
+    if limited:
+        return limited
+
     # Find the user by email
-    user = users_collection.find_one({'email': email})
+    store = services().store
+    user = store.get_user_status_by_email(email)
     if not user:
         return jsonify({'msg': 'User does not exist.'}), 400
 
-    if user.get('is_active'):
+    if user['is_active']:
         return jsonify({'msg': 'Account is already active.'}), 400
 
     # Generate new OTP
@@ -244,14 +768,7 @@ def resend_otp():
     expires_at = datetime.utcnow() + timedelta(minutes=10)
 
     # Update or insert OTP
-    try:
-        otps_collection.update_one(
-            {'email': email},
-            {'$set': {'otp': otp, 'expires_at': expires_at}},
-            upsert=True
-        )
-    except Exception as e:
-        print(f"Error updating OTP: {e}")
+    if not store.replace_otp(email, otp, expires_at):
         return jsonify({'msg': 'Failed to generate OTP.'}), 500
 
     # Send OTP
@@ -263,6 +780,7 @@ def resend_otp():
 
 # Socket.IO Events
 @socketio.on('connect')
+@socketio_event_seconds.labels('connect').time()
 def handle_connect(auth):
     token = auth.get('token')
     if not token:
@@ -272,22 +790,29 @@ def handle_connect(auth):
     try:
         decoded = decode_token(token)
         username = decoded['sub']
-        users[request.sid] = username  # Associate sid with username
-        print(f"User {username} connected with sid {request.sid}")
+        services().users.add(request.sid, username)  # Associate sid with username
+        log_event(current_app.logger, 'user_connected', user=username, sid=request.sid)
     except Exception as e:
-        print(f"Invalid token: {e}")
+        current_app.logger.warning("Invalid token: %s", e)
         emit('error', {'msg': 'Invalid token'})
         return False  # Disconnect the client
 
 @socketio.on('disconnect')
+@socketio_event_seconds.labels('disconnect').time()
 def handle_disconnect():
-    username = users.pop(request.sid, None)
+    chat = services()
+    if chat.outbound_limiter:
+        chat.outbound_limiter.forget(socketio.server.manager.eio_sid_from_sid(request.sid, '/'))
+    username = chat.users.remove(request.sid)
     if username:
-        print(f"User {username} disconnected")
+        log_event(current_app.logger, 'user_disconnected', user=username, sid=request.sid)
+    for room, member in chat.presence.disconnect(request.sid):
+        chat.presence_broadcaster.left(room, member)
 
 @socketio.on('join_room')
+@socketio_event_seconds.labels('join_room').time()
 def handle_join_room_event(data):
-    username = users.get(request.sid)
+    username = services().users.get(request.sid)
     if not username:
         emit('error', {'msg': 'Unauthorized'})
         return
@@ -297,33 +822,69 @@ def handle_join_room_event(data):
         emit('error', {'msg': 'Missing room ID'})
         return
 
+    if socket_rate_limited('join_room', username):
+        return
+
     join_room(room)
-    app.logger.info(f"{username} has joined the room {room}")
-    emit('join_room_announcement', {
-        'username': 'System',
-        'message': f"{username} has joined the room."
-    }, room=room)
+    log_event(current_app.logger, 'room_joined', user=username, room=room)
+
+    # The room hears about the join in a coalesced presence_delta (not at
+    # all for another tab of a member); the joining session gets the roster.
+    chat = services()
+    if chat.presence.join(request.sid, username, room):
+        chat.presence_broadcaster.joined(room, username)
+    emit('presence_snapshot', {'roomid': room, 'members': chat.presence.members(room)})
 
     # Add to recent rooms
-    success = add_recent_room(username, room)
+    success = chat.recent_rooms_writer.add(username, room)
     if not success:
-        app.logger.error(f"Failed to add room {room} to {username}'s recent rooms")
-
-    # Fetch and send previous messages to the client
-    messages = get_messages(room)
-    formatted_messages = [
-        {
-            'username': msg['username'],
-            'message': msg['message'],
-            'timestamp': msg['timestamp'].isoformat() + 'Z'
-        }
-        for msg in messages
-    ]
-    emit('previous_messages', {'messages': formatted_messages})
+        current_app.logger.error("Failed to add room %s to %s's recent rooms", room, username)
+
+    # A client resuming after a disconnect only needs what it missed
+    since = data.get('since')
+    if since:
+        messages = load_messages_since(room, since)
+        if messages is not None:
+            emit('previous_messages', {'messages': [msg.payload for msg in messages], 'since': since})
+            return
+
+    # Fetch and send previous messages to the client. With `gap` set, a
+    # resuming client must replace what it has with this page.
+    limit = 50
+    messages = chat.history_cache.get_messages(room, limit, load_messages)
+    next_cursor = db.encode_cursor(messages[0].cursor_fields()) if len(messages) == limit else None
+    payload = {'messages': [msg.payload for msg in messages], 'next_cursor': next_cursor}
+    if since:
+        payload['gap'] = True
+    emit('previous_messages', payload)
+
+@socketio.on('leave_room')
+@socketio_event_seconds.labels('leave_room').time()
+def handle_leave_room_event(data):
+    username = services().users.get(request.sid)
+    if not username:
+        emit('error', {'msg': 'Unauthorized'})
+        return
+
+    room = data.get('roomid')
+    if not room:
+        emit('error', {'msg': 'Missing room ID'})
+        return
+
+    if socket_rate_limited('leave_room', username):
+        return
+
+    leave_room(room)
+    log_event(current_app.logger, 'room_left', user=username, room=room)
+    chat = services()
+    member = chat.presence.leave(request.sid, room)
+    if member:
+        chat.presence_broadcaster.left(room, member)
 
 @socketio.on('send_message')
+@socketio_event_seconds.labels('send_message').time()
 def handle_send_message_event(data):
-    username = users.get(request.sid)
+    username = services().users.get(request.sid)
     if not username:
         emit('error', {'msg': 'Unauthorized'})
         return
@@ -335,19 +896,64 @@ def handle_send_message_event(data):
         emit('error', {'msg': 'Missing room ID or message'})
         return
 
+    if socket_rate_limited('send_message', username):
+        return
+
     # Save the message to the database
-    success = save_message(room, username, message)
-    if not success:
-        emit('error', {'msg': 'Failed to save message'})
+    chat = services()
+    if chat.message_writer:
+        # Broadcast right away; the message is persisted in the background.
+        saved = chat.store.build_message(room, username, message)
+        if not chat.message_writer.submit(saved):
+            emit('error', {'msg': 'Server busy, message not sent'})
+            return
+    else:
+        saved = chat.store.save_message(room, username, message)
+        if not saved:
+            emit('error', {'msg': 'Failed to save message'})
+            return
+    serialized = SerializedMessage(saved)
+    chat.history_cache.append(room, serialized)
+
+    # Sampled, and without the body
+    log_event(current_app.logger, 'message_sent', user=username, room=room, length=len(message))
+    if chat.broadcast_batcher:
+        chat.broadcast_batcher.publish(room, serialized.payload)
+    else:
+        emit('receive_message', serialized.payload, room=room)
+
+@socketio.on('mark_read')
+@socketio_event_seconds.labels('mark_read').time()
+def handle_mark_read_event(data):
+    username = services().users.get(request.sid)
+    if not username:
+        emit('error', {'msg': 'Unauthorized'})
+        return
+
+    room = data.get('roomid')
+    if not room:
+        emit('error', {'msg': 'Missing room ID'})
+        return
+    message_id = None
+    if data.get('id'):
+        try:
+            message_id = ObjectId(data['id'])
+        except (InvalidId, TypeError):
+            emit('error', {'msg': 'Invalid message ID'})
+            return
+
+    if socket_rate_limited('mark_read', username):
         return
 
-    app.logger.info(f"{username} has sent a message in room {room}: {message}")
-    emit('receive_message', {
-        'username': username,
-        'message': message,
-        'timestamp': datetime.utcnow().isoformat() + 'Z'
-    }, room=room)
+    if services().store.mark_read(username, room, message_id) is None:
+        current_app.logger.error("Failed to mark room %s read for %s", room, username)
 
 # Run the application
 if __name__ == "__main__":
-    socketio.run(app, debug=True)
+    app = create_app()
+    socketio.run(
+        app,
+        host=os.getenv('HOST', '127.0.0.1'),
+        port=int(os.getenv('PORT', 5000)),
+        debug=os.getenv('FLASK_DEBUG', '1') == '1'
+    )
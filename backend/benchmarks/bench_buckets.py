@@ -0,0 +1,84 @@
+# backend/benchmarks/bench_buckets.py
+"""
+Per-message documents against bucketed storage for a long-lived room.
+
+Seeds one room with --messages messages in the Chatapp_bench database on
+MONGODB_URI. The seeded documents are converted into buckets with the
+migration tool. The script then reports, for both layouts:
+  - storage size and total index size of the collection
+  - median latency of the newest page, and of pages at several depths
+    reached with `before` cursors
+  - median latency of a single append
+
+Usage:
+    python benchmarks/bench_buckets.py --messages 1000000 --page-size 50
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+os.environ.setdefault('MONGODB_DATABASE', 'Chatapp_bench')
+
+import db  # noqa: E402
+from bench_pagination import ROOM, seed, time_call  # noqa: E402
+from indexes import ensure_indexes  # noqa: E402
+from migrate_buckets import migrate_room  # noqa: E402
+
+
+def sizes(name):
+    stats = db.chat_db.command('collStats', name)
+    return stats['storageSize'] / 2 ** 20, stats['totalIndexSize'] / 2 ** 20
+
+
+def page_cursors(depths, page_size):
+    """The `before` cursor at the start of every depth, in pages."""
+    cursors = {0: None}
+    cursor = None
+    for page in range(1, max(depths) + 1):
+        messages = db.get_messages(ROOM, limit=page_size, before=cursor)
+        cursor = db.encode_cursor(messages[0])
+        if page in depths:
+            cursors[page] = cursor
+    return cursors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--no-seed', action='store_true')
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        seed(db.messages_collection, args.messages)
+        ensure_indexes()
+        started = time.monotonic()
+        migrate_room(ROOM)
+        print(f"Migrated {args.messages} messages in {time.monotonic() - started:.1f}s")
+
+    depths = [d for d in (0, 10, 100, 1000) if d * args.page_size < args.messages]
+    results = {}
+    for layout, collection in (('documents', 'messages'), ('buckets', 'message_buckets')):
+        db.MESSAGE_STORAGE = layout
+        cursors = page_cursors(depths, args.page_size)
+        pages = {
+            depth: time_call(lambda: db.get_messages(ROOM, limit=args.page_size, before=cursors[depth]), args.repeat)
+            for depth in depths
+        }
+        append_ms = time_call(lambda: db.save_message(ROOM, 'bench', 'appended'), args.repeat)
+        results[layout] = (sizes(collection), pages, append_ms)
+
+    print(f"{'layout':<10} {'storage MiB':>12} {'index MiB':>10} "
+          + ' '.join(f"{f'page {depth} ms':>12}" for depth in depths) + f" {'append ms':>10}")
+    for layout, ((storage, index), pages, append_ms) in results.items():
+        print(f"{layout:<10} {storage:>12.1f} {index:>10.1f} "
+              + ' '.join(f"{pages[depth]:>12.2f}" for depth in depths) + f" {append_ms:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# backend/benchmarks/bench_connections.py
+"""
+Connection scaling: idle Socket.IO connections held against server RSS/CPU.
+
+Opens websocket connections to a running server in steps and, after each
+step, samples the server's resident memory and CPU usage from /proc. Run it
+once against `python app.py` (threading) and once against `python serve.py`
+(gevent) to compare the two modes.
+
+Requires python-socketio[asyncio_client] (aiohttp) on the client side and
+the server's JWT_SECRET_KEY in the environment.
+
+Usage:
+    python benchmarks/bench_connections.py --pid <server pid> --steps 1000,5000,10000
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import time
+from datetime import datetime, timedelta, timezone
+
+import jwt
+import socketio
+
+
+def make_token(username):
+    now = datetime.now(timezone.utc)
+    payload = {
+        'sub': username,
+        'type': 'access',
+        'fresh': False,
+        'iat': now,
+        'nbf': now,
+        'exp': now + timedelta(hours=1),
+    }
+    return jwt.encode(payload, os.environ['JWT_SECRET_KEY'], algorithm='HS256')
+
+
+def read_proc(pid):
+    """Returns (rss bytes, cpu seconds) of a process."""
+    with open(f'/proc/{pid}/status') as status:
+        rss = next(int(line.split()[1]) * 1024 for line in status if line.startswith('VmRSS:'))
+    with open(f'/proc/{pid}/stat') as stat:
+        fields = stat.read().rsplit(')', 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    return rss, cpu
+
+
+async def connect(url, token, clients, failures):
+    client = socketio.AsyncClient(reconnection=False)
+    try:
+        await client.connect(url, auth={'token': token}, transports=['websocket'])
+        clients.append(client)
+    except Exception:
+        failures.append(1)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--pid', type=int, required=True, help='server process id')
+    parser.add_argument('--steps', default='100,1000,5000,10000')
+    parser.add_argument('--batch', type=int, default=200, help='concurrent connects')
+    parser.add_argument('--settle', type=float, default=5.0, help='seconds idle before sampling')
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    token = make_token('bench')
+    clients, failures = [], []
+    print(f"{'connections':>12} {'failed':>8} {'rss MiB':>10} {'KiB/conn':>10} {'cpu %':>8}")
+    base_rss, _ = read_proc(args.pid)
+    for target in (int(step) for step in args.steps.split(',')):
+        while len(clients) + len(failures) < target:
+            count = min(args.batch, target - len(clients) - len(failures))
+            await asyncio.gather(*(connect(args.url, token, clients, failures) for _ in range(count)))
+
+        # CPU over an idle window measures the cost of just holding connections.
+        _, cpu_before = read_proc(args.pid)
+        started = time.monotonic()
+        await asyncio.sleep(args.settle)
+        rss, cpu_after = read_proc(args.pid)
+        cpu_percent = (cpu_after - cpu_before) / (time.monotonic() - started) * 100
+        per_connection = (rss - base_rss) / max(len(clients), 1) / 1024
+        print(f"{len(clients):>12} {len(failures):>8} {rss / 2 ** 20:>10.1f} "
+              f"{per_connection:>10.1f} {cpu_percent:>8.1f}")
+
+    await asyncio.gather(*(client.disconnect() for client in clients))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
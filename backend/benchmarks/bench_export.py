@@ -0,0 +1,104 @@
+# backend/benchmarks/bench_export.py
+"""
+Export and import throughput for one large room.
+
+Writes a synthetic export of --messages messages, imports it into a room of
+the data store chosen by DATA_STORE_URL (MongoDB, database Chatapp_bench on
+MONGODB_URI, unless it is memory://), then exports the room again, plain and
+gzip-compressed. For each step it reports messages per second, megabytes per
+second of NDJSON and how much the peak RSS grew, which stays flat for
+exports of any size.
+
+Usage:
+    python benchmarks/bench_export.py --messages 2000000 --batch 1000
+    DATA_STORE_URL=memory:// python benchmarks/bench_export.py
+"""
+
+import argparse
+import gzip
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+os.environ.setdefault('MONGODB_DATABASE', 'Chatapp_bench')
+
+import db  # noqa: E402
+from data_store import create_data_store  # noqa: E402
+from history_export import encode_line, export_room, import_lines, read_lines  # noqa: E402
+from indexes import ensure_indexes  # noqa: E402
+
+ROOM = 'export-bench'
+WORDS = ['deploy', 'build', 'review', 'merge', 'coffee', 'lunch', 'ticket', 'cache', 'socket', 'room']
+
+
+def write_source(path, count):
+    """Writes `count` synthetic messages in export format."""
+    start = datetime.utcnow() - timedelta(days=30)
+    with open(path, 'wb') as output:
+        lines = []
+        for i in range(count):
+            document = db.build_message(ROOM, f'user{i % 50}', ' '.join(random.choices(WORDS, k=12)))
+            document['timestamp'] = start + timedelta(milliseconds=i)
+            lines.append(encode_line(document))
+            if len(lines) == 10000:
+                output.write(b''.join(lines))
+                lines = []
+        output.write(b''.join(lines))
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def report(step, count, size, elapsed, rss_growth):
+    print(f"{step:<12} {count / elapsed:>12,.0f} {size / 2 ** 20 / elapsed:>8.1f} {elapsed:>8.1f} {rss_growth:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2000000)
+    parser.add_argument('--batch', type=int, default=1000)
+    args = parser.parse_args()
+
+    random.seed(1)
+    store = create_data_store()
+    if store is db:
+        ensure_indexes()
+        db.messages_collection.delete_many({'roomid': ROOM})
+        db.rooms_collection.delete_one({'_id': ROOM})
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'source.ndjson')
+        write_source(source, args.messages)
+        size = os.path.getsize(source)
+        print(f"{args.messages} messages, {size / 2 ** 20:.0f} MB of NDJSON, batches of {args.batch}")
+        print(f"{'step':<12} {'messages/s':>12} {'MB/s':>8} {'seconds':>8} {'RSS +MB':>10}")
+
+        rss = peak_rss_mb()
+        started = time.perf_counter()
+        count, failed = import_lines(store, read_lines(source), batch_size=args.batch)
+        report('import', count, size, time.perf_counter() - started, peak_rss_mb() - rss)
+        if failed:
+            print(f"{failed} messages could not be imported")
+
+        for compressed in (False, True):
+            path = os.path.join(directory, 'export.ndjson.gz' if compressed else 'export.ndjson')
+            rss = peak_rss_mb()
+            started = time.perf_counter()
+            # Compression level as in history_export.py
+            with (gzip.open(path, 'wb', compresslevel=6) if compressed else open(path, 'wb')) as output:
+                count = export_room(store, ROOM, output, batch_size=args.batch)
+            elapsed = time.perf_counter() - started
+            report('export .gz' if compressed else 'export', count, size, elapsed, peak_rss_mb() - rss)
+        print(f"Compressed to {os.path.getsize(path) / 2 ** 20:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# backend/benchmarks/bench_fanout.py
+"""
+Fan-out CPU and latency in a hot room, per-message against batched frames.
+
+Builds a python-socketio Server with N fake members in one room; the
+engine.io send is replaced by a function that encodes the packet for each
+recipient (the per-recipient framing cost) without touching a network.
+Messages are published at a fixed rate, once with every message emitted on
+its own and once through BroadcastBatcher. Latency is measured from publish
+until the frame has been handed to the last recipient.
+
+Usage:
+    python benchmarks/bench_fanout.py --members 100,1000,5000 --rate 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import socketio  # noqa: E402
+
+from broadcast_batcher import BroadcastBatcher  # noqa: E402
+
+ROOM = 'hot-room'
+
+
+def make_server(members):
+    server = socketio.Server(async_mode='threading')
+    stats = {'packets': 0}
+
+    def send_packet(eio_sid, pkt):
+        pkt.encode()
+        stats['packets'] += 1
+
+    server.eio.send_packet = send_packet
+    for i in range(members):
+        sid = server.manager.connect(f'eio{i}', '/')
+        server.manager.enter_room(sid, '/', ROOM)
+    return server, stats
+
+
+def run(members, rate, count, batched):
+    server, stats = make_server(members)
+    latencies = []
+
+    def emit(event, data, room):
+        server.emit(event, data, room=room)
+        done = time.perf_counter()
+        payloads = data['messages'] if event == 'receive_messages' else [data]
+        latencies.extend(done - payload['sent_at'] for payload in payloads)
+
+    hot_rate = 20.0 if batched else float('inf')
+    batcher = BroadcastBatcher(emit, hot_rate=hot_rate)
+    interval = 1.0 / rate
+    cpu_started = time.process_time()
+    next_send = time.perf_counter()
+    for i in range(count):
+        batcher.publish(ROOM, {'username': 'bench', 'message': f'message {i}', 'sent_at': time.perf_counter()})
+        next_send += interval
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    batcher.stop()
+    cpu = time.process_time() - cpu_started
+
+    latencies.sort()
+    return {
+        'cpu_us_per_message': cpu / count * 1e6,
+        'frames': batcher.frames,
+        'packets': stats['packets'],
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', default='100,1000,5000')
+    parser.add_argument('--rate', type=float, default=200, help='messages per second')
+    parser.add_argument('--messages', type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'members':>8} {'mode':<12} {'cpu us/msg':>12} {'frames':>8} {'packets':>10} "
+          f"{'p50 ms':>8} {'p99 ms':>8}")
+    for members in (int(value) for value in args.members.split(',')):
+        for mode, batched in (('per-message', False), ('batched', True)):
+            result = run(members, args.rate, args.messages, batched)
+            print(f"{members:>8} {mode:<12} {result['cpu_us_per_message']:>12.0f} {result['frames']:>8} "
+                  f"{result['packets']:>10} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
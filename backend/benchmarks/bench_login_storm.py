@@ -0,0 +1,123 @@
+# backend/benchmarks/bench_login_storm.py
+"""
+Chat message latency while a login storm is running.
+
+A Socket.IO client joins a room and measures send -> receive_message round
+trips, first on an idle server and then while `--login-threads` threads
+hammer /api/login. Run it against a server started with PASSWORD_POOL_SIZE=0
+(hashing on the request thread) and with the default pool to compare.
+
+Start the server with RATE_LIMITING=0: the storm comes from one address and
+would otherwise be answered with 429 before reaching the hash pool, and the
+pings would be throttled. The script stops if it sees either.
+
+The account given by --username/--password must exist and be verified.
+
+Usage:
+    python benchmarks/bench_login_storm.py --username alice --password secret123
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import socketio
+
+
+def login(url, username, password):
+    request = urllib.request.Request(
+        f'{url}/api/login',
+        data=json.dumps({'username': username, 'password': password}).encode(),
+        headers={'Content-Type': 'application/json'}
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def measure_latency(client, room, count, received, limited):
+    samples = []
+    for i in range(count):
+        received.clear()
+        started = time.perf_counter()
+        client.emit('send_message', {'roomid': room, 'message': f'ping {i}'})
+        if received.wait(5):
+            samples.append((time.perf_counter() - started) * 1000)
+        if limited.is_set():
+            raise SystemExit("Pings were rate limited; start the server with RATE_LIMITING=0")
+        time.sleep(0.02)
+    samples.sort()
+    return samples
+
+
+def report(label, samples):
+    if not samples:
+        print(f"{label:<14} no messages received")
+        return
+    p50 = samples[len(samples) // 2]
+    p99 = samples[min(int(len(samples) * 0.99), len(samples) - 1)]
+    print(f"{label:<14} p50 {p50:8.1f} ms   p99 {p99:8.1f} ms   max {samples[-1]:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--room', default='bench-login-storm')
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--login-threads', type=int, default=16)
+    args = parser.parse_args()
+
+    status, body = login(args.url, args.username, args.password)
+    if status == 429:
+        raise SystemExit("Login was rate limited; start the server with RATE_LIMITING=0")
+    if status != 200:
+        raise SystemExit(f"Login failed with status {status}")
+
+    received = threading.Event()
+    limited = threading.Event()
+    # No Origin header, like the async clients of the other benchmarks; the
+    # server only accepts the frontend's origin.
+    client = socketio.Client(websocket_extra_options={'suppress_origin': True})
+    client.on('receive_message', lambda data: received.set())
+    client.on('rate_limited', lambda data: (limited.set(), received.set()))
+    client.connect(args.url, auth={'token': body['access_token']}, transports=['websocket'])
+    client.emit('join_room', {'roomid': args.room})
+    time.sleep(0.5)
+
+    report('idle', measure_latency(client, args.room, args.messages, received, limited))
+
+    stopping = threading.Event()
+    statuses = {}
+    lock = threading.Lock()
+
+    def storm():
+        while not stopping.is_set():
+            code, _ = login(args.url, args.username, args.password)
+            with lock:
+                statuses[code] = statuses.get(code, 0) + 1
+
+    stormers = [threading.Thread(target=storm, daemon=True) for _ in range(args.login_threads)]
+    for thread in stormers:
+        thread.start()
+    time.sleep(1)
+    try:
+        report('login storm', measure_latency(client, args.room, args.messages, received, limited))
+    finally:
+        stopping.set()
+        for thread in stormers:
+            thread.join()
+        client.disconnect()
+    print(f"login responses: {dict(sorted(statuses.items()))}")
+    if 429 in statuses:
+        raise SystemExit("Logins were rate limited; start the server with RATE_LIMITING=0")
+
+
+if __name__ == '__main__':
+    main()
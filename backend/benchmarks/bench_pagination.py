@@ -0,0 +1,94 @@
+# backend/benchmarks/bench_pagination.py
+"""
+Page latency against page depth for offset and cursor pagination.
+
+Seeds a scratch room in a separate database on MONGODB_URI, then walks the
+history backwards and times the page at each depth with both strategies.
+
+Usage:
+    python benchmarks/bench_pagination.py --messages 200000 --page-size 50
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db  # noqa: E402
+from pymongo import ASCENDING  # noqa: E402
+
+BENCH_DB = 'Chatapp_bench'
+ROOM = 'bench-room'
+
+
+def seed(collection, count):
+    collection.drop()
+    collection.create_index([('roomid', ASCENDING), ('timestamp', ASCENDING), ('_id', ASCENDING)])
+    start = datetime.utcnow() - timedelta(seconds=count)
+    batch = []
+    for i in range(count):
+        batch.append({
+            'roomid': ROOM,
+            'username': f'user{i % 20}',
+            'message': f'message {i}',
+            'timestamp': start + timedelta(seconds=i)
+        })
+        if len(batch) == 10000:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def time_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-seed', action='store_true')
+    args = parser.parse_args()
+
+    db.messages_collection = db.client.get_database(BENCH_DB).get_collection('messages')
+    if not args.no_seed:
+        seed(db.messages_collection, args.messages)
+
+    depths = [0, 10, 100, 1000, 2000, 5000, 10000]
+    depths = [d for d in depths if d * args.page_size < args.messages]
+
+    # Collect the cursor at the start of every depth we are going to measure.
+    cursors = {0: None}
+    cursor = None
+    for page in range(1, max(depths) + 1):
+        messages = db.get_messages(ROOM, limit=args.page_size, before=cursor)
+        cursor = db.encode_cursor(messages[0])
+        if page in depths:
+            cursors[page] = cursor
+
+    print(f"{'page':>8} {'offset ms':>12} {'cursor ms':>12}")
+    for depth in depths:
+        offset_ms = time_call(
+            lambda: db.get_messages(ROOM, limit=args.page_size, offset=depth * args.page_size),
+            args.repeat
+        )
+        cursor_ms = time_call(
+            lambda: db.get_messages(ROOM, limit=args.page_size, before=cursors[depth]),
+            args.repeat
+        )
+        print(f"{depth:>8} {offset_ms:>12.2f} {cursor_ms:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# backend/benchmarks/bench_presence.py
+"""
+Join/leave churn in rooms with thousands of members.
+
+Fills --rooms rooms with --members members each, a tenth of them with a
+second tab, then runs --seconds of churn: random sessions leave and join
+again later, --rate joins and leaves per second in total. It reports:
+  - index operations per second with the churn run flat out, and the
+    latency of a roster snapshot of a full room
+  - for the paced run: membership changes, the presence_delta events they
+    were coalesced into, and the frames sent to room members, compared
+    with one broadcast per change as with the old join announcements
+
+Usage:
+    python benchmarks/bench_presence.py --rooms 5 --members 5000 --rate 2000
+    PRESENCE_STORE_URL=redis://localhost:6379/0 python benchmarks/bench_presence.py
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from presence import create_presence_broadcaster, create_presence_index  # noqa: E402
+
+
+def fill(index, rooms, members):
+    """Joins every member to its room; returns the list of (sid, username, roomid)."""
+    sessions = []
+    for room in range(rooms):
+        roomid = f'presence-{room}'
+        for member in range(members):
+            username = f'user{member}'
+            for tab in range(2 if member % 10 == 0 else 1):
+                sid = f'{roomid}:{username}:{tab}'
+                index.join(sid, username, roomid)
+                sessions.append((sid, username, roomid))
+    return sessions
+
+
+def churn(index, broadcaster, sessions, seconds, rate=None):
+    """Makes random sessions leave, or join again if they had left; returns the number of operations."""
+    away = set()
+    operations = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        session = random.choice(sessions)
+        sid, username, roomid = session
+        if session in away:
+            away.discard(session)
+            if index.join(sid, username, roomid):
+                broadcaster.joined(roomid, username)
+        else:
+            away.add(session)
+            member = index.leave(sid, roomid)
+            if member:
+                broadcaster.left(roomid, member)
+        operations += 1
+        if rate:
+            # Paced to `rate` operations per second overall
+            delay = started + operations / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    # Leave the rooms as they were filled
+    for sid, username, roomid in away:
+        index.join(sid, username, roomid)
+    return operations
+
+
+def time_call(fn, repeat):
+    """Median latency of fn() in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def discard(event, payload, room=None):
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=5)
+    parser.add_argument('--members', type=int, default=5000)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--rate', type=float, default=2000, help='joins and leaves per second in the paced run')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(1)
+    index = create_presence_index()
+    started = time.perf_counter()
+    sessions = fill(index, args.rooms, args.members)
+    elapsed = time.perf_counter() - started
+    print(f"{args.rooms} rooms of {args.members} members, {len(sessions)} sessions "
+          f"joined in {elapsed:.2f}s")
+
+    broadcaster = create_presence_broadcaster(discard, count=index.count)
+    operations = churn(index, broadcaster, sessions, args.seconds)
+    broadcaster.stop()
+    print(f"Churn flat out: {operations / args.seconds:,.0f} joins and leaves per second")
+    snapshot = time_call(lambda: index.members('presence-0'), args.repeat)
+    print(f"Snapshot of {index.count('presence-0')} members: {snapshot:.2f} ms")
+
+    broadcaster = create_presence_broadcaster(discard, count=index.count)
+    operations = churn(index, broadcaster, sessions, args.seconds, args.rate)
+    broadcaster.stop()
+    changes = broadcaster.changes
+    print(f"Paced churn: {operations} operations, {changes} membership changes, "
+          f"{broadcaster.deltas} presence_delta events (window {broadcaster.window * 1000:.0f} ms)")
+    print(f"Frames to room members: {changes * args.members:,} with one broadcast per change, "
+          f"{broadcaster.deltas * args.members:,} with deltas")
+
+
+if __name__ == '__main__':
+    main()
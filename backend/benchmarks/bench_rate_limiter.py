@@ -0,0 +1,66 @@
+# backend/benchmarks/bench_rate_limiter.py
+"""
+Per-event overhead of the rate limiter.
+
+Times RateLimiter.check() for send_message (two buckets: sid and user) with
+the in-memory store, over a growing number of distinct senders, and for
+comparison the cost of a bare dict lookup. With --redis-url the same checks
+are timed against the Redis-backed store.
+
+Usage:
+    python benchmarks/bench_rate_limiter.py --checks 200000 --keys 1,1000,100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rate_limiter import MemoryRateLimitStore, RateLimiter, RedisRateLimitStore  # noqa: E402
+
+
+def time_checks(limiter, checks, keys):
+    sids = [f'sid{i}' for i in range(keys)]
+    users = [f'user{i}' for i in range(keys)]
+    check = limiter.check
+    started = time.perf_counter()
+    for i in range(checks):
+        index = i % keys
+        check('send_message', sid=sids[index], user=users[index])
+    return (time.perf_counter() - started) / checks * 1e9
+
+
+def time_baseline(checks, keys):
+    table = {f'send_message:sid:sid{i}': 0 for i in range(keys)}
+    sids = [f'sid{i}' for i in range(keys)]
+    started = time.perf_counter()
+    for i in range(checks):
+        table.get(f'send_message:sid:{sids[i % keys]}')
+    return (time.perf_counter() - started) / checks * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--checks', type=int, default=200000)
+    parser.add_argument('--keys', default='1,1000,100000', help='distinct senders')
+    parser.add_argument('--redis-url', help='also time the Redis store')
+    args = parser.parse_args()
+
+    print(f"{'store':<8} {'senders':>8} {'ns/check':>10} {'limited':>9} {'buckets':>9} {'dict ns':>9}")
+    for keys in (int(value) for value in args.keys.split(',')):
+        store = MemoryRateLimitStore()
+        limiter = RateLimiter(store)
+        ns = time_checks(limiter, args.checks, keys)
+        print(f"{'memory':<8} {keys:>8} {ns:>10.0f} {limiter.limited:>9} {len(store):>9} "
+              f"{time_baseline(args.checks, keys):>9.0f}")
+        if args.redis_url:
+            limiter = RateLimiter(RedisRateLimitStore(args.redis_url, prefix='vibee:bench'))
+            checks = min(args.checks, 20000)
+            ns = time_checks(limiter, checks, keys)
+            print(f"{'redis':<8} {keys:>8} {ns:>10.0f} {limiter.limited:>9} {'-':>9} {'-':>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# backend/benchmarks/bench_reconnect.py
+"""
+Simulates clients reconnecting to a room after a disconnect.
+
+Drives the app in-process through Flask-SocketIO test clients against the
+Chatapp_bench database on MONGODB_URI, or the in-memory data store with
+DATA_STORE_URL=memory://. Rate limiting is off, as the room is filled from
+one session. Listeners join a room and disconnect,
+then messages are sent while they are away. Each listener then rejoins in
+one of three ways:
+  - full:   without `since`, as before (the last page is re-sent)
+  - resume: with `since` set to the last message it saw
+  - gap:    with `since`, after more than RESUME_MAX_MESSAGES were missed
+Resumed clients must receive exactly the messages they missed. The script
+reports payload bytes and MongoDB find commands (0 on the in-memory store)
+per rejoin, and exits non-zero if a check fails.
+
+Usage:
+    python benchmarks/bench_reconnect.py --clients 50 --missed 5
+    DATA_STORE_URL=memory:// python benchmarks/bench_reconnect.py
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+os.environ.setdefault('MONGODB_DATABASE', 'Chatapp_bench')
+os.environ.setdefault('MAIL_DISPATCHER_WORKERS', '0')
+os.environ.setdefault('PASSWORD_POOL_SIZE', '0')
+os.environ.setdefault('RECENT_ROOMS_FLUSH_INTERVAL', '0')
+os.environ.setdefault('RATE_LIMITING', '0')
+
+from pymongo import monitoring  # noqa: E402
+
+
+class FindCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.finds = 0
+
+    def started(self, event):
+        if event.command_name == 'find':
+            self.finds += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+find_counter = FindCounter()
+monitoring.register(find_counter)
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+import app as chat_app  # noqa: E402
+import db  # noqa: E402
+
+ROOM = 'bench-reconnect'
+
+app = chat_app.create_app()
+chat = app.extensions['vibee']
+
+
+def connect(token):
+    return chat_app.socketio.test_client(app, auth={'token': token})
+
+
+def previous_messages(client):
+    for event in client.get_received():
+        if event['name'] == 'previous_messages':
+            return event['args'][0]
+    raise AssertionError('no previous_messages received')
+
+
+def send(sender, count, prefix):
+    for i in range(count):
+        sender.emit('send_message', {'roomid': ROOM, 'message': f'{prefix} {i}'})
+    return [event['args'][0]['id'] for event in sender.get_received() if event['name'] == 'receive_message']
+
+
+def rejoin(listeners, token, since_ids, missed_ids):
+    """Reconnects every listener; returns (bytes, finds, failures)."""
+    total_bytes = 0
+    failures = 0
+    finds_before = find_counter.finds
+    for index in range(len(listeners)):
+        client = connect(token)
+        payload = {'roomid': ROOM}
+        if since_ids is not None:
+            payload['since'] = since_ids[index]
+        client.emit('join_room', payload)
+        data = previous_messages(client)
+        total_bytes += len(json.dumps(data))
+        if missed_ids is not None and [msg['id'] for msg in data['messages']] != missed_ids:
+            failures += 1
+        listeners[index] = client
+    return total_bytes, find_counter.finds - finds_before, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--history', type=int, default=200, help='messages in the room beforehand')
+    parser.add_argument('--missed', type=int, default=5, help='messages sent while disconnected')
+    args = parser.parse_args()
+
+    if chat.store is db:
+        db.messages_collection.delete_many({'roomid': ROOM})
+    chat.history_cache.invalidate(ROOM)
+    with app.app_context():
+        token = create_access_token(identity='bench')
+
+    sender = connect(token)
+    sender.emit('join_room', {'roomid': ROOM})
+    sender.get_received()
+    send(sender, args.history, 'history')
+
+    listeners = [connect(token) for _ in range(args.clients)]
+    for client in listeners:
+        client.emit('join_room', {'roomid': ROOM})
+        client.get_received()
+
+    failed = False
+    print(f"{'scenario':<10} {'bytes/rejoin':>14} {'finds/rejoin':>14} {'failures':>10}")
+    for scenario in ('full', 'resume', 'gap'):
+        last_ids = send(sender, 1, f'{scenario} marker')
+        for client in listeners:
+            client.disconnect()
+        missed = chat_app.RESUME_MAX_MESSAGES + 1 if scenario == 'gap' else args.missed
+        missed_ids = send(sender, missed, f'{scenario} missed')
+
+        since_ids = None if scenario == 'full' else [last_ids[-1]] * len(listeners)
+        total_bytes, finds, failures = rejoin(
+            listeners, token, since_ids, missed_ids if scenario == 'resume' else None
+        )
+        if scenario == 'gap':
+            # A gap must be signalled, never silently truncated.
+            client = connect(token)
+            client.emit('join_room', {'roomid': ROOM, 'since': last_ids[-1]})
+            failures = 0 if previous_messages(client).get('gap') else len(listeners)
+            client.disconnect()
+        failed = failed or failures > 0
+        print(f"{scenario:<10} {total_bytes / len(listeners):>14.0f} "
+              f"{finds / len(listeners):>14.2f} {failures:>10}")
+
+    for client in listeners + [sender]:
+        client.disconnect()
+    print(f"history cache: {chat.history_cache.stats()}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# backend/benchmarks/bench_register.py
+"""
+/api/register latency with inline SMTP delivery against the mail dispatcher.
+
+Starts the local SMTP stand-in, then runs the register endpoint through the
+Flask test client once with MAIL_DISPATCHER_WORKERS=0 (inline send) and once
+with the background dispatcher. Users are written to the Chatapp_bench
+database on MONGODB_URI, or kept in memory with DATA_STORE_URL=memory://.
+Rate limiting is off, since every request comes from one address.
+
+Usage:
+    python benchmarks/bench_register.py --requests 50 --connect-delay 0.5
+    DATA_STORE_URL=memory:// python benchmarks/bench_register.py
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from smtp_standin import SMTPStandIn  # noqa: E402
+
+
+def percentile(samples, fraction):
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def run_child(requests):
+    """Runs inside the subprocess, with the mode selected through the environment."""
+    import db
+    from app import create_app
+
+    app = create_app({'WARM_UP': False})
+    chat = app.extensions['vibee']
+    mail_dispatcher = chat.mail_dispatcher
+
+    if chat.store is db:
+        for name in ('users', 'otps', 'mail_outbox'):
+            db.chat_db.get_collection(name).delete_many({})
+
+    client = app.test_client()
+    samples = []
+    for i in range(requests):
+        payload = {'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password': 'secret123'}
+        started = time.perf_counter()
+        response = client.post('/api/register', json=payload)
+        samples.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 201:
+            print(f"Unexpected response: {response.status_code} {response.get_json()}", file=sys.stderr)
+
+    if mail_dispatcher:
+        # Wait for delivery so the stand-in can confirm every email went out.
+        deadline = time.monotonic() + 60
+        while mail_dispatcher.sent < requests and time.monotonic() < deadline:
+            time.sleep(0.05)
+        mail_dispatcher.stop()
+
+    samples.sort()
+    print(json.dumps({
+        'p50_ms': percentile(samples, 0.5),
+        'p95_ms': percentile(samples, 0.95),
+        'max_ms': samples[-1],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--port', type=int, default=2525)
+    parser.add_argument('--connect-delay', type=float, default=0.5)
+    parser.add_argument('--message-delay', type=float, default=0.05)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.requests)
+        return
+
+    server = SMTPStandIn(('127.0.0.1', args.port), args.connect_delay, args.message_delay)
+    server.start()
+
+    print(f"{'mode':<12} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10} {'delivered':>10}")
+    for mode, workers in (('inline', '0'), ('dispatcher', '2')):
+        before = server.received
+        env = dict(os.environ)
+        env.update({
+            'MONGODB_DATABASE': 'Chatapp_bench',
+            'SMTP_SERVER': '127.0.0.1',
+            'SMTP_PORT': str(args.port),
+            'SMTP_USE_TLS': 'false',
+            'SMTP_USERNAME': 'bench@example.com',
+            'SMTP_PASSWORD': 'bench',
+            'MAIL_DISPATCHER_WORKERS': workers,
+            'RATE_LIMITING': '0',
+        })
+        output = subprocess.run(
+            [sys.executable, __file__, '--child', '--requests', str(args.requests)],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<12} {result['p50_ms']:>10.1f} {result['p95_ms']:>10.1f} "
+              f"{result['max_ms']:>10.1f} {server.received - before:>10}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
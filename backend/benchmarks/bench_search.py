@@ -0,0 +1,99 @@
+# backend/benchmarks/bench_search.py
+"""
+Search latency against room size.
+
+Seeds rooms of increasing size (up to 1M messages by default) into the
+Chatapp_bench database on MONGODB_URI. Messages are random words from a
+fixed vocabulary, and every room gets the same number of messages with the
+rare word "zephyr". The script builds the text index and times
+search_messages() in each room:
+  - rare:   a word with the same number of matches in every room
+  - common: a vocabulary word, whose matches grow with the room
+  - page 5: the fifth page of the rare search, reached through cursors
+
+Usage:
+    python benchmarks/bench_search.py --rooms 10000,100000,1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+os.environ.setdefault('MONGODB_DATABASE', 'Chatapp_bench')
+
+import db  # noqa: E402
+from bench_pagination import time_call  # noqa: E402
+from indexes import INDEXES  # noqa: E402
+
+VOCABULARY = [
+    'deploy', 'build', 'review', 'merge', 'branch', 'release', 'coffee', 'lunch', 'meeting',
+    'ticket', 'server', 'database', 'query', 'cache', 'latency', 'socket', 'message', 'room',
+]
+RARE_MATCHES = 100
+
+
+def seed(sizes):
+    db.messages_collection.drop()
+    start = datetime.utcnow() - timedelta(days=1)
+    for size in sizes:
+        roomid = f'search-{size}'
+        rare = set(random.sample(range(size), RARE_MATCHES))
+        batch = []
+        for i in range(size):
+            words = random.choices(VOCABULARY, k=8)
+            if i in rare:
+                words[random.randrange(8)] = 'zephyr'
+            batch.append({
+                'roomid': roomid,
+                'username': f'user{i % 50}',
+                'message': ' '.join(words),
+                'timestamp': start + timedelta(milliseconds=i)
+            })
+            if len(batch) == 10000:
+                db.messages_collection.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            db.messages_collection.insert_many(batch, ordered=False)
+    started = time.monotonic()
+    db.messages_collection.create_indexes(INDEXES['messages'])
+    print(f"Built indexes in {time.monotonic() - started:.1f}s")
+
+
+def fifth_page(roomid, limit):
+    cursor = None
+    for _ in range(5):
+        results = db.search_messages(roomid, 'zephyr', limit=limit, after=cursor)
+        if len(results) < limit:
+            break
+        cursor = db.encode_search_cursor(results[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', default='10000,100000,1000000', help='room sizes in messages')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--no-seed', action='store_true')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.rooms.split(',')]
+    if not args.no_seed:
+        random.seed(1)
+        seed(sizes)
+
+    print(f"{'messages':>10} {'rare ms':>10} {'common ms':>10} {'page 5 ms':>10}")
+    for size in sizes:
+        roomid = f'search-{size}'
+        rare = time_call(lambda: db.search_messages(roomid, 'zephyr', limit=args.limit), args.repeat)
+        common = time_call(lambda: db.search_messages(roomid, 'coffee', limit=args.limit), args.repeat)
+        paged = time_call(lambda: fifth_page(roomid, args.limit), args.repeat)
+        print(f"{size:>10} {rare:>10.2f} {common:>10.2f} {paged:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# backend/benchmarks/bench_serialization.py
+"""
+Serializing a history page: per-request formatting against pre-encoded messages.
+
+Compares the previous approach (a dict and isoformat() per message on every
+read, then json.dumps of the whole page) with assembling the page from
+SerializedMessage fragments that were encoded once. No database is needed.
+
+Usage:
+    python benchmarks/bench_serialization.py --rounds 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bson import ObjectId  # noqa: E402
+
+import serialization  # noqa: E402
+from serialization import encode_history_page, serialize_messages  # noqa: E402
+
+
+def make_documents(count):
+    start = datetime.utcnow() - timedelta(seconds=count)
+    return [
+        {
+            '_id': ObjectId(),
+            'roomid': 'bench',
+            'username': f'user{i % 20}',
+            'message': f'This is chat message number {i}, with a bit of text.',
+            'timestamp': start + timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+
+
+def per_request(documents):
+    formatted = [
+        {
+            'id': str(msg['_id']),
+            'username': msg['username'],
+            'message': msg['message'],
+            'timestamp': msg['timestamp'].isoformat() + 'Z'
+        }
+        for msg in documents
+    ]
+    return json.dumps({'messages': formatted, 'next_cursor': None}).encode()
+
+
+def time_per_call(fn, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=2000)
+    args = parser.parse_args()
+
+    backend = 'orjson' if serialization.orjson is not None else 'json'
+    print(f"JSON backend: {backend}")
+    print(f"{'page':>6} {'per-request us':>16} {'pre-encoded us':>16} {'speedup':>9}")
+    for size in (50, 1000):
+        documents = make_documents(size)
+        messages = serialize_messages(documents)
+        assert json.loads(per_request(documents))['messages'] == json.loads(encode_history_page(messages))['messages']
+        rounds = max(args.rounds * 50 // size, 10)
+        before = time_per_call(lambda: per_request(documents), rounds)
+        after = time_per_call(lambda: encode_history_page(messages), rounds)
+        print(f"{size:>6} {before:>16.1f} {after:>16.1f} {before / after:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# backend/benchmarks/bench_slow_consumer.py
+"""
+A stalled reader in a busy room, with and without outbound queue limits.
+
+Builds a python-socketio Server whose room members are engine.io sockets
+drained by reader threads instead of a network transport. One member
+stops reading. The script publishes messages at a fixed rate and reports
+the healthy members' delivery latency and the stalled member's queue depth
+for four setups: no stalled reader, a stalled reader without limits, and a
+stalled reader under each OutboundLimiter policy.
+
+Exits non-zero if a limited run lets the stalled queue exceed its limit or
+never tells the stalled reader to resync (drop_oldest) or never closes it
+(disconnect).
+
+Usage:
+    python benchmarks/bench_slow_consumer.py --members 20 --messages 3000
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import socketio  # noqa: E402
+from engineio.socket import Socket  # noqa: E402
+
+from outbound_limits import OutboundLimiter  # noqa: E402
+
+ROOM = 'busy-room'
+
+
+def build(members, limiter):
+    server = socketio.Server(async_mode='threading')
+    if limiter is not None:
+        limiter.install(server)
+    sockets = []
+    for i in range(members):
+        eio_sid = f'eio{i}'
+        sock = Socket(server.eio, eio_sid)
+        server.eio.sockets[eio_sid] = sock
+        sid = server.manager.connect(eio_sid, '/')
+        server.manager.enter_room(sid, '/', ROOM)
+        sockets.append(sock)
+    return server, sockets
+
+
+def reader(sock, latencies, lock):
+    while True:
+        pkt = sock.queue.get()
+        sock.queue.task_done()
+        if pkt is None:
+            return
+        data = pkt.data
+        if isinstance(data, str) and data.startswith('2['):
+            event, payload = json.loads(data[1:])
+            if event == 'receive_message':
+                with lock:
+                    latencies.append(time.perf_counter() - payload['sent_at'])
+
+
+def run(members, count, rate, stalled, limiter):
+    server, sockets = build(members, limiter)
+    latencies = []
+    lock = threading.Lock()
+    readers = sockets[1:] if stalled else sockets
+    threads = [threading.Thread(target=reader, args=(sock, latencies, lock), daemon=True) for sock in readers]
+    for thread in threads:
+        thread.start()
+
+    interval = 1.0 / rate
+    next_send = time.perf_counter()
+    max_depth = 0
+    for i in range(count):
+        server.emit('receive_message', {'message': f'message {i}', 'sent_at': time.perf_counter()}, room=ROOM)
+        max_depth = max(max_depth, sockets[0].queue.qsize())
+        next_send += interval
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    time.sleep(0.2)
+    stalled_queue = list(sockets[0].queue.queue)
+    for sock in readers:
+        sock.queue.put(None)
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    resyncs = sum(
+        1 for pkt in stalled_queue
+        if pkt is not None and isinstance(pkt.data, str) and pkt.data.startswith('2["resync_required"')
+    )
+    return {
+        'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        'p99_ms': latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000 if latencies else 0.0,
+        'max_depth': max_depth,
+        'resyncs': resyncs,
+        'closed': sockets[0].closed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=3000)
+    parser.add_argument('--rate', type=float, default=500, help='messages per second')
+    parser.add_argument('--max-messages', type=int, default=500)
+    args = parser.parse_args()
+
+    scenarios = [
+        ('no stalled reader', False, None),
+        ('stalled, unlimited', True, None),
+        ('stalled, drop_oldest', True, OutboundLimiter(max_messages=args.max_messages, policy='drop_oldest')),
+        ('stalled, disconnect', True, OutboundLimiter(max_messages=args.max_messages, policy='disconnect')),
+    ]
+    failed = False
+    print(f"{'scenario':<22} {'healthy p50 ms':>15} {'healthy p99 ms':>15} {'stalled depth':>14} "
+          f"{'resyncs':>8} {'closed':>7}")
+    for name, stalled, limiter in scenarios:
+        result = run(args.members, args.messages, args.rate, stalled, limiter)
+        print(f"{name:<22} {result['p50_ms']:>15.2f} {result['p99_ms']:>15.2f} {result['max_depth']:>14} "
+              f"{result['resyncs']:>8} {str(result['closed']):>7}")
+        if limiter is not None:
+            if result['max_depth'] > args.max_messages + 1:
+                failed = True
+            if limiter.policy == 'drop_oldest' and not result['resyncs']:
+                failed = True
+            if limiter.policy == 'disconnect' and not result['closed']:
+                failed = True
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# backend/benchmarks/bench_startup.py
+"""
+Worker startup cost, as paid on every respawn.
+
+Each run starts a fresh interpreter that imports the app, builds it with
+create_app() and serves its first requests through the Flask test client:
+  - import_ms:        `import app`
+  - create_app_ms:    create_app(), without the background warm-up
+  - first_request_ms: the first GET /metrics, which touches no data
+  - first_data_ms:    the first GET /api/recent_rooms, the first data-store
+                      access (with --store mongo, this includes connecting)
+  - total_ms:         process start to the first data response, as seen by
+                      the parent
+
+Medians over --runs are printed as JSON. Use --baseline with an earlier
+result to compare the two; the exit status is non-zero if a figure got
+worse by more than --tolerance.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 10 --output startup.json
+    python benchmarks/bench_startup.py --store mongo --baseline startup.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+FIGURES = ('import_ms', 'create_app_ms', 'first_request_ms', 'first_data_ms', 'total_ms')
+JWT_SECRET = 'bench-startup-secret-0123456789abcdef'
+
+
+def run_child(store):
+    """Runs inside the fresh interpreter and prints its timings."""
+    sys.path.insert(0, BACKEND)
+    started = time.perf_counter()
+    import app as chat_app
+    imported = time.perf_counter()
+    app = chat_app.create_app({
+        'DATA_STORE': 'memory://' if store == 'memory' else '',
+        'JWT_SECRET_KEY': JWT_SECRET,
+        'WARM_UP': False,
+    })
+    created = time.perf_counter()
+
+    client = app.test_client()
+    client.get('/metrics')
+    first_request = time.perf_counter()
+
+    from flask_jwt_extended import create_access_token
+    with app.app_context():
+        token = create_access_token(identity='bench')
+    response = client.get('/api/recent_rooms', headers={'Authorization': f'Bearer {token}'})
+    first_data = time.perf_counter()
+    if response.status_code != 200:
+        print(f"Unexpected response: {response.status_code}", file=sys.stderr)
+
+    print(json.dumps({
+        'import_ms': (imported - started) * 1000,
+        'create_app_ms': (created - imported) * 1000,
+        'first_request_ms': (first_request - created) * 1000,
+        'first_data_ms': (first_data - first_request) * 1000,
+    }), flush=True)
+
+
+def run_once(store):
+    env = dict(os.environ, LOG_LEVEL='WARNING')
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--child', '--store', store],
+        stdout=subprocess.PIPE, env=env, text=True
+    )
+    line = process.stdout.readline()
+    total = (time.perf_counter() - started) * 1000
+    process.wait()
+    if process.returncode or not line:
+        raise SystemExit(f"Startup run failed with exit code {process.returncode}")
+    timings = json.loads(line)
+    timings['total_ms'] = total
+    return timings
+
+
+def compare(baseline, result, tolerance):
+    """Prints each figure against the baseline; returns True if any regressed."""
+    regressed = False
+    print(f"{'figure':<18} {'baseline':>10} {'current':>10} {'change':>9}", file=sys.stderr)
+    for figure in FIGURES:
+        before = baseline['results'].get(figure)
+        after = result['results'].get(figure)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        flag = ''
+        if change > tolerance:
+            regressed = True
+            flag = '  REGRESSED'
+        print(f"{figure:<18} {before:>10} {after:>10} {change:>+8.1%}{flag}", file=sys.stderr)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--store', choices=('memory', 'mongo'), default='memory')
+    parser.add_argument('--output', help='write the JSON result here')
+    parser.add_argument('--baseline', help='earlier JSON result to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.20, help='allowed regression, as a fraction')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.store)
+        return
+
+    runs = [run_once(args.store) for _ in range(args.runs)]
+    results = {
+        figure: round(sorted(run[figure] for run in runs)[len(runs) // 2], 2)
+        for figure in FIGURES
+    }
+    result = {'config': {'runs': args.runs, 'store': args.store}, 'results': results}
+    encoded = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(encoded + '\n')
+    else:
+        print(encoded)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            raise SystemExit(1 if compare(json.load(baseline), result, args.tolerance) else 0)
+
+
+if __name__ == '__main__':
+    main()
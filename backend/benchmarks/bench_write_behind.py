@@ -0,0 +1,84 @@
+# backend/benchmarks/bench_write_behind.py
+"""
+Message persistence throughput: per-message insert_one against write-behind.
+
+Sends the same number of messages from several producer threads, once through
+save_message and once through a MessageWriter, against a scratch database on
+MONGODB_URI. Write-behind is timed until the final flush has completed.
+
+Usage:
+    python benchmarks/bench_write_behind.py --messages 20000 --threads 8
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db  # noqa: E402
+from message_writer import MessageWriter  # noqa: E402
+
+BENCH_DB = 'Chatapp_bench'
+
+
+def run_producers(threads, per_thread, send):
+    def produce(worker):
+        for i in range(per_thread):
+            send(f'room{worker % 4}', f'user{worker}', f'message {i}')
+
+    workers = [threading.Thread(target=produce, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def bench_insert_one(threads, per_thread):
+    started = time.perf_counter()
+    run_producers(threads, per_thread, db.save_message)
+    return time.perf_counter() - started
+
+
+def bench_write_behind(threads, per_thread, batch_size, flush_interval):
+    writer = MessageWriter(batch_size=batch_size, flush_interval=flush_interval)
+    writer.start()
+
+    def send(roomid, username, message):
+        while not writer.submit(db.build_message(roomid, username, message)):
+            pass
+
+    started = time.perf_counter()
+    run_producers(threads, per_thread, send)
+    submitted = time.perf_counter() - started
+    writer.stop(timeout=None)
+    return submitted, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--flush-interval', type=float, default=0.05)
+    args = parser.parse_args()
+
+    per_thread = args.messages // args.threads
+    total = per_thread * args.threads
+    db.messages_collection = db.client.get_database(BENCH_DB).get_collection('messages')
+
+    db.messages_collection.drop()
+    elapsed = bench_insert_one(args.threads, per_thread)
+    print(f"insert_one:   {total / elapsed:10.0f} msg/s ({elapsed:.2f}s)")
+
+    db.messages_collection.drop()
+    submitted, elapsed = bench_write_behind(args.threads, per_thread, args.batch_size, args.flush_interval)
+    print(f"write-behind: {total / elapsed:10.0f} msg/s ({elapsed:.2f}s, "
+          f"{total / submitted:.0f} msg/s accepted)")
+    print(f"stored: {db.messages_collection.count_documents({})} of {total}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,450 @@
+# backend/benchmarks/loadtest.py
+"""
+Reproducible load test of the chat backend.
+
+Boots the app on its threading server (or serve.py with --server gevent) as
+a subprocess. It runs against a throwaway mongod, the MongoDB given with
+--mongo-uri, or the in-memory data store with --memory, and the SMTP
+stand-in as its mail server. A population of Socket.IO clients then
+connects, joins rooms and sends messages at a fixed rate while REST readers
+page through room history. Each message carries its send time, so every
+delivery to every member yields one send-to-receive latency sample.
+
+The result is a JSON document:
+  - send_receive_ms, join_ms and history_read_ms with count/p50/p95/p99/max
+  - messages_per_second (sent) and deliveries_per_second
+  - the server's CPU percentage and peak RSS
+Use --baseline with an earlier result to compare the two runs. The exit
+status is non-zero if a latency percentile or a throughput figure got worse
+by more than --tolerance.
+
+Rate limiting is disabled in the booted server unless passed with --env.
+Requires python-socketio[asyncio_client] (aiohttp).
+
+Usage:
+    python benchmarks/loadtest.py --clients 200 --rooms 20 --rate 1 --duration 30 --output run.json
+    python benchmarks/loadtest.py --clients 200 --rooms 20 --rate 1 --duration 30 --baseline run.json
+    python benchmarks/loadtest.py --memory --clients 50 --duration 10
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000 --pid <server pid> ...
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import aiohttp  # noqa: E402
+import socketio  # noqa: E402
+from pymongo import MongoClient  # noqa: E402
+
+from bench_connections import make_token, read_proc  # noqa: E402
+from smtp_standin import SMTPStandIn  # noqa: E402
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DATABASE = 'Chatapp_load'
+
+# `python app.py` only starts the Werkzeug server in debug mode, which would
+# put the reloader and the debugger into the measurement.
+THREADING_SERVER = (
+    "import os, app; app.socketio.run(app.create_app(), host=os.environ['HOST'], "
+    "port=int(os.environ['PORT']), allow_unsafe_werkzeug=True)"
+)
+
+# Metrics compared against a baseline: (path, True if higher is better)
+COMPARED = (
+    ('send_receive_ms.p50', False),
+    ('send_receive_ms.p95', False),
+    ('send_receive_ms.p99', False),
+    ('join_ms.p99', False),
+    ('history_read_ms.p99', False),
+    ('messages_per_second', True),
+    ('deliveries_per_second', True),
+    ('server.cpu_percent', False),
+    ('server.rss_mib_max', False),
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"process exited with status {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port} after {timeout}s")
+
+
+def start_mongod(binary):
+    """Starts a mongod on a temporary data directory; returns (process, uri, path)."""
+    path = tempfile.mkdtemp(prefix='vibee-loadtest-')
+    port = free_port()
+    process = subprocess.Popen(
+        [binary, '--dbpath', path, '--port', str(port), '--bind_ip', '127.0.0.1', '--quiet'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    wait_for_port(port, process)
+    return process, f'mongodb://127.0.0.1:{port}', path
+
+
+def start_server(args, mongo_uri, smtp_port, secret):
+    port = free_port()
+    env = dict(os.environ)
+    if mongo_uri is None:
+        env['DATA_STORE_URL'] = 'memory://'
+    else:
+        env['MONGODB_URI'] = mongo_uri
+    env.update({
+        'MONGODB_DATABASE': DATABASE,
+        'SECRET_KEY': secret,
+        'JWT_SECRET_KEY': secret,
+        'SMTP_SERVER': '127.0.0.1',
+        'SMTP_PORT': str(smtp_port),
+        'SMTP_USE_TLS': 'false',
+        'SMTP_USERNAME': 'loadtest@localhost',
+        'HOST': '127.0.0.1',
+        'PORT': str(port),
+        'FLASK_DEBUG': '0',
+        'RATE_LIMITING': '0',
+    })
+    env.update(value.split('=', 1) for value in args.env)
+    command = ['serve.py'] if args.server == 'gevent' else ['-c', THREADING_SERVER]
+    process = subprocess.Popen(
+        [sys.executable, *command], cwd=BACKEND, env=env,
+        stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL
+    )
+    wait_for_port(port, process)
+    return process, f'http://127.0.0.1:{port}'
+
+
+def summarize(samples):
+    """Nearest-rank percentiles of a list of seconds, in milliseconds."""
+    if not samples:
+        return {'count': 0, 'p50': None, 'p95': None, 'p99': None, 'max': None}
+    samples = sorted(samples)
+
+    def rank(q):
+        return round(samples[min(int(len(samples) * q), len(samples) - 1)] * 1000, 3)
+
+    return {
+        'count': len(samples),
+        'p50': rank(0.50),
+        'p95': rank(0.95),
+        'p99': rank(0.99),
+        'max': round(samples[-1] * 1000, 3),
+    }
+
+
+class Stats:
+    def __init__(self):
+        self.deliveries = []
+        self.joins = []
+        self.reads = []
+        self.sent = 0
+        self.errors = 0
+        self.join_failures = 0
+        self.rate_limited = 0
+        self.measuring = False
+
+    def delivered(self, text):
+        # Messages look like "lt <client> <seq> <perf_counter at send>"
+        parts = text.split(' ') if isinstance(text, str) else ()
+        if self.measuring and len(parts) == 4 and parts[0] == 'lt':
+            self.deliveries.append(time.perf_counter() - float(parts[3]))
+
+
+async def socket_client(index, url, token, room, stats, started, stop, rate):
+    client = socketio.AsyncClient(reconnection=False)
+    joined = asyncio.get_running_loop().create_future()
+
+    @client.on('previous_messages')
+    async def on_previous_messages(data):
+        if not joined.done():
+            joined.set_result(None)
+
+    @client.on('receive_message')
+    async def on_receive_message(data):
+        stats.delivered(data.get('message'))
+
+    @client.on('receive_messages')
+    async def on_receive_messages(data):
+        for message in data['messages']:
+            stats.delivered(message.get('message'))
+
+    @client.on('error')
+    async def on_error(data):
+        stats.errors += 1
+
+    @client.on('rate_limited')
+    async def on_rate_limited(data):
+        stats.rate_limited += 1
+
+    try:
+        await client.connect(url, auth={'token': token}, transports=['websocket'])
+        join_started = time.perf_counter()
+        await client.emit('join_room', {'roomid': room})
+        await asyncio.wait_for(joined, 30)
+        stats.joins.append(time.perf_counter() - join_started)
+    except Exception:
+        stats.join_failures += 1
+        await client.disconnect()
+        return None
+
+    await started.wait()
+    if rate > 0:
+        seq = 0
+        interval = 1.0 / rate
+        # Spread the senders over the first interval instead of in lockstep
+        await asyncio.sleep(random.random() * interval)
+        next_send = time.perf_counter()
+        while not stop.is_set():
+            await client.emit('send_message', {
+                'roomid': room,
+                'message': f'lt {index} {seq} {time.perf_counter():.6f}'
+            })
+            stats.sent += 1
+            seq += 1
+            next_send += interval
+            await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+    await stop.wait()
+    return client
+
+
+async def rest_reader(session, url, token, rooms, rate, stats, stop):
+    headers = {'Authorization': f'Bearer {token}'}
+    interval = 1.0 / rate
+    while not stop.is_set():
+        room = random.choice(rooms)
+        read_started = time.perf_counter()
+        try:
+            async with session.get(f'{url}/api/messages/{room}', params={'limit': 50}, headers=headers) as response:
+                await response.read()
+                if response.status == 200:
+                    stats.reads.append(time.perf_counter() - read_started)
+                else:
+                    stats.errors += 1
+        except aiohttp.ClientError:
+            stats.errors += 1
+        await asyncio.sleep(interval)
+
+
+async def sample_server(pid, samples, stop):
+    while not stop.is_set():
+        samples.append(read_proc(pid))
+        try:
+            await asyncio.wait_for(stop.wait(), 1.0)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_load(args, url, pid, secret):
+    # make_token signs with JWT_SECRET_KEY
+    os.environ['JWT_SECRET_KEY'] = secret
+    stats = Stats()
+    started = asyncio.Event()
+    stop = asyncio.Event()
+    rooms = [f'load-room-{i}' for i in range(args.rooms)]
+    senders = args.clients if args.senders is None else args.senders
+
+    tasks = []
+    for index in range(args.clients):
+        token = make_token(f'load{index}')
+        rate = args.rate if index < senders else 0
+        tasks.append(asyncio.create_task(
+            socket_client(index, url, token, rooms[index % len(rooms)], stats, started, stop, rate)
+        ))
+        if (index + 1) % args.batch == 0:
+            await asyncio.sleep(0.5)
+    # Wait for every client to have joined (or failed)
+    while len(stats.joins) + stats.join_failures < args.clients:
+        await asyncio.sleep(0.1)
+
+    samples = []
+    async with aiohttp.ClientSession() as session:
+        token = make_token('load-reader')
+        readers = [
+            asyncio.create_task(rest_reader(session, url, token, rooms, args.read_rate, stats, stop))
+            for _ in range(args.readers)
+        ]
+        sampler = asyncio.create_task(sample_server(pid, samples, stop)) if pid else None
+
+        # Warm up, then measure for the configured duration
+        started.set()
+        await asyncio.sleep(args.warmup)
+        stats.measuring = True
+        stats.sent = 0
+        stats.reads.clear()
+        measure_started = time.perf_counter()
+        cpu_started = read_proc(pid)[1] if pid else None
+        await asyncio.sleep(args.duration)
+        stats.measuring = False
+        elapsed = time.perf_counter() - measure_started
+        cpu_used = read_proc(pid)[1] - cpu_started if pid else None
+        sent = stats.sent
+        stop.set()
+
+        await asyncio.gather(*readers)
+        if sampler:
+            await sampler
+    clients = await asyncio.gather(*tasks)
+    await asyncio.gather(*(client.disconnect() for client in clients if client is not None))
+
+    server = None
+    if pid:
+        server = {
+            'cpu_seconds': round(cpu_used, 3),
+            'cpu_percent': round(cpu_used / elapsed * 100, 1),
+            'rss_mib_max': round(max(rss for rss, _ in samples) / 2 ** 20, 1),
+            'rss_mib_end': round(samples[-1][0] / 2 ** 20, 1),
+        }
+    return {
+        'send_receive_ms': summarize(stats.deliveries),
+        'join_ms': summarize(stats.joins),
+        'history_read_ms': summarize(stats.reads),
+        'messages_sent': sent,
+        'deliveries': len(stats.deliveries),
+        'messages_per_second': round(sent / elapsed, 1),
+        'deliveries_per_second': round(len(stats.deliveries) / elapsed, 1),
+        'errors': stats.errors,
+        'join_failures': stats.join_failures,
+        'rate_limited': stats.rate_limited,
+        'server': server,
+    }
+
+
+def lookup(result, path):
+    for part in path.split('.'):
+        if not isinstance(result, dict):
+            return None
+        result = result.get(part)
+    return result
+
+
+def compare(baseline, result, tolerance):
+    """Prints each compared metric against the baseline; returns True if any regressed."""
+    regressed = False
+    print(f"{'metric':<26} {'baseline':>12} {'current':>12} {'change':>9}", file=sys.stderr)
+    for path, higher_is_better in COMPARED:
+        before = lookup(baseline['results'], path)
+        after = lookup(result['results'], path)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        worse = -change if higher_is_better else change
+        flag = ''
+        if worse > tolerance:
+            regressed = True
+            flag = '  REGRESSED'
+        print(f"{path:<26} {before:>12} {after:>12} {change:>+8.1%}{flag}", file=sys.stderr)
+    return regressed
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--senders', type=int, help='clients that send (default: all)')
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=1.0, help='messages per second per sender')
+    parser.add_argument('--readers', type=int, default=5, help='REST history readers')
+    parser.add_argument('--read-rate', type=float, default=5.0, help='requests per second per reader')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds measured')
+    parser.add_argument('--warmup', type=float, default=5.0, help='seconds of load before measuring')
+    parser.add_argument('--batch', type=int, default=100, help='clients connected per half second')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--server', choices=('threading', 'gevent'), default='threading')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for the server, e.g. BROADCAST_BATCHING=1')
+    store = parser.add_mutually_exclusive_group()
+    store.add_argument('--mongo-uri', help='use this MongoDB instead of a throwaway mongod')
+    store.add_argument('--memory', action='store_true',
+                       help='use the in-memory data store (DATA_STORE_URL=memory://) instead of MongoDB')
+    parser.add_argument('--mongod', default='mongod', help='mongod binary for the throwaway instance')
+    parser.add_argument('--url', help='load an already running server instead of booting one')
+    parser.add_argument('--pid', type=int, help='process id of the server given with --url')
+    parser.add_argument('--jwt-secret', help='JWT_SECRET_KEY of the server given with --url')
+    parser.add_argument('--output', help='write the JSON result here instead of stdout')
+    parser.add_argument('--baseline', help='earlier JSON result to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed regression, as a fraction')
+    parser.add_argument('--verbose', action='store_true', help='show the server log')
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    mongod = smtp = server = None
+    data_path = None
+    try:
+        if args.url:
+            url, pid = args.url, args.pid
+            secret = args.jwt_secret or os.environ['JWT_SECRET_KEY']
+        else:
+            if args.memory:
+                mongo_uri = None
+            elif args.mongo_uri:
+                mongo_uri = args.mongo_uri
+                # Every run starts from an empty database
+                MongoClient(mongo_uri).drop_database(DATABASE)
+            else:
+                if shutil.which(args.mongod) is None:
+                    parser.error(f"{args.mongod} not found; pass --mongo-uri or --mongod")
+                mongod, mongo_uri, data_path = start_mongod(args.mongod)
+
+            smtp = SMTPStandIn(('127.0.0.1', free_port()))
+            smtp.start()
+            secret = os.urandom(16).hex()
+            server, url = start_server(args, mongo_uri, smtp.server_address[1], secret)
+            pid = server.pid
+
+        results = asyncio.run(run_load(args, url, pid, secret))
+    finally:
+        for process in (server, mongod):
+            if process is not None:
+                process.terminate()
+                process.wait(10)
+        if smtp is not None:
+            smtp.shutdown()
+        if data_path:
+            shutil.rmtree(data_path, ignore_errors=True)
+
+    config = {key: value for key, value in vars(args).items()
+              if key not in ('output', 'baseline', 'jwt_secret', 'verbose')}
+    result = {'commit': git_commit(), 'config': config, 'results': results}
+    encoded = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(encoded + '\n')
+    else:
+        print(encoded)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            raise SystemExit(1 if compare(json.load(baseline), result, args.tolerance) else 0)
+
+
+if __name__ == '__main__':
+    main()
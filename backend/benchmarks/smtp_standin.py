@@ -0,0 +1,87 @@
+# backend/benchmarks/smtp_standin.py
+"""
+A minimal local SMTP server that accepts and discards mail.
+
+It stands in for a real provider in benchmarks. `--connect-delay` emulates
+the TLS handshake and login of a new session, and `--message-delay` emulates
+per-message delivery latency. It advertises AUTH PLAIN and accepts any
+credentials; STARTTLS is not supported, so run the app with
+SMTP_USE_TLS=false.
+
+Usage:
+    python benchmarks/smtp_standin.py --port 2525 --connect-delay 0.5
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        time.sleep(server.connect_delay)
+        self.reply('220 localhost stand-in ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250-localhost')
+                self.reply('250 AUTH PLAIN')
+            elif command.startswith('AUTH'):
+                self.reply('235 Authentication successful')
+            elif command.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                time.sleep(server.message_delay)
+                with server.lock:
+                    server.received += 1
+                self.reply('250 OK queued')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, connect_delay=0.0, message_delay=0.0):
+        super().__init__(address, SMTPHandler)
+        self.connect_delay = connect_delay
+        self.message_delay = message_delay
+        self.received = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2525)
+    parser.add_argument('--connect-delay', type=float, default=0.5)
+    parser.add_argument('--message-delay', type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = SMTPStandIn((args.host, args.port), args.connect_delay, args.message_delay)
+    print(f"SMTP stand-in listening on {args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
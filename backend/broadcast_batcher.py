@@ -0,0 +1,174 @@
+# backend/broadcast_batcher.py
+
+import heapq
+import math
+import os
+import threading
+import time
+from collections import deque
+
+
+class _RoomState:
+    __slots__ = ('rate', 'last_seen', 'pending', 'deadline', 'outbox', 'draining')
+
+    def __init__(self, now):
+        self.rate = 0.0
+        self.last_seen = now
+        self.pending = []
+        self.deadline = None
+        self.outbox = deque()  # Frames to emit, in order
+        self.draining = False  # True while a thread is emitting the outbox
+
+
+class BroadcastBatcher:
+    """
+    Per-room fan-out batcher for hot rooms.
+
+    Each room's message rate is tracked as an exponentially decaying average.
+    Below `hot_rate` messages per second a room gets every message at once as
+    a single `receive_message` event. Above it, messages arriving within a
+    short window are sent together as one `receive_messages` frame. The window
+    grows with the room's rate from `min_window` to `max_window` seconds.
+    While a batch is pending, every new message joins it. Frames are queued
+    per room and emitted by one thread at a time, the first one to find the
+    room idle, so the order of delivery always matches the order of
+    publish(), also for concurrent publishers.
+    """
+
+    def __init__(self, emit, hot_rate=20.0, min_window=0.002, max_window=0.025,
+                 rate_window=1.0, idle_expiry=60.0):
+        self.emit = emit
+        self.hot_rate = hot_rate
+        self.min_window = min_window
+        self.max_window = max_window
+        self.rate_window = rate_window
+        self.idle_expiry = idle_expiry
+        self.frames = 0
+        self.messages = 0
+        self._rooms = {}
+        self._deadlines = []
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self._last_prune = time.monotonic()
+
+    def _window(self, rate):
+        window = self.min_window * rate / self.hot_rate
+        return min(max(window, self.min_window), self.max_window)
+
+    def publish(self, roomid, payload):
+        now = time.monotonic()
+        with self._condition:
+            state = self._rooms.get(roomid)
+            if state is None:
+                state = self._rooms[roomid] = _RoomState(now)
+            state.rate = state.rate * math.exp(-(now - state.last_seen) / self.rate_window) + 1 / self.rate_window
+            state.last_seen = now
+            self.messages += 1
+
+            if not state.pending and state.rate < self.hot_rate:
+                drain = self._queue(state, 'receive_message', payload)
+            else:
+                drain = False
+                state.pending.append(payload)
+                if state.deadline is None:
+                    state.deadline = now + self._window(state.rate)
+                    heapq.heappush(self._deadlines, (state.deadline, roomid))
+                    self._ensure_thread()
+                    self._condition.notify()
+
+        if drain:
+            self._drain(roomid, state)
+
+    def _queue(self, state, event, data):
+        # Caller holds the lock. Returns True if the caller must drain the
+        # room, because no other thread is emitting its frames.
+        state.outbox.append((event, data))
+        if state.draining:
+            return False
+        state.draining = True
+        return True
+
+    def _drain(self, roomid, state):
+        # Emitted outside the lock, but only by this thread until the outbox
+        # is empty, so frames queued meanwhile cannot overtake each other.
+        while True:
+            with self._condition:
+                if not state.outbox:
+                    state.draining = False
+                    return
+                event, data = state.outbox.popleft()
+            self.frames += 1
+            self.emit(event, data, room=roomid)
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='broadcast-batcher', daemon=True)
+            self._thread.start()
+
+    def _take_due(self, now):
+        due = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, roomid = heapq.heappop(self._deadlines)
+            state = self._rooms.get(roomid)
+            if state is not None and state.pending:
+                if self._queue(state, 'receive_messages', {'messages': state.pending}):
+                    due.append((roomid, state))
+                state.pending = []
+                state.deadline = None
+        return due
+
+    def _prune(self, now):
+        if now - self._last_prune < self.idle_expiry:
+            return
+        self._last_prune = now
+        for roomid in [roomid for roomid, state in self._rooms.items()
+                       if not state.pending and not state.draining
+                       and now - state.last_seen > self.idle_expiry]:
+            del self._rooms[roomid]
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    due = self._take_due(now)
+                    if due or self._stopping:
+                        break
+                    timeout = self._deadlines[0][0] - now if self._deadlines else None
+                    self._condition.wait(timeout)
+                self._prune(now)
+                stopping = self._stopping and not self._deadlines
+
+            # Rooms whose frames another thread is emitting were left to it
+            for roomid, state in due:
+                self._drain(roomid, state)
+            if stopping:
+                return
+
+    def stop(self):
+        """Flushes pending batches and stops the flusher thread."""
+        with self._condition:
+            self._stopping = True
+            for state in self._rooms.values():
+                if state.deadline is not None:
+                    state.deadline = 0
+            self._deadlines = [(0, roomid) for _, roomid in self._deadlines]
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def create_broadcast_batcher(emit):
+    """
+    Returns a BroadcastBatcher if enabled through BROADCAST_BATCHING,
+    otherwise None.
+    """
+    if os.getenv('BROADCAST_BATCHING', '').lower() not in ('1', 'true', 'yes'):
+        return None
+    return BroadcastBatcher(
+        emit,
+        hot_rate=float(os.getenv('BROADCAST_HOT_RATE', 20)),
+        min_window=float(os.getenv('BROADCAST_MIN_WINDOW', 0.002)),
+        max_window=float(os.getenv('BROADCAST_MAX_WINDOW', 0.025))
+    )
@@ -0,0 +1,326 @@
+# backend/data_store.py
+
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+import db
+from db import build_message, decode_cursor, decode_search_cursor, encode_cursor, encode_search_cursor
+from password_pool import hash_password
+from search import query_terms
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def _move_to_front(rooms, joined, limit):
+    """Moves each room in `joined` (oldest first) to the front of `rooms`."""
+    for roomid in joined:
+        rooms = [roomid] + [room for room in rooms if room != roomid]
+    return rooms[:limit]
+
+
+class MemoryDataStore:
+    """
+    Process-local stand-in for the MongoDB data layer in db.py.
+
+    It has the db.py functions the app uses as methods, with the same
+    arguments and results, so create_app() can run without a database (tests,
+    benchmarks, local development). Nothing is persisted. Search matches
+    whole words only: no stemming, phrases or language rules.
+    """
+
+    MESSAGE_STORAGE = 'documents'
+
+    build_message = staticmethod(build_message)
+    encode_cursor = staticmethod(encode_cursor)
+    encode_search_cursor = staticmethod(encode_search_cursor)
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._users = {}
+        self._rooms = {}  # roomid -> messages ordered by (timestamp, _id)
+        self._keys = {}  # roomid -> the (timestamp, _id) of those messages
+        self._messages = {}  # _id -> message
+        self._sequences = {}
+        self._read_cursors = {}
+        self._otps = []
+        self._outbox = {}
+
+    # Users
+    def save_user(self, username, email, password, password_hash=None):
+        if password_hash is None:
+            password_hash = hash_password(password)
+        with self._lock:
+            if username in self._users:
+                return False
+            self._users[username] = {
+                'email': email,
+                'password': password_hash,
+                'is_active': False,
+                'recent_rooms': []
+            }
+            return True
+
+    def user_exists(self, username):
+        return username in self._users
+
+    def get_user_auth(self, username):
+        user = self._users.get(username)
+        if user is None:
+            return None
+        return {'password_hash': user['password'], 'is_active': user['is_active']}
+
+    def get_user_status_by_email(self, email):
+        with self._lock:
+            for username, user in self._users.items():
+                if user['email'] == email:
+                    return {'username': username, 'is_active': user['is_active']}
+        return None
+
+    def activate_user(self, email):
+        with self._lock:
+            for user in self._users.values():
+                if user['email'] == email:
+                    user['is_active'] = True
+                    break
+        return True
+
+    def update_password_hash(self, username, password_hash):
+        with self._lock:
+            if username in self._users:
+                self._users[username]['password'] = password_hash
+        return True
+
+    # Recent rooms
+    def get_recent_rooms(self, username, limit=5):
+        user = self._users.get(username)
+        return list(user['recent_rooms']) if user else []
+
+    def add_recent_room(self, username, roomid, limit=5):
+        return self.add_recent_rooms_bulk({username: [roomid]}, limit)
+
+    def add_recent_rooms_bulk(self, joins, limit=5):
+        with self._lock:
+            for username, rooms in joins.items():
+                user = self._users.get(username)
+                if user is not None:
+                    user['recent_rooms'] = _move_to_front(user['recent_rooms'], rooms, limit)
+        return True
+
+    # Messages
+    def _insert(self, document):
+        # Called with the lock held
+        if document['_id'] in self._messages:
+            return
+        if 'seq' not in document:
+            document['seq'] = self._sequences.get(document['roomid'], 0) + 1
+        roomid = document['roomid']
+        self._sequences[roomid] = max(self._sequences.get(roomid, 0), document['seq'])
+        key = (document['timestamp'], document['_id'])
+        keys = self._keys.setdefault(roomid, [])
+        index = bisect_right(keys, key)
+        keys.insert(index, key)
+        self._rooms.setdefault(roomid, []).insert(index, dict(document))
+        self._messages[document['_id']] = self._rooms[roomid][index]
+
+    def save_message(self, roomid, username, message):
+        with self._lock:
+            # Stamped and numbered together, as db.save_message orders them
+            document = build_message(roomid, username, message)
+            self._insert(document)
+        return document
+
+    def save_messages(self, documents):
+        with self._lock:
+            # Numbered before the insert, as db.save_messages does
+            for document in documents:
+                if 'seq' not in document:
+                    document['seq'] = self._sequences.get(document['roomid'], 0) + 1
+                    self._sequences[document['roomid']] = document['seq']
+            for document in documents:
+                self._insert(document)
+        return []
+
+    def advance_sequence(self, roomid, seq):
+        with self._lock:
+            self._sequences[roomid] = max(self._sequences.get(roomid, 0), seq)
+        return True
+
+    def get_messages(self, roomid, limit=50, offset=0, before=None, after=None):
+        with self._lock:
+            messages = self._rooms.get(roomid, [])
+            keys = self._keys.get(roomid, [])
+            if before:
+                end = bisect_left(keys, decode_cursor(before))
+                page = messages[max(0, end - limit):end]
+            elif after:
+                start = bisect_right(keys, decode_cursor(after))
+                page = messages[start:start + limit]
+            else:
+                end = max(0, len(messages) - offset)
+                page = messages[max(0, end - limit):end]
+            return [dict(message) for message in page]
+
+    def get_messages_since(self, roomid, message_id, limit=50):
+        anchor = self.find_message(roomid, message_id)
+        if anchor is None:
+            return None
+        return self.get_messages(roomid, limit=limit, after=encode_cursor(anchor))
+
+    def find_message(self, roomid, message_id):
+        message = self._messages.get(message_id)
+        if message is None or message['roomid'] != roomid:
+            return None
+        return dict(message)
+
+    def iter_messages(self, roomid, after=None, batch_size=1000):
+        key = decode_cursor(after) if after else None
+        while True:
+            # The lock is only held while copying a batch
+            with self._lock:
+                keys = self._keys.get(roomid, [])
+                start = bisect_right(keys, key) if key else 0
+                page = [dict(message) for message in self._rooms.get(roomid, [])[start:start + batch_size]]
+            yield from page
+            if len(page) < batch_size:
+                return
+            key = (page[-1]['timestamp'], page[-1]['_id'])
+
+    def search_messages(self, roomid, query, limit=20, after=None):
+        terms = set(query_terms(query))
+        excluded = {word.lower() for word in re.findall(r'(?:^|\s)-(\w+)', query)}
+        position = decode_search_cursor(after) if after else None
+        with self._lock:
+            messages = list(self._rooms.get(roomid, []))
+        results = []
+        for message in messages:
+            words = [word.lower() for word in _WORD.findall(message['message'])]
+            score = float(sum(1 for word in words if word in terms))
+            if not score or excluded.intersection(words):
+                continue
+            if position and (score, message['_id']) >= position:
+                continue
+            results.append(dict(message, score=score))
+        results.sort(key=lambda result: (result['score'], result['_id']), reverse=True)
+        return results[:limit]
+
+    # Read cursors
+    def mark_read(self, username, roomid, message_id=None):
+        with self._lock:
+            message = self._messages.get(message_id) if message_id is not None else None
+            # The newest message marks everything read, whatever its number
+            if (message is not None and message['roomid'] == roomid
+                    and message is not self._rooms[roomid][-1]):
+                seq = message['seq']
+            else:
+                seq = self._sequences.get(roomid, 0)
+            key = (username, roomid)
+            self._read_cursors[key] = max(self._read_cursors.get(key, 0), seq)
+            return seq
+
+    def get_unread_counts(self, username, roomids):
+        with self._lock:
+            return {
+                roomid: max(0, self._sequences.get(roomid, 0) - self._read_cursors.get((username, roomid), 0))
+                for roomid in roomids
+            }
+
+    # OTPs
+    def save_otp(self, email, otp, expires_at):
+        with self._lock:
+            self._otps.append({'_id': ObjectId(), 'email': email, 'otp': otp, 'expires_at': expires_at})
+        return True
+
+    def get_otp(self, email, otp):
+        with self._lock:
+            for entry in self._otps:
+                if entry['email'] == email and entry['otp'] == otp:
+                    return dict(entry)
+        return None
+
+    def delete_otp(self, email, otp):
+        with self._lock:
+            for entry in self._otps:
+                if entry['email'] == email and entry['otp'] == otp:
+                    self._otps.remove(entry)
+                    break
+        return True
+
+    def replace_otp(self, email, otp, expires_at):
+        with self._lock:
+            for entry in self._otps:
+                if entry['email'] == email:
+                    entry.update(otp=otp, expires_at=expires_at)
+                    return True
+        return self.save_otp(email, otp, expires_at)
+
+    # Mail outbox
+    def enqueue_mail(self, recipient, subject, body):
+        document = {
+            '_id': ObjectId(),
+            'recipient': recipient,
+            'subject': subject,
+            'body': body,
+            'status': 'pending',
+            'attempts': 0,
+            'next_attempt_at': datetime.utcnow()
+        }
+        with self._lock:
+            self._outbox[document['_id']] = document
+        return True
+
+    def claim_mail(self, limit, lease_seconds=60, max_attempts=None):
+        now = datetime.utcnow()
+        with self._lock:
+            if max_attempts:
+                for document in self._outbox.values():
+                    if (document['status'] == 'sending' and document['lease_until'] < now
+                            and document['attempts'] >= max_attempts):
+                        document.update(status='failed', last_error='Lease expired on the last attempt')
+                        document.pop('lease_until')
+            due = sorted(
+                (document for document in self._outbox.values()
+                 if (document['status'] == 'pending' and document['next_attempt_at'] <= now)
+                 or (document['status'] == 'sending' and document['lease_until'] < now)),
+                key=lambda document: document['next_attempt_at']
+            )[:limit]
+            for document in due:
+                document.update(status='sending', lease_until=now + timedelta(seconds=lease_seconds),
+                                attempts=document['attempts'] + 1)
+            return [dict(document) for document in due]
+
+    def complete_mail(self, mail_ids):
+        with self._lock:
+            for mail_id in mail_ids:
+                document = self._outbox[mail_id]
+                document.update(status='sent', sent_at=datetime.utcnow())
+                document.pop('lease_until', None)
+        return True
+
+    def reschedule_mail(self, mail_id, next_attempt_at, error, failed=False, untried=False):
+        with self._lock:
+            document = self._outbox[mail_id]
+            document.update(
+                status='failed' if failed else 'pending',
+                next_attempt_at=next_attempt_at,
+                last_error=error
+            )
+            if untried:
+                document['attempts'] -= 1
+            document.pop('lease_until', None)
+        return True
+
+
+def create_data_store(url=None):
+    """
+    Builds the data layer selected by DATA_STORE_URL: memory:// for a
+    process-local MemoryDataStore, or empty for MongoDB through db.py.
+    """
+    url = url if url is not None else os.getenv('DATA_STORE_URL', '')
+    if url == 'memory://':
+        return MemoryDataStore()
+    return db
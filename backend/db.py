@@ -1,27 +1,103 @@
 # backend/db.py
 
+import base64
+import logging
 import os
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 
+from bson import ObjectId
+from bson.errors import InvalidId
 from dotenv import load_dotenv
-from pymongo import MongoClient, DESCENDING
-from werkzeug.security import generate_password_hash, check_password_hash
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, CursorNotFound
+from werkzeug.security import check_password_hash
+
+from metrics import mongo_command_metrics, mongo_pool_metrics
+from mongo_config import client_options, read_preference, write_concern
+from password_pool import hash_password
+from user_cache import user_cache
 
 # Load environment variables from .env
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configuration
 MONGODB_URI = os.getenv('MONGODB_URI')  # MongoDB connection string
+MONGODB_DATABASE = os.getenv('MONGODB_DATABASE', 'Chatapp')
+# 'documents' stores one document per message; 'buckets' groups a room's
+# messages into documents of up to MESSAGE_BUCKET_SIZE messages
+MESSAGE_STORAGE = os.getenv('MESSAGE_STORAGE', 'documents')
+MESSAGE_BUCKET_SIZE = int(os.getenv('MESSAGE_BUCKET_SIZE', 200))
+
+
+class _Lazy:
+    """
+    Stands in for a client, database or collection until first used, so
+    importing this module neither connects nor resolves the URI. Attribute
+    access is forwarded to the object built by `resolve`.
+    """
+
+    def __init__(self, resolve):
+        self._resolve = resolve
+        self._target = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        target = self._target
+        if target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._resolve()
+                target = self._target
+        return getattr(target, name)
+
+
+def _connect():
+    # Timing every command and pool checkout for /metrics. Pool size and
+    # timeouts come from mongo_config.
+    return MongoClient(MONGODB_URI, event_listeners=[mongo_command_metrics, mongo_pool_metrics], **client_options())
+
+
+def _collection(name, profile):
+    return _Lazy(lambda: chat_db.get_collection(name, write_concern=write_concern(profile)))
+
 
-# Initialize MongoDB Client
-client = MongoClient(MONGODB_URI)
-chat_db = client.get_database('Chatapp')
+def _view(name, read=None, write=None):
+    # The collection is looked up by name when the view is first used, so a
+    # collection swapped in before then (as the benchmarks do) is honored.
+    def resolve():
+        options = {}
+        if read:
+            options['read_preference'] = read_preference(read)
+        if write:
+            options['write_concern'] = write_concern(write)
+        return globals()[name].with_options(**options)
+    return _Lazy(resolve)
 
-# Collections
-users_collection = chat_db.get_collection('users')
-messages_collection = chat_db.get_collection('messages')  # Collection for messages
-otps_collection = chat_db.get_collection('otps')  # Collection for OTPs
 
+# Initialize the MongoDB Client on first use
+client = _Lazy(_connect)
+chat_db = _Lazy(lambda: client.get_database(MONGODB_DATABASE))
+
+# Collections, each with the write concern of its profile
+users_collection = _collection('users', 'accounts')
+messages_collection = _collection('messages', 'messages')
+otps_collection = _collection('otps', 'accounts')
+mail_outbox_collection = _collection('mail_outbox', 'mail')
+message_buckets_collection = _collection('message_buckets', 'messages')
+rooms_collection = _collection('rooms', 'messages')
+read_cursors_collection = _collection('read_cursors', 'read_state')
+
+# Views routed by operation class. Everything else reads from the primary,
+# so a user always sees their own writes there.
+history_messages = _view('messages_collection', read='history')
+history_buckets = _view('message_buckets_collection', read='history')
+# Recent rooms live on the user document but are written like read state
+recent_rooms_users = _view('users_collection', read='recent_rooms', write='read_state')
+recent_rooms_rooms = _view('rooms_collection', read='recent_rooms')
+recent_rooms_cursors = _view('read_cursors_collection', read='recent_rooms')
 
 # User Model
 class User:
@@ -38,7 +114,7 @@ class User:
 
 
 # User Management Functions
-def save_user(username, email, password):
+def save_user(username, email, password, password_hash=None):
     """
     Saves a new user to the users collection.
     
@@ -46,11 +122,13 @@ def save_user(username, email, password):
         username (str): The username of the user.
         email (str): The user's email address.
         password (str): The user's password.
+        password_hash (str): A precomputed hash of the password, if any.
     
     Returns:
         bool: True if the user was saved successfully, False otherwise.
     """
-    password_hash = generate_password_hash(password)
+    if password_hash is None:
+        password_hash = hash_password(password)
     try:
         users_collection.insert_one({
             '_id': username,
@@ -59,9 +137,10 @@ def save_user(username, email, password):
             'is_active': False,  # Initialize as inactive
             'recent_rooms': []
         })
+        user_cache.invalidate(username)
         return True
     except Exception as e:
-        print(f"Error saving user: {e}")
+        logger.error("Error saving user: %s", e)
         return False
 
 
@@ -87,10 +166,153 @@ def get_user(username):
             )
         return None
     except Exception as e:
-        print(f"Error fetching user: {e}")
+        logger.error("Error fetching user: %s", e)
+        return None
+
+
+def user_exists(username):
+    """
+    Checks whether a user exists without fetching the document.
+    
+    Args:
+        username (str): The username of the user.
+    
+    Returns:
+        bool: True if the user exists, otherwise False.
+    """
+    if user_cache.get('exists', username) is not None:
+        return True
+    try:
+        user_data = users_collection.find_one({'_id': username}, {'_id': 1})
+        user_cache.put('exists', username, user_data)
+        return user_data is not None
+    except Exception as e:
+        logger.error("Error checking user: %s", e)
+        return False
+
+
+def get_user_auth(username):
+    """
+    Retrieves only the fields needed to authenticate a user.
+    
+    Args:
+        username (str): The username of the user.
+    
+    Returns:
+        dict or None: A dict with 'password_hash' and 'is_active', or None
+        if the user does not exist.
+    """
+    cached = user_cache.get('auth', username)
+    if cached is not None:
+        return cached
+    try:
+        user_data = users_collection.find_one({'_id': username}, {'password': 1, 'is_active': 1})
+        if user_data:
+            auth = {'password_hash': user_data['password'], 'is_active': user_data['is_active']}
+            user_cache.put('auth', username, auth)
+            return auth
+        return None
+    except Exception as e:
+        logger.error("Error fetching user: %s", e)
+        return None
+
+
+def get_user_profile(username):
+    """
+    Retrieves a user's public profile, without the password hash.
+    
+    Args:
+        username (str): The username of the user.
+    
+    Returns:
+        dict or None: A dict with 'username', 'email', 'is_active' and
+        'recent_rooms', or None if the user does not exist.
+    """
+    cached = user_cache.get('profile', username)
+    if cached is not None:
+        return cached
+    try:
+        user_data = users_collection.find_one(
+            {'_id': username}, {'email': 1, 'is_active': 1, 'recent_rooms': 1}
+        )
+        if user_data:
+            profile = {
+                'username': user_data['_id'],
+                'email': user_data['email'],
+                'is_active': user_data['is_active'],
+                'recent_rooms': user_data.get('recent_rooms', []),
+            }
+            user_cache.put('profile', username, profile)
+            return profile
+        return None
+    except Exception as e:
+        logger.error("Error fetching user: %s", e)
+        return None
+
+
+def get_user_status_by_email(email):
+    """
+    Retrieves the username and activation state of the user with an email.
+    
+    Args:
+        email (str): The user's email address.
+    
+    Returns:
+        dict or None: A dict with 'username' and 'is_active', or None if no
+        user has this email.
+    """
+    try:
+        user_data = users_collection.find_one({'email': email}, {'is_active': 1})
+        if user_data:
+            return {'username': user_data['_id'], 'is_active': user_data.get('is_active', False)}
+        return None
+    except Exception as e:
+        logger.error("Error fetching user: %s", e)
         return None
 
 
+def activate_user(email):
+    """
+    Marks the user with the given email as active.
+    
+    Args:
+        email (str): The user's email address.
+    
+    Returns:
+        bool: True if the user was updated successfully, False otherwise.
+    """
+    try:
+        user_data = users_collection.find_one_and_update(
+            {'email': email}, {'$set': {'is_active': True}}, projection={'_id': 1}
+        )
+        if user_data:
+            user_cache.invalidate(user_data['_id'])
+        return True
+    except Exception as e:
+        logger.error("Error activating user: %s", e)
+        return False
+
+
+def update_password_hash(username, password_hash):
+    """
+    Replaces a user's password hash, e.g. after the hash policy changed.
+    
+    Args:
+        username (str): The username of the user.
+        password_hash (str): The new password hash.
+    
+    Returns:
+        bool: True if the hash was updated successfully, False otherwise.
+    """
+    try:
+        users_collection.update_one({'_id': username}, {'$set': {'password': password_hash}})
+        user_cache.invalidate(username)
+        return True
+    except Exception as e:
+        logger.error("Error updating password hash: %s", e)
+        return False
+
+
 # Recent Rooms Management
 def get_recent_rooms(username, limit=5):
     """
@@ -104,19 +326,40 @@ def get_recent_rooms(username, limit=5):
         list: A list of recent room IDs.
     """
     try:
-        user_data = users_collection.find_one({'_id': username}, {'recent_rooms': 1})
+        user_data = recent_rooms_users.find_one({'_id': username}, {'recent_rooms': 1})
         if user_data and 'recent_rooms' in user_data:
             return user_data['recent_rooms']
         return []
     except Exception as e:
-        print(f"Error fetching recent rooms: {e}")
+        logger.error("Error fetching recent rooms: %s", e)
         return []
 
 
+def _move_to_front(rooms, limit):
+    """
+    Builds an update pipeline that moves `rooms` (most recent first) to the
+    front of recent_rooms, drops older duplicates and trims to `limit`.
+    """
+    rooms = {'$literal': rooms}
+    return [{'$set': {'recent_rooms': {'$slice': [
+        {'$concatArrays': [
+            rooms,
+            {'$filter': {
+                'input': {'$ifNull': ['$recent_rooms', []]},
+                'cond': {'$not': [{'$in': ['$$this', rooms]}]}
+            }}
+        ]},
+        limit
+    ]}}}]
+
+
 def add_recent_room(username, roomid, limit=5):
     """
     Adds a room to the user's list of recent rooms.
     
+    The room is moved to the front in a single atomic update, so concurrent
+    joins cannot interleave between removing and re-adding it.
+    
     Args:
         username (str): The username of the user.
         roomid (str): The ID of the room to add.
@@ -126,26 +369,46 @@ def add_recent_room(username, roomid, limit=5):
         bool: True if the room was added successfully, False otherwise.
     """
     try:
-        # Remove the room if it already exists to avoid duplicates
-        users_collection.update_one(
-            {'_id': username},
-            {'$pull': {'recent_rooms': roomid}}
-        )
-        # Add the room to the beginning of the list
-        users_collection.update_one(
-            {'_id': username},
-            {'$push': {'recent_rooms': {'$each': [roomid], '$position': 0, '$slice': limit}}}
-        )
+        recent_rooms_users.update_one({'_id': username}, _move_to_front([roomid], limit))
+        user_cache.invalidate(username)
+        return True
+    except Exception as e:
+        logger.error("Error adding recent room: %s", e)
+        return False
+
+
+def add_recent_rooms_bulk(joins, limit=5):
+    """
+    Applies recent-room updates for many users with one bulk write.
+    
+    Args:
+        joins (dict): Maps each username to the rooms joined, oldest first.
+        limit (int): The maximum number of recent rooms to keep.
+    
+    Returns:
+        bool: True if the rooms were added successfully, False otherwise.
+    """
+    if not joins:
+        return True
+    operations = [
+        UpdateOne({'_id': username}, _move_to_front(list(reversed(rooms)), limit))
+        for username, rooms in joins.items()
+    ]
+    try:
+        recent_rooms_users.bulk_write(operations, ordered=False)
         return True
     except Exception as e:
-        print(f"Error adding recent room: {e}")
+        logger.error("Error adding recent rooms: %s", e)
         return False
+    finally:
+        for username in joins:
+            user_cache.invalidate(username)
 
 
 # Message Persistence Functions
-def save_message(roomid, username, message):
+def build_message(roomid, username, message):
     """
-    Saves a message to the messages collection.
+    Builds a message document with a server-assigned id and timestamp.
     
     Args:
         roomid (str): The ID of the room where the message was sent.
@@ -153,43 +416,675 @@ def save_message(roomid, username, message):
         message (str): The message content.
     
     Returns:
-        bool: True if the message was saved successfully, False otherwise.
+        dict: The message document, ready to be inserted.
+    """
+    # MongoDB stores datetimes with millisecond precision; truncate up front
+    # so the document matches what a later read gives back.
+    now = datetime.utcnow()
+    return {
+        '_id': ObjectId(),
+        'roomid': roomid,
+        'username': username,
+        'message': message,
+        'timestamp': now.replace(microsecond=now.microsecond // 1000 * 1000)
+    }
+
+
+def reserve_sequence(roomid, count=1):
+    """
+    Reserves the next `count` sequence numbers of a room.
+    
+    Args:
+        roomid (str): The ID of the room.
+        count (int): How many numbers to reserve.
+    
+    Returns:
+        int: The first reserved number; numbering starts at 1.
+    """
+    room = rooms_collection.find_one_and_update(
+        {'_id': roomid},
+        {'$inc': {'seq': count}},
+        projection={'seq': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return room['seq'] - count + 1
+
+
+def advance_sequence(roomid, seq):
+    """
+    Moves a room's sequence counter up to at least `seq`, for messages that
+    were saved with the numbers they already had (imports).
+    
+    Args:
+        roomid (str): The ID of the room.
+        seq (int): The highest number in use.
+    
+    Returns:
+        bool: True if the counter was updated, otherwise False.
     """
     try:
-        messages_collection.insert_one({
-            'roomid': roomid,
-            'username': username,
-            'message': message,
-            'timestamp': datetime.utcnow()
-        })
+        rooms_collection.update_one({'_id': roomid}, {'$max': {'seq': seq}}, upsert=True)
         return True
     except Exception as e:
-        print(f"Error saving message: {e}")
+        logger.error("Error advancing the sequence of room %s: %s", roomid, e)
         return False
 
 
-def get_messages(roomid, limit=50, offset=0):
+def _assign_sequences(documents):
+    """Numbers the documents that have no 'seq' yet, with one reservation per room."""
+    unnumbered = {}
+    for document in documents:
+        if 'seq' not in document:
+            unnumbered.setdefault(document['roomid'], []).append(document)
+    for roomid, room_documents in unnumbered.items():
+        first = reserve_sequence(roomid, len(room_documents))
+        for offset, document in enumerate(room_documents):
+            document['seq'] = first + offset
+
+
+def save_message(roomid, username, message):
+    """
+    Saves a message to the messages collection, numbered with the room's
+    next sequence number.
+    
+    Args:
+        roomid (str): The ID of the room where the message was sent.
+        username (str): The username of the sender.
+        message (str): The message content.
+    
+    Returns:
+        dict or None: The saved message document, otherwise None.
+    """
+    try:
+        # Numbered first and stamped after, so that sends to one room get
+        # their numbers and timestamps in the same order
+        seq = reserve_sequence(roomid)
+        document = build_message(roomid, username, message)
+        document['seq'] = seq
+        if MESSAGE_STORAGE == 'buckets':
+            message_buckets_collection.update_one(*_bucket_update(roomid, [document]), upsert=True)
+        else:
+            messages_collection.insert_one(document)
+        return document
+    except Exception as e:
+        logger.error("Error saving message: %s", e)
+        return None
+
+
+def save_messages(documents):
+    """
+    Saves a batch of message documents with a single unordered insert.
+    
+    Documents without a sequence number are numbered first, one reservation
+    per room; retried documents keep theirs. Documents that already exist
+    (duplicate _id, e.g. from a retried batch) count as saved.
+    
+    Args:
+        documents (list): Message documents built with build_message.
+    
+    Returns:
+        list: The documents that could not be saved.
+    """
+    try:
+        _assign_sequences(documents)
+    except Exception as e:
+        logger.error("Error numbering messages: %s", e)
+        return list(documents)
+    if MESSAGE_STORAGE == 'buckets':
+        return _save_messages_to_buckets(documents)
+    try:
+        messages_collection.insert_many(documents, ordered=False)
+        return []
+    except BulkWriteError as e:
+        failed = [
+            error['index'] for error in e.details.get('writeErrors', [])
+            if error.get('code') != 11000
+        ]
+        logger.error("Error saving %d of %d messages", len(failed), len(documents))
+        return [documents[index] for index in failed]
+    except Exception as e:
+        logger.error("Error saving messages: %s", e)
+        return list(documents)
+
+
+def encode_cursor(message):
+    """
+    Builds an opaque pagination cursor from a message document.
+    
+    Args:
+        message (dict): A message document with 'timestamp' and '_id'.
+    
+    Returns:
+        str: A URL-safe cursor string.
+    """
+    raw = f"{message['timestamp'].isoformat()}|{message['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor produced by encode_cursor.
+    
+    Args:
+        cursor (str): The cursor string.
+    
+    Returns:
+        tuple: A (timestamp, ObjectId) pair.
+    
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp, _, message_id = raw.partition('|')
+        return datetime.fromisoformat(timestamp), ObjectId(message_id)
+    except (ValueError, TypeError, InvalidId, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _keyset(key, operator):
+    """The $or clauses selecting messages before ('$lt') or after ('$gt') a (timestamp, _id) key."""
+    timestamp, message_id = key
+    return [
+        {'timestamp': {operator: timestamp}},
+        {'timestamp': timestamp, '_id': {operator: message_id}}
+    ]
+
+
+def get_messages(roomid, limit=50, offset=0, before=None, after=None):
     """
     Retrieves messages from a specific room with pagination.
     
+    Keyset pagination on (timestamp, _id) is used when a cursor is given, so
+    every page costs the same regardless of depth. The offset is only applied
+    when no cursor is given and is kept for existing clients.
+    
     Args:
         roomid (str): The ID of the room.
         limit (int): The number of messages to retrieve.
         offset (int): The number of messages to skip.
+        before (str): Cursor; return messages older than this one.
+        after (str): Cursor; return messages newer than this one.
     
     Returns:
-        list: A list of message dictionaries.
+        list: A list of message dictionaries in chronological order.
+    
+    Raises:
+        ValueError: If a cursor is malformed.
     """
+    if MESSAGE_STORAGE == 'buckets':
+        return _get_messages_from_buckets(roomid, limit, offset, before, after)
+
+    query = {'roomid': roomid}
+    direction = DESCENDING
+    if before:
+        query['$or'] = _keyset(decode_cursor(before), '$lt')
+    elif after:
+        query['$or'] = _keyset(decode_cursor(after), '$gt')
+        direction = ASCENDING
+
     try:
-        cursor = messages_collection.find({'roomid': roomid}).sort('timestamp', DESCENDING).skip(offset).limit(limit)
-        messages = list(cursor)
-        messages.reverse()  # To return messages in chronological order
+        cursor = history_messages.find(query).sort([('timestamp', direction), ('_id', direction)])
+        if offset and not (before or after):
+            cursor = cursor.skip(offset)
+        messages = list(cursor.limit(limit))
+        if direction == DESCENDING:
+            messages.reverse()  # To return messages in chronological order
         return messages
     except Exception as e:
-        print(f"Error fetching messages: {e}")
+        logger.error("Error fetching messages: %s", e)
+        return []
+
+
+def get_messages_since(roomid, message_id, limit=50):
+    """
+    Retrieves the messages of a room that follow a given message.
+    
+    Args:
+        roomid (str): The ID of the room.
+        message_id (ObjectId): The ID of the last message the client has.
+        limit (int): The maximum number of messages to retrieve.
+    
+    Returns:
+        list or None: The newer messages in chronological order, or None if
+        the message does not exist in this room.
+    """
+    anchor = find_message(roomid, message_id)
+    if anchor is None:
+        return None
+    return get_messages(roomid, limit=limit, after=encode_cursor(anchor))
+
+
+def find_message(roomid, message_id):
+    """
+    Finds a message of a room by its ID.
+    
+    Args:
+        roomid (str): The ID of the room.
+        message_id (ObjectId): The ID of the message.
+    
+    Returns:
+        dict or None: The message document (with at least '_id' and
+        'timestamp'), or None if it does not exist in this room.
+    """
+    try:
+        if MESSAGE_STORAGE == 'buckets':
+            return _find_bucketed_message(roomid, message_id)
+        return messages_collection.find_one({'_id': message_id, 'roomid': roomid})
+    except Exception as e:
+        logger.error("Error fetching message: %s", e)
+        return None
+
+
+def iter_messages(roomid, after=None, batch_size=1000):
+    """
+    Iterates over all messages of a room in chronological order, for exports.
+    
+    The messages are read through one server-side cursor, `batch_size` per
+    round trip, so memory use does not grow with the room. If the server
+    drops the cursor (e.g. after idling behind a slow consumer), reading
+    continues after the last message yielded.
+    
+    Args:
+        roomid (str): The ID of the room.
+        after (str): Cursor; start after this message.
+        batch_size (int): The number of messages fetched per round trip.
+    
+    Yields:
+        dict: Message documents.
+    
+    Raises:
+        ValueError: If the cursor is malformed.
+        PyMongoError: If reading fails. Unlike the other readers this does
+        not end quietly, so that a failed export cannot pass as complete.
+    """
+    key = decode_cursor(after) if after else None
+    if MESSAGE_STORAGE == 'buckets':
+        yield from _iter_bucketed_messages(roomid, after, batch_size)
+        return
+
+    while True:
+        query = {'roomid': roomid}
+        if key:
+            query['$or'] = _keyset(key, '$gt')
+        cursor = history_messages.find(query).sort([('timestamp', ASCENDING), ('_id', ASCENDING)])
+        try:
+            for document in cursor.batch_size(batch_size):
+                key = (document['timestamp'], document['_id'])
+                yield document
+            return
+        except CursorNotFound:
+            logger.warning("Cursor of room %s expired during an export, reopening it", roomid)
+        except Exception as e:
+            logger.error("Error reading messages of room %s: %s", roomid, e)
+            raise
+        finally:
+            cursor.close()
+
+
+def encode_search_cursor(result):
+    """
+    Builds a cursor continuing a search after a result.
+    
+    Args:
+        result (dict): A search result with 'score' and '_id'.
+    
+    Returns:
+        str: A URL-safe cursor string.
+    """
+    raw = f"{result['score']!r}|{result['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_search_cursor(cursor):
+    """
+    Decodes a cursor produced by encode_search_cursor.
+    
+    Args:
+        cursor (str): The cursor string.
+    
+    Returns:
+        tuple: A (score, ObjectId) pair.
+    
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, _, message_id = base64.urlsafe_b64decode(padded.encode()).decode().partition('|')
+        return float(score), ObjectId(message_id)
+    except (ValueError, TypeError, InvalidId, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def search_messages(roomid, query, limit=20, after=None):
+    """
+    Searches the messages of a room through the text index, best match first.
+    
+    Results are ordered by (text score, _id) descending, and `after` continues
+    from the last result of a previous page.
+    
+    Args:
+        roomid (str): The ID of the room.
+        query (str): Words, "quoted phrases" and -excluded words.
+        limit (int): The maximum number of results.
+        after (str): Cursor from encode_search_cursor.
+    
+    Returns:
+        list: Message dictionaries with an added 'score'.
+    
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    pipeline = [
+        {'$match': {'roomid': roomid, '$text': {'$search': query}}},
+        {'$addFields': {'score': {'$meta': 'textScore'}}},
+    ]
+    if after:
+        score, message_id = decode_search_cursor(after)
+        pipeline.append({'$match': {'$or': [
+            {'score': {'$lt': score}},
+            {'score': score, '_id': {'$lt': message_id}}
+        ]}})
+    pipeline += [{'$sort': {'score': -1, '_id': -1}}, {'$limit': limit}]
+
+    try:
+        return list(history_messages.aggregate(pipeline))
+    except Exception as e:
+        logger.error("Error searching messages: %s", e)
         return []
 
 
+# Bucketed Message Storage
+def _bucket_entry(document):
+    # The room is stored once per bucket, not per message
+    entry = {
+        '_id': document['_id'],
+        'username': document['username'],
+        'message': document['message'],
+        'timestamp': document['timestamp']
+    }
+    if 'seq' in document:
+        entry['seq'] = document['seq']
+    return entry
+
+
+def _unbucket(roomid, entry):
+    document = {
+        '_id': entry['_id'],
+        'roomid': roomid,
+        'username': entry['username'],
+        'message': entry['message'],
+        'timestamp': entry['timestamp']
+    }
+    if 'seq' in entry:
+        document['seq'] = entry['seq']
+    return document
+
+
+def _bucket_update(roomid, documents):
+    """Filter and update appending messages to the room's open bucket."""
+    timestamps = [document['timestamp'] for document in documents]
+    return (
+        {'roomid': roomid, 'count': {'$lt': MESSAGE_BUCKET_SIZE}},
+        {
+            '$push': {'messages': {'$each': [_bucket_entry(document) for document in documents]}},
+            '$inc': {'count': len(documents)},
+            '$min': {'start': min(timestamps)},
+            '$max': {'end': max(timestamps)}
+        }
+    )
+
+
+def build_bucket(documents):
+    """
+    Builds a bucket document from messages of one room.
+    
+    Args:
+        documents (list): Message documents of one room in chronological order.
+    
+    Returns:
+        dict: The bucket document, ready to be inserted.
+    """
+    return {
+        '_id': ObjectId(),
+        'roomid': documents[0]['roomid'],
+        'count': len(documents),
+        'start': documents[0]['timestamp'],
+        'end': documents[-1]['timestamp'],
+        'messages': [_bucket_entry(document) for document in documents]
+    }
+
+
+def _save_messages_to_buckets(documents):
+    """save_messages for bucketed storage: one $push per room and bucket."""
+    groups = {}
+    for document in documents:
+        groups.setdefault(document['roomid'], []).append(document)
+
+    # A batch goes to the open bucket as a whole, so a bucket can exceed
+    # MESSAGE_BUCKET_SIZE by less than one batch.
+    chunks = [
+        room_documents[start:start + MESSAGE_BUCKET_SIZE]
+        for room_documents in groups.values()
+        for start in range(0, len(room_documents), MESSAGE_BUCKET_SIZE)
+    ]
+    try:
+        message_buckets_collection.bulk_write(
+            [UpdateOne(*_bucket_update(chunk[0]['roomid'], chunk), upsert=True) for chunk in chunks],
+            ordered=False
+        )
+        return []
+    except BulkWriteError as e:
+        failed = [chunks[error['index']] for error in e.details.get('writeErrors', [])]
+        logger.error("Error saving %d of %d message batches", len(failed), len(chunks))
+        return [document for chunk in failed for document in chunk]
+    except Exception as e:
+        logger.error("Error saving messages: %s", e)
+        return list(documents)
+
+
+def _get_messages_from_buckets(roomid, limit, offset, before, after):
+    """get_messages for bucketed storage."""
+    try:
+        return _read_bucket_page(roomid, limit, offset, before, after)
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error("Error fetching messages: %s", e)
+        return []
+
+
+def _iter_bucketed_messages(roomid, after, batch_size):
+    """iter_messages for bucketed storage, one page of buckets at a time."""
+    while True:
+        page = _read_bucket_page(roomid, batch_size, 0, None, after)
+        yield from page
+        if len(page) < batch_size:
+            return
+        after = encode_cursor(page[-1])
+
+
+def _read_bucket_page(roomid, limit, offset, before, after):
+    """
+    Reads one page of messages from the room's buckets.
+    
+    Buckets are read newest first (oldest first for `after`) until the page
+    is complete, which is one or two buckets for a page within the bucket
+    size. Buckets may overlap in time (concurrent appends, write-behind
+    batches), so the page is merged by (timestamp, _id) across every bucket
+    that could hold a message of it, and duplicates from retried appends are
+    dropped.
+    """
+    if limit <= 0:
+        return []
+
+    query = {'roomid': roomid}
+    key = None
+    if before:
+        key = decode_cursor(before)
+        query['start'] = {'$lte': key[0]}
+    elif after:
+        key = decode_cursor(after)
+        query['end'] = {'$gte': key[0]}
+    descending = not after
+    needed = limit + (offset if not (before or after) else 0)
+
+    def sort_key(entry):
+        return (entry['timestamp'], entry['_id'])
+
+    def collect(bucket, entries, seen):
+        for entry in bucket['messages']:
+            if entry['_id'] in seen:
+                continue
+            if key is not None and (sort_key(entry) >= key if before else sort_key(entry) <= key):
+                continue
+            seen.add(entry['_id'])
+            entries.append(entry)
+
+    entries, seen, visited = [], set(), []
+    cursor = history_buckets.find(query).sort('end', DESCENDING if descending else ASCENDING)
+    for bucket in cursor.batch_size(4):
+        if descending and len(entries) >= needed:
+            # Every message in this and the remaining buckets is at most
+            # bucket['end'], older than the page's oldest message
+            entries.sort(key=sort_key, reverse=True)
+            if bucket['end'] < entries[needed - 1]['timestamp']:
+                break
+        collect(bucket, entries, seen)
+        visited.append(bucket['_id'])
+        if not descending and len(entries) >= needed:
+            break
+    cursor.close()
+
+    if not descending and len(entries) >= needed:
+        # A bucket ending later can still start before the page's newest
+        # message; such overlaps are rare, so this finds nothing (using
+        # only the index) most of the time.
+        entries.sort(key=sort_key)
+        last_end = max(entry['timestamp'] for entry in entries)
+        overlapping = history_buckets.find({
+            'roomid': roomid,
+            'end': {'$gte': last_end},
+            'start': {'$lte': entries[needed - 1]['timestamp']},
+            '_id': {'$nin': visited}
+        })
+        for bucket in overlapping:
+            collect(bucket, entries, seen)
+
+    entries.sort(key=sort_key, reverse=descending)
+    page = entries[needed - limit:needed]
+    if descending:
+        page.reverse()  # To return messages in chronological order
+    return [_unbucket(roomid, entry) for entry in page]
+
+
+def _find_bucketed_message(roomid, message_id):
+    """
+    Finds a message in the room's buckets. Its ObjectId was created along
+    with its timestamp, which narrows the search to the buckets around it.
+    """
+    created = message_id.generation_time.replace(tzinfo=None)
+    margin = timedelta(minutes=1)
+    bucket = message_buckets_collection.find_one(
+        {
+            'roomid': roomid,
+            'end': {'$gte': created - margin},
+            'start': {'$lte': created + margin},
+            'messages._id': message_id
+        },
+        {'messages.$': 1}
+    )
+    if bucket is None:
+        return None
+    return _unbucket(roomid, bucket['messages'][0])
+
+
+# Read Cursors
+def mark_read(username, roomid, message_id=None):
+    """
+    Records that a user has read a room up to a message.
+    
+    The cursor only moves forward. Without a message id, when the message
+    is unknown or not yet written (write-behind), or when it is the newest
+    message of the room, it moves to the room's counter: concurrent sends
+    can be numbered in a different order than they were stamped and
+    delivered, and a reader who has the newest message has them all.
+    
+    Args:
+        username (str): The username of the reader.
+        roomid (str): The ID of the room.
+        message_id (ObjectId): The newest message the user has seen.
+    
+    Returns:
+        int or None: The sequence number reported as read, or None on failure.
+    """
+    try:
+        seq = None
+        if message_id is not None:
+            if MESSAGE_STORAGE == 'buckets':
+                message = _find_bucketed_message(roomid, message_id)
+            else:
+                message = messages_collection.find_one(
+                    {'_id': message_id, 'roomid': roomid}, {'seq': 1, 'timestamp': 1}
+                )
+            if message and not _is_newest(roomid, message):
+                seq = message.get('seq')
+        if seq is None:
+            room = rooms_collection.find_one({'_id': roomid}, {'seq': 1})
+            seq = room['seq'] if room else 0
+        read_cursors_collection.update_one(
+            {'username': username, 'roomid': roomid},
+            {'$max': {'seq': seq}},
+            upsert=True
+        )
+        return seq
+    except Exception as e:
+        logger.error("Error marking room read: %s", e)
+        return None
+
+
+def _is_newest(roomid, message):
+    """True if no message of the room follows `message` in (timestamp, _id) order."""
+    if MESSAGE_STORAGE == 'buckets':
+        return not _read_bucket_page(roomid, 1, 0, None, encode_cursor(message))
+    key = (message['timestamp'], message['_id'])
+    return messages_collection.find_one({'roomid': roomid, '$or': _keyset(key, '$gt')}, {'_id': 1}) is None
+
+
+def get_unread_counts(username, roomids):
+    """
+    Counts unread messages in several rooms with two batched reads: the
+    rooms' sequence counters and the user's read cursors.
+    
+    Args:
+        username (str): The username of the reader.
+        roomids (list): The IDs of the rooms.
+    
+    Returns:
+        dict: Maps each room ID to its number of unread messages.
+    """
+    if not roomids:
+        return {}
+    try:
+        latest = {
+            room['_id']: room['seq']
+            for room in recent_rooms_rooms.find({'_id': {'$in': roomids}}, {'seq': 1})
+        }
+        read = {
+            cursor['roomid']: cursor['seq']
+            for cursor in recent_rooms_cursors.find(
+                {'username': username, 'roomid': {'$in': roomids}}, {'roomid': 1, 'seq': 1, '_id': 0}
+            )
+        }
+        return {roomid: max(0, latest.get(roomid, 0) - read.get(roomid, 0)) for roomid in roomids}
+    except Exception as e:
+        logger.error("Error counting unread messages: %s", e)
+        return {}
+
+
 # OTP Management Functions
 def save_otp(email, otp, expires_at):
     """
@@ -211,7 +1106,7 @@ def save_otp(email, otp, expires_at):
         })
         return True
     except Exception as e:
-        print(f"Error saving OTP: {e}")
+        logger.error("Error saving OTP: %s", e)
         return False
 
 
@@ -229,7 +1124,7 @@ def get_otp(email, otp):
     try:
         return otps_collection.find_one({'email': email, 'otp': otp})
     except Exception as e:
-        print(f"Error fetching OTP: {e}")
+        logger.error("Error fetching OTP: %s", e)
         return None
 
 
@@ -248,7 +1143,7 @@ def delete_otp(email, otp):
         otps_collection.delete_one({'email': email, 'otp': otp})
         return True
     except Exception as e:
-        print(f"Error deleting OTP: {e}")
+        logger.error("Error deleting OTP: %s", e)
         return False
 
 
@@ -272,5 +1167,169 @@ def update_otp(email, otp, new_otp, new_expires_at):
         )
         return True
     except Exception as e:
-        print(f"Error updating OTP: {e}")
+        logger.error("Error updating OTP: %s", e)
+        return False
+
+
+def replace_otp(email, otp, expires_at):
+    """
+    Replaces the OTP of an email address, creating it if there is none.
+    
+    Args:
+        email (str): The email address associated with the OTP.
+        otp (str): The new OTP code.
+        expires_at (datetime): The expiration time of the OTP.
+    
+    Returns:
+        bool: True if the OTP was saved successfully, False otherwise.
+    """
+    try:
+        otps_collection.update_one(
+            {'email': email},
+            {'$set': {'otp': otp, 'expires_at': expires_at}},
+            upsert=True
+        )
+        return True
+    except Exception as e:
+        logger.error("Error replacing OTP: %s", e)
+        return False
+
+
+# Mail Outbox Functions
+def enqueue_mail(recipient, subject, body):
+    """
+    Durably queues an email for the background mail dispatcher.
+    
+    Args:
+        recipient (str): The recipient's email address.
+        subject (str): The email subject.
+        body (str): The plain-text email body.
+    
+    Returns:
+        bool: True if the email was queued successfully, False otherwise.
+    """
+    try:
+        mail_outbox_collection.insert_one({
+            'recipient': recipient,
+            'subject': subject,
+            'body': body,
+            'status': 'pending',
+            'attempts': 0,
+            'next_attempt_at': datetime.utcnow()
+        })
+        return True
+    except Exception as e:
+        logger.error("Error queueing mail: %s", e)
+        return False
+
+
+def claim_mail(limit, lease_seconds=60, max_attempts=None):
+    """
+    Claims up to `limit` due emails for sending.
+    
+    Each email is leased for `lease_seconds`; if the claiming worker dies
+    without completing it, the email becomes claimable again afterwards.
+    Every claim counts as an attempt, including claims of expired leases,
+    so an email that keeps killing its worker still runs out of attempts.
+    
+    Args:
+        limit (int): The maximum number of emails to claim.
+        lease_seconds (int): How long the claim is held.
+        max_attempts (int): Expired emails with this many attempts are
+            marked failed instead of claimed again; None for no limit.
+    
+    Returns:
+        list: The claimed outbox documents, with `attempts` counting this claim.
+    """
+    now = datetime.utcnow()
+    expired = {'status': 'sending', 'lease_until': {'$lt': now}}
+    if max_attempts:
+        expired['attempts'] = {'$lt': max_attempts}
+    claimed = []
+    try:
+        if max_attempts:
+            parked = mail_outbox_collection.update_many(
+                {'status': 'sending', 'lease_until': {'$lt': now}, 'attempts': {'$gte': max_attempts}},
+                {
+                    '$set': {'status': 'failed', 'last_error': 'Lease expired on the last attempt'},
+                    '$unset': {'lease_until': ''}
+                }
+            )
+            if parked.modified_count:
+                logger.warning("Gave up on %d emails whose last attempt never completed", parked.modified_count)
+        while len(claimed) < limit:
+            document = mail_outbox_collection.find_one_and_update(
+                {'$or': [
+                    {'status': 'pending', 'next_attempt_at': {'$lte': now}},
+                    expired
+                ]},
+                {
+                    '$set': {'status': 'sending', 'lease_until': now + timedelta(seconds=lease_seconds)},
+                    '$inc': {'attempts': 1}
+                },
+                sort=[('next_attempt_at', ASCENDING)],
+                return_document=ReturnDocument.AFTER
+            )
+            if document is None:
+                break
+            claimed.append(document)
+    except Exception as e:
+        logger.error("Error claiming mail: %s", e)
+    return claimed
+
+
+def complete_mail(mail_ids):
+    """
+    Marks claimed emails as sent.
+    
+    Args:
+        mail_ids (list): The ids of the sent outbox documents.
+    
+    Returns:
+        bool: True if the emails were updated successfully, False otherwise.
+    """
+    if not mail_ids:
+        return True
+    try:
+        mail_outbox_collection.update_many(
+            {'_id': {'$in': mail_ids}},
+            {'$set': {'status': 'sent', 'sent_at': datetime.utcnow()}, '$unset': {'lease_until': ''}}
+        )
+        return True
+    except Exception as e:
+        logger.error("Error completing mail: %s", e)
+        return False
+
+
+def reschedule_mail(mail_id, next_attempt_at, error, failed=False, untried=False):
+    """
+    Puts an email back after a failed delivery, or gives up on it. The
+    attempt itself was counted when the email was claimed.
+    
+    Args:
+        mail_id (ObjectId): The id of the outbox document.
+        next_attempt_at (datetime): When to try again.
+        error (str): A description of the failure.
+        failed (bool): True to give up on the email.
+        untried (bool): True if the email was claimed but never sent, so
+            the attempt counted by the claim is given back.
+    
+    Returns:
+        bool: True if the email was updated successfully, False otherwise.
+    """
+    update = {
+        '$set': {
+            'status': 'failed' if failed else 'pending',
+            'next_attempt_at': next_attempt_at,
+            'last_error': error
+        },
+        '$unset': {'lease_until': ''}
+    }
+    if untried:
+        update['$inc'] = {'attempts': -1}
+    try:
+        mail_outbox_collection.update_one({'_id': mail_id}, update)
+        return True
+    except Exception as e:
+        logger.error("Error rescheduling mail: %s", e)
         return False
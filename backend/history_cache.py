@@ -0,0 +1,188 @@
+# backend/history_cache.py
+
+import os
+import threading
+from collections import OrderedDict, deque
+
+# Rough per-message overhead of the payload dict, datetime and ObjectId, in
+# bytes. Payload strings are counted through the encoded form.
+_MESSAGE_OVERHEAD = 400
+
+
+def _message_size(message):
+    return _MESSAGE_OVERHEAD + 2 * len(message.encoded)
+
+
+class _RoomBuffer:
+    __slots__ = ('messages', 'complete', 'size')
+
+    def __init__(self, capacity):
+        self.messages = deque(maxlen=capacity)
+        # True when the buffer holds the room's entire history, so requests
+        # for more messages than are buffered can still be answered.
+        self.complete = False
+        self.size = 0
+
+
+class HistoryCache:
+    """
+    Per-room ring buffers of the most recent messages, held as
+    serialization.SerializedMessage objects.
+
+    Rooms are filled on the first read and appended to as messages are sent.
+    Cold rooms are evicted in LRU order once the global byte budget is
+    exceeded. A miss always falls back to the loader, so a restart or an
+    eviction is invisible to clients.
+    """
+
+    def __init__(self, per_room=50, max_bytes=64 * 1024 * 1024):
+        self.per_room = per_room
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._rooms = OrderedDict()
+        self._bytes = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.per_room > 0
+
+    def get(self, roomid, limit):
+        """
+        Returns the newest `limit` messages of a room, or None on a miss.
+        """
+        with self._lock:
+            buffer = self._rooms.get(roomid)
+            if buffer is None or (len(buffer.messages) < limit and not buffer.complete):
+                self.misses += 1
+                return None
+            self._rooms.move_to_end(roomid)
+            self.hits += 1
+            messages = list(buffer.messages)
+        return messages[-limit:] if limit < len(messages) else messages
+
+    def get_since(self, roomid, message_id):
+        """
+        Returns the cached messages newer than `message_id`, or None if the
+        room is not cached or the message is no longer in its buffer.
+        """
+        with self._lock:
+            buffer = self._rooms.get(roomid)
+            if buffer is not None:
+                messages = list(buffer.messages)
+                for index in range(len(messages) - 1, -1, -1):
+                    if messages[index].id == message_id:
+                        self._rooms.move_to_end(roomid)
+                        self.hits += 1
+                        return messages[index + 1:]
+            self.misses += 1
+            return None
+
+    def begin_fill(self, roomid):
+        """
+        Marks a fill as in flight. Must be called before reading from Mongo
+        so that a message appended during the read invalidates the fill.
+        """
+        with self._lock:
+            state = self._inflight.setdefault(roomid, [0, False])
+            state[0] += 1
+
+    def fill(self, roomid, messages, requested):
+        """
+        Stores the result of a Mongo read of `requested` messages.
+        """
+        with self._lock:
+            state = self._inflight.get(roomid)
+            stale = False
+            if state is not None:
+                stale = state[1]
+                state[0] -= 1
+                if state[0] <= 0:
+                    del self._inflight[roomid]
+            if stale or roomid in self._rooms:
+                return
+
+            buffer = _RoomBuffer(self.per_room)
+            for message in messages[-self.per_room:]:
+                buffer.messages.append(message)
+                buffer.size += _message_size(message)
+            buffer.complete = len(messages) < requested
+            self._rooms[roomid] = buffer
+            self._bytes += buffer.size
+            self._evict()
+
+    def append(self, roomid, message):
+        """
+        Appends a newly saved message to a cached room.
+        """
+        with self._lock:
+            buffer = self._rooms.get(roomid)
+            if buffer is None:
+                state = self._inflight.get(roomid)
+                if state is not None:
+                    state[1] = True
+                return
+
+            if len(buffer.messages) == buffer.messages.maxlen:
+                dropped = buffer.messages[0]
+                buffer.size -= _message_size(dropped)
+                self._bytes -= _message_size(dropped)
+                buffer.complete = False
+            buffer.messages.append(message)
+            buffer.size += _message_size(message)
+            self._bytes += _message_size(message)
+            self._rooms.move_to_end(roomid)
+            self._evict()
+
+    def get_messages(self, roomid, limit, loader):
+        """
+        Serves the newest `limit` messages of a room from the cache, loading
+        them with `loader(roomid, limit)` on a miss.
+        """
+        if not self.enabled or limit <= 0:
+            return loader(roomid, limit)
+
+        messages = self.get(roomid, limit)
+        if messages is not None:
+            return messages
+
+        requested = max(limit, self.per_room)
+        self.begin_fill(roomid)
+        messages = loader(roomid, requested)
+        self.fill(roomid, messages, requested)
+        return messages[-limit:] if limit < len(messages) else messages
+
+    def invalidate(self, roomid):
+        with self._lock:
+            buffer = self._rooms.pop(roomid, None)
+            if buffer is not None:
+                self._bytes -= buffer.size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rooms': len(self._rooms),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _evict(self):
+        # Caller holds the lock. The most recently used room is never
+        # evicted, even if it alone exceeds the budget.
+        while self._bytes > self.max_bytes and len(self._rooms) > 1:
+            _, buffer = self._rooms.popitem(last=False)
+            self._bytes -= buffer.size
+            self.evictions += 1
+
+
+def create_history_cache():
+    """Builds a HistoryCache sized by HISTORY_CACHE_PER_ROOM and HISTORY_CACHE_MAX_BYTES."""
+    return HistoryCache(
+        per_room=int(os.getenv('HISTORY_CACHE_PER_ROOM', 50)),
+        max_bytes=int(os.getenv('HISTORY_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    )
@@ -0,0 +1,313 @@
+# backend/history_export.py
+"""
+Exports the history of a room as newline-delimited JSON, and imports it.
+
+Each line is one message, oldest first:
+    {"id":"...","roomid":"lobby","username":"ana","message":"hi","timestamp":"2024-05-01T12:00:00.123000Z","seq":41}
+
+Exports read the room through one server-side cursor (iter_messages) and are
+written batch by batch, so memory use is the same for any room size. Output
+files ending in .gz are gzip-compressed. An export can start after a given
+message (--since, e.g. the last one of an interrupted .gz export, printed
+with each progress line) or continue an uncompressed file after its last
+complete line (--resume).
+
+Imports read a plain or .gz file and save it with unordered bulk inserts of
+--batch messages (save_messages). Messages keep their IDs and sequence
+numbers, and the target room's counter is moved past the highest one, so
+importing a file again skips the messages already there without changing
+unread counts. Lines without a number (older exports) are numbered on
+import. Since IDs are kept, --room renames a room on its way into another
+database; it cannot copy a room within the same one.
+
+Usage:
+    python history_export.py export lobby -o lobby.ndjson.gz
+    python history_export.py export lobby -o lobby.ndjson --resume
+    python history_export.py import lobby.ndjson.gz [--room lobby-copy] [--batch 1000]
+"""
+
+import argparse
+import gzip
+import logging
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+import db
+from serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_EVERY = 100000
+
+
+def encode_line(document):
+    """Encodes a message document as one NDJSON line (bytes, with the newline)."""
+    record = {
+        'id': str(document['_id']),
+        'roomid': document['roomid'],
+        'username': document['username'],
+        'message': document['message'],
+        'timestamp': document['timestamp'].isoformat() + 'Z'
+    }
+    if 'seq' in document:
+        record['seq'] = document['seq']
+    return dumps(record) + b'\n'
+
+
+def decode_line(line, roomid=None):
+    """
+    Decodes an NDJSON line into a message document for save_messages.
+
+    Args:
+        line (bytes): One line written by encode_line.
+        roomid (str): Import into this room instead of the exported one.
+
+    Returns:
+        dict: The message document, with its sequence number if the line has one.
+
+    Raises:
+        ValueError: If the line is not a valid message.
+    """
+    try:
+        record = loads(line)
+        document = {
+            '_id': ObjectId(record['id']),
+            'roomid': roomid or record['roomid'],
+            'username': record['username'],
+            'message': record['message'],
+            'timestamp': datetime.fromisoformat(record['timestamp'].rstrip('Z'))
+        }
+        if record.get('seq') is not None:
+            document['seq'] = int(record['seq'])
+        return document
+    except (KeyError, TypeError, AttributeError, ValueError, InvalidId) as e:
+        raise ValueError(f"Invalid message line: {line[:80]!r}") from e
+
+
+def export_chunks(store, roomid, after=None, batch_size=1000):
+    """
+    Yields the room's history as NDJSON, one chunk of `batch_size` lines at a time.
+
+    Args:
+        store: The data store (db or a MemoryDataStore).
+        roomid (str): The ID of the room.
+        after (str): Cursor; start after this message.
+        batch_size (int): Messages per chunk and per database round trip.
+    """
+    lines = []
+    for document in store.iter_messages(roomid, after=after, batch_size=batch_size):
+        lines.append(encode_line(document))
+        if len(lines) == batch_size:
+            yield b''.join(lines)
+            lines = []
+    if lines:
+        yield b''.join(lines)
+
+
+def gzip_chunks(chunks, level=6):
+    """Compresses a stream of byte chunks into a gzip stream, chunk by chunk."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_room(store, roomid, output, after=None, batch_size=1000, progress=None):
+    """
+    Writes the room's history to a binary file object.
+
+    Args:
+        store: The data store.
+        roomid (str): The ID of the room.
+        output: The file to write to; flushed before each progress call.
+        after (str): Cursor; start after this message.
+        batch_size (int): Messages per database round trip.
+        progress (callable): Called with (count, last message id) every
+            PROGRESS_EVERY messages, once that much has been flushed.
+
+    Returns:
+        int: The number of messages written.
+    """
+    count = 0
+    lines = []
+    for document in store.iter_messages(roomid, after=after, batch_size=batch_size):
+        lines.append(encode_line(document))
+        count += 1
+        if len(lines) == batch_size or (progress and count % PROGRESS_EVERY == 0):
+            output.write(b''.join(lines))
+            lines = []
+        if progress and count % PROGRESS_EVERY == 0:
+            output.flush()
+            progress(count, document['_id'])
+    output.write(b''.join(lines))
+    output.flush()
+    return count
+
+
+def read_lines(path):
+    """
+    Yields the complete lines of a plain or .gz export.
+
+    A truncated file (an export that was killed) ends at its last complete
+    line, with a warning.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as source:
+        try:
+            for line in source:
+                if not line.endswith(b'\n'):
+                    logger.warning("Skipping the incomplete last line of %s", path)
+                    return
+                yield line
+        except EOFError:
+            logger.warning("%s is truncated; stopping at its last complete line", path)
+
+
+def import_lines(store, lines, roomid=None, batch_size=1000):
+    """
+    Saves exported lines with one unordered insert per `batch_size` messages.
+
+    Messages keep their sequence numbers, so nothing is reserved for
+    messages that turn out to exist already, and each room's counter is
+    then advanced past the numbers imported.
+
+    Args:
+        store: The data store.
+        lines: NDJSON lines, e.g. from read_lines.
+        roomid (str): Import into this room instead of the exported ones.
+        batch_size (int): Messages per insert.
+
+    Returns:
+        tuple: The number of messages read and the number that could not be saved.
+
+    Raises:
+        ValueError: If the store keeps messages in buckets, where a message
+            that exists already would be appended a second time.
+    """
+    if store.MESSAGE_STORAGE == 'buckets':
+        raise ValueError("import needs MESSAGE_STORAGE=documents; bucketed storage cannot skip "
+                         "messages that exist already. Import first, then run migrate_buckets.py")
+    count = failed = 0
+    batch = []
+
+    def save(batch):
+        highest = {}
+        for document in batch:
+            if 'seq' in document:
+                highest[document['roomid']] = max(highest.get(document['roomid'], 0), document['seq'])
+        # Before the insert, so messages sent meanwhile are numbered after these
+        for room, seq in highest.items():
+            store.advance_sequence(room, seq)
+        return len(store.save_messages(batch))
+
+    for line in lines:
+        if not line.strip():
+            continue
+        batch.append(decode_line(line, roomid))
+        if len(batch) == batch_size:
+            failed += save(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        failed += save(batch)
+        count += len(batch)
+    return count, failed
+
+
+def resume_point(path):
+    """
+    Finds where an uncompressed export left off and drops any partial last line.
+
+    Returns:
+        dict or None: The last exported message (with '_id' and 'timestamp'),
+        or None if the file has no complete line.
+    """
+    with open(path, 'r+b') as output:
+        position = output.seek(0, os.SEEK_END)
+        tail = b''
+        # Read backwards until the tail holds a complete line
+        while position > 0 and tail.count(b'\n') < 2:
+            step = min(65536, position)
+            position -= step
+            output.seek(position)
+            tail = output.read(step) + tail
+        complete = tail[:tail.rfind(b'\n') + 1]
+        output.truncate(position + len(complete))
+    lines = complete.splitlines()
+    return decode_line(lines[-1]) if lines else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help='write a room to an NDJSON file')
+    export.add_argument('room')
+    export.add_argument('-o', '--output', help='output file, gzip-compressed if it ends in .gz (default: stdout)')
+    export.add_argument('--since', help='start after this message ID')
+    export.add_argument('--resume', action='store_true', help='continue an uncompressed output file')
+    export.add_argument('--batch', type=int, default=1000, help='messages per round trip')
+    load = commands.add_parser('import', help='load an NDJSON file')
+    load.add_argument('file')
+    load.add_argument('--room', help='import into this room instead of the exported one')
+    load.add_argument('--batch', type=int, default=1000, help='messages per insert')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    started = time.monotonic()
+    if args.command == 'import':
+        try:
+            count, failed = import_lines(db, read_lines(args.file), args.room, args.batch)
+        except ValueError as e:
+            parser.error(str(e))
+        elapsed = time.monotonic() - started
+        print(f"Imported {count - failed} of {count} messages in {elapsed:.1f}s", file=sys.stderr)
+        raise SystemExit(1 if failed else 0)
+
+    if args.resume and (not args.output or args.output.endswith('.gz')):
+        parser.error("--resume needs an uncompressed --output file; use --since for .gz exports")
+    if args.resume and args.since:
+        parser.error("use either --resume or --since")
+
+    after = None
+    mode = 'wb'
+    if args.since:
+        try:
+            anchor = db.find_message(args.room, ObjectId(args.since))
+        except InvalidId:
+            anchor = None
+        if anchor is None:
+            parser.error(f"message {args.since} not found in room {args.room}")
+        after = db.encode_cursor(anchor)
+    elif args.resume and os.path.exists(args.output):
+        anchor = resume_point(args.output)
+        after = db.encode_cursor(anchor) if anchor else None
+        mode = 'ab'
+
+    def progress(count, last_id):
+        print(f"{count} messages, through {last_id}", file=sys.stderr)
+
+    if not args.output:
+        output = sys.stdout.buffer
+    elif args.output.endswith('.gz'):
+        output = gzip.open(args.output, mode, compresslevel=6)
+    else:
+        output = open(args.output, mode)
+    try:
+        count = export_room(db, args.room, output, after, args.batch, progress)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    elapsed = time.monotonic() - started
+    print(f"Exported {count} messages in {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+# backend/indexes.py
+
+import logging
+import os
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from db import (
+    mail_outbox_collection, message_buckets_collection, messages_collection,
+    otps_collection, read_cursors_collection, users_collection
+)
+
+logger = logging.getLogger(__name__)
+
+OTP_GRACE_SECONDS = int(os.getenv('OTP_GRACE_SECONDS', 3600))
+
+# Index definitions per collection. Names are fixed so that re-running the
+# bootstrap is a no-op once the indexes exist.
+INDEXES = {
+    'messages': [
+        IndexModel(
+            [('roomid', ASCENDING), ('timestamp', ASCENDING), ('_id', ASCENDING)],
+            name='roomid_timestamp_id'
+        ),
+        # Full-text search within one room; roomid must be matched exactly
+        IndexModel([('roomid', ASCENDING), ('message', TEXT)], name='roomid_message_text'),
+    ],
+    'message_buckets': [
+        # Newest-first page reads; `start` is filtered within the index
+        IndexModel(
+            [('roomid', ASCENDING), ('end', DESCENDING), ('start', ASCENDING)],
+            name='roomid_end_start'
+        ),
+        # Finding the open bucket to append to
+        IndexModel([('roomid', ASCENDING), ('count', ASCENDING)], name='roomid_count'),
+    ],
+    'read_cursors': [
+        IndexModel([('username', ASCENDING), ('roomid', ASCENDING)], name='username_roomid_unique', unique=True),
+    ],
+    'users': [
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+    ],
+    'otps': [
+        IndexModel([('email', ASCENDING), ('otp', ASCENDING)], name='email_otp'),
+        # Documents are removed OTP_GRACE_SECONDS after expires_at, so
+        # verify_otp can still tell an expired code from a wrong one.
+        IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=OTP_GRACE_SECONDS),
+    ],
+    'mail_outbox': [
+        IndexModel([('status', ASCENDING), ('next_attempt_at', ASCENDING)], name='status_next_attempt'),
+        IndexModel([('status', ASCENDING), ('lease_until', ASCENDING)], name='status_lease'),
+        # Sent emails are kept for a day for troubleshooting.
+        IndexModel([('sent_at', ASCENDING)], name='sent_at_ttl', expireAfterSeconds=86400),
+    ],
+}
+
+COLLECTIONS = {
+    'messages': messages_collection,
+    'message_buckets': message_buckets_collection,
+    'read_cursors': read_cursors_collection,
+    'users': users_collection,
+    'otps': otps_collection,
+    'mail_outbox': mail_outbox_collection,
+}
+
+# Representative shapes of every query issued from db.py and app.py, used by
+# check_query_coverage. Values are placeholders; only the shape matters.
+QUERIES = [
+    ('get_user', 'users', {'_id': 'alice'}, None),
+    ('find user by email', 'users', {'email': 'alice@example.com'}, None),
+    ('get_messages', 'messages', {'roomid': 'lobby'},
+     [('timestamp', -1), ('_id', -1)]),
+    ('get_messages (buckets)', 'message_buckets', {'roomid': 'lobby', 'start': {'$lte': 0}},
+     [('end', -1)]),
+    ('get_unread_counts', 'read_cursors', {'username': 'alice', 'roomid': {'$in': ['lobby']}}, None),
+    ('append to bucket', 'message_buckets', {'roomid': 'lobby', 'count': {'$lt': 200}}, None),
+    ('get_otp', 'otps', {'email': 'alice@example.com', 'otp': '123456'}, None),
+    ('find otp by email', 'otps', {'email': 'alice@example.com'}, None),
+    ('claim_mail', 'mail_outbox', {'status': 'pending', 'next_attempt_at': {'$lte': 0}},
+     [('next_attempt_at', 1)]),
+]
+
+_indexes_ensured = False
+
+
+def ensure_indexes():
+    """
+    Creates the indexes in INDEXES if they do not exist yet.
+
+    Safe to call repeatedly; only the first call in a process does any work.
+
+    Returns:
+        bool: True if every index is in place, False otherwise.
+    """
+    global _indexes_ensured
+    if _indexes_ensured:
+        return True
+
+    ok = True
+    for name, models in INDEXES.items():
+        try:
+            COLLECTIONS[name].create_indexes(models)
+        except OperationFailure as e:
+            # Typically an existing index with the same keys but different
+            # options, or duplicate emails preventing the unique index.
+            logger.error("Error creating indexes on %s: %s", name, e)
+            ok = False
+        except Exception as e:
+            logger.error("Error creating indexes on %s: %s", name, e)
+            ok = False
+
+    _indexes_ensured = ok
+    return ok
+
+
+def _plan_stages(plan):
+    """Yields every stage name in an explain plan tree."""
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def check_query_coverage():
+    """
+    Explains every query in QUERIES and reports those not served by an index.
+
+    A query is reported when its winning plan contains a collection scan or
+    a blocking in-memory sort.
+
+    Returns:
+        list: (query name, stages) tuples for every uncovered query.
+    """
+    uncovered = []
+    for name, collection_name, query, sort in QUERIES:
+        cursor = COLLECTIONS[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.limit(50).explain().get('queryPlanner', {}).get('winningPlan', {})
+        stages = list(_plan_stages(plan))
+        if 'COLLSCAN' in stages or 'SORT' in stages:
+            uncovered.append((name, stages))
+    return uncovered
+
+
+if __name__ == '__main__':
+    ensure_indexes()
+    problems = check_query_coverage()
+    for name, stages in problems:
+        print(f"Query '{name}' is not covered by an index: {' -> '.join(stages)}")
+    if not problems:
+        print("All queries are covered by an index.")
+    raise SystemExit(1 if problems else 0)
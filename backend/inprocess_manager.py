@@ -0,0 +1,44 @@
+# backend/inprocess_manager.py
+
+import queue
+import threading
+
+from socketio import PubSubManager
+
+
+class InProcessManager(PubSubManager):
+    """
+    Socket.IO client manager that fans messages out between servers living in
+    the same process, standing in for Redis or Kafka.
+
+    Every server created with the same channel behaves like a separate node
+    attached to one message queue, so the multi-node mode (room broadcasts,
+    cross-node emits) can be exercised without any external service.
+    """
+
+    name = 'inprocess'
+    _channels = {}
+    _channels_lock = threading.Lock()
+
+    def __init__(self, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._inbox = queue.Queue()
+        if not write_only:
+            with self._channels_lock:
+                self._channels.setdefault(channel, []).append(self._inbox)
+
+    def _publish(self, data):
+        with self._channels_lock:
+            inboxes = list(self._channels.get(self.channel, []))
+        for inbox in inboxes:
+            inbox.put(data)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+    @classmethod
+    def reset(cls):
+        """Detaches every server from every channel."""
+        with cls._channels_lock:
+            cls._channels.clear()
@@ -0,0 +1,81 @@
+# backend/launcher.py
+"""
+Runs several chat server processes on one host.
+
+Worker i listens on --port + i. All workers must share a message queue
+(SOCKETIO_MESSAGE_QUEUE) so room broadcasts reach clients on every worker,
+and should share a session store (SESSION_STORE_URL). Put a load balancer
+with sticky sessions (e.g. nginx ip_hash) in front of the workers; sticky
+sessions are only optional for clients that use the websocket transport
+exclusively.
+
+Usage:
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 \\
+    SESSION_STORE_URL=redis://localhost:6379/0 \\
+    python launcher.py --workers 4 --port 5000
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def spawn(index, args):
+    env = dict(os.environ)
+    env['HOST'] = args.host
+    env['PORT'] = str(args.port + index)
+    env['FLASK_DEBUG'] = '0'
+    entry_point = 'serve.py' if args.gevent else 'app.py'
+    process = subprocess.Popen([sys.executable, entry_point], cwd=BACKEND_DIR, env=env)
+    print(f"Worker {index} (pid {process.pid}) listening on {args.host}:{args.port + index}")
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--gevent', action='store_true', help='run workers through serve.py')
+    args = parser.parse_args()
+
+    queue_url = os.getenv('SOCKETIO_MESSAGE_QUEUE', '')
+    if args.workers > 1 and (not queue_url or queue_url == 'memory://'):
+        parser.error("SOCKETIO_MESSAGE_QUEUE must point at a shared queue (e.g. redis://) to run several workers")
+    if args.workers > 1 and not os.getenv('SESSION_STORE_URL'):
+        print("Warning: SESSION_STORE_URL is not set; sessions and presence are per worker")
+
+    workers = [spawn(index, args) for index in range(args.workers)]
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in workers:
+            if process.poll() is None:
+                process.terminate()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while not stopping:
+        for index, process in enumerate(workers):
+            if process.poll() is not None and not stopping:
+                print(f"Worker {index} exited with code {process.returncode}, restarting")
+                workers[index] = spawn(index, args)
+        time.sleep(1)
+
+    for process in workers:
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+if __name__ == '__main__':
+    main()
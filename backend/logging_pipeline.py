@@ -0,0 +1,200 @@
+# backend/logging_pipeline.py
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+from metrics import registry
+
+# Structured fields whose values are never written out
+REDACTED_FIELDS = frozenset({'message', 'body', 'password', 'otp', 'token'})
+
+# event: (fraction of records kept, most records written per second)
+DEFAULT_POLICIES = {
+    'message_sent': (0.01, 10),
+    'room_joined': (1.0, 50),
+    'user_connected': (1.0, 50),
+    'user_disconnected': (1.0, 50),
+}
+
+log_records_dropped_total = registry.counter(
+    'vibee_log_records_dropped_total', 'Log records that were not written', ['reason']
+)
+_dropped_queue_full = log_records_dropped_total.labels('queue_full')
+_dropped_sampled = log_records_dropped_total.labels('sampled')
+_dropped_rate_capped = log_records_dropped_total.labels('rate_capped')
+
+
+class _EventPolicy:
+    __slots__ = ('sample_rate', 'max_per_second', 'window', 'count')
+
+    def __init__(self, sample_rate, max_per_second):
+        self.sample_rate = sample_rate
+        self.max_per_second = max_per_second
+        self.window = 0
+        self.count = 0
+
+
+class EventSampler:
+    """
+    Decides per event name whether a record is written.
+
+    A record is first sampled with the event's sample rate, then counted
+    against a cap of records per second. Events without a policy always
+    pass. The per-second count is not locked, so under contention the cap
+    is approximate.
+    """
+
+    def __init__(self, policies=None):
+        self.configure(DEFAULT_POLICIES if policies is None else policies)
+
+    def configure(self, policies):
+        self._policies = {
+            event: _EventPolicy(sample_rate, max_per_second)
+            for event, (sample_rate, max_per_second) in policies.items()
+        }
+
+    def allow(self, event):
+        policy = self._policies.get(event)
+        if policy is None:
+            return True
+        if policy.sample_rate < 1.0 and random.random() >= policy.sample_rate:
+            _dropped_sampled.inc()
+            return False
+        second = int(time.monotonic())
+        if policy.window != second:
+            policy.window = second
+            policy.count = 0
+        if policy.count >= policy.max_per_second:
+            _dropped_rate_capped.inc()
+            return False
+        policy.count += 1
+        return True
+
+
+def parse_policies(spec):
+    """
+    Parses LOG_SAMPLING, e.g. 'message_sent=0.01:10,room_joined=1:50', on
+    top of DEFAULT_POLICIES.
+    """
+    policies = dict(DEFAULT_POLICIES)
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        event, _, value = item.partition('=')
+        sample_rate, _, max_per_second = value.partition(':')
+        policies[event.strip()] = (float(sample_rate), int(max_per_second or 1000000))
+    return policies
+
+
+sampler = EventSampler()
+
+
+def log_event(logger, event, level=logging.INFO, **fields):
+    """
+    Logs a structured event, subject to the event's sampling policy.
+
+    Nothing is formatted here: the fields travel with the record and are
+    rendered, with REDACTED_FIELDS masked, by the writer thread.
+    """
+    if not logger.isEnabledFor(level) or not sampler.allow(event):
+        return
+    logger.log(level, event, extra={'event': event, 'fields': fields})
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to a bounded queue, dropping them when it is full."""
+
+    def prepare(self, record):
+        # The stock handler formats the message here; leave that to the writer
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped_queue_full.inc()
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Renders records as text lines, or as JSON objects with `json_lines`.
+    Structured fields follow the message as key=value pairs.
+    """
+
+    def __init__(self, json_lines=False):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+        self.json_lines = json_lines
+
+    @staticmethod
+    def _redact(key, value):
+        if key in REDACTED_FIELDS:
+            return f'<redacted {len(value)} chars>' if isinstance(value, str) else '<redacted>'
+        return value
+
+    def format(self, record):
+        fields = getattr(record, 'fields', None) or {}
+        fields = {key: self._redact(key, value) for key, value in fields.items()}
+        if not self.json_lines:
+            line = super().format(record)
+            if fields:
+                line += ' ' + ' '.join(f'{key}={json.dumps(value, default=str)}' for key, value in fields.items())
+            return line
+
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(fields)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _Writer(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room rather than fail on a full queue when stopping
+        self.queue.put(self._sentinel)
+
+
+_listener = None
+
+
+def configure_logging():
+    """
+    Routes the root logger through a bounded queue to a background writer.
+
+    LOG_LEVEL, LOG_FORMAT (text or json), LOG_FILE, LOG_QUEUE_SIZE and
+    LOG_SAMPLING configure it. Only the first call in a process does any
+    work. The writer is stopped, flushing what is queued, at exit.
+
+    Returns:
+        QueueListener: The running writer.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter = StructuredFormatter(json_lines=os.getenv('LOG_FORMAT', 'text') == 'json')
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if os.getenv('LOG_FILE'):
+        handlers.append(logging.FileHandler(os.getenv('LOG_FILE')))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', 10000)))
+    root = logging.getLogger()
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    root.handlers = [NonBlockingQueueHandler(log_queue)]
+    sampler.configure(parse_policies(os.getenv('LOG_SAMPLING')))
+
+    _listener = _Writer(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
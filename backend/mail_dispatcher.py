@@ -0,0 +1,196 @@
+# backend/mail_dispatcher.py
+
+import logging
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+import db
+from metrics import smtp_connect_seconds, smtp_send_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPConnection:
+    """A persistent, authenticated SMTP session that reconnects on demand."""
+
+    def __init__(self, host, port, use_tls=True, username=None, password=None,
+                 timeout=30, idle_check=60):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.idle_check = idle_check
+        self._smtp = None
+        self._last_used = 0.0
+
+    def _open(self):
+        started = time.perf_counter()
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        smtp_connect_seconds.labels().observe(time.perf_counter() - started)
+        return smtp
+
+    def _ensure(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_check:
+            # Servers drop idle sessions; probe before reusing an old one.
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self.close()
+            except smtplib.SMTPException:
+                self.close()
+            except OSError:
+                self.close()
+        if self._smtp is None:
+            self._smtp = self._open()
+
+    def send(self, message):
+        self._ensure()
+        started = time.perf_counter()
+        try:
+            self._smtp.send_message(message)
+        except Exception:
+            smtp_send_seconds.labels('error').observe(time.perf_counter() - started)
+            raise
+        smtp_send_seconds.labels('ok').observe(time.perf_counter() - started)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+
+class MailDispatcher:
+    """
+    Sends queued emails from background workers.
+
+    enqueue() stores the email in the Mongo outbox and returns immediately.
+    Each of the `workers` threads owns one persistent SMTP connection, claims
+    up to `batch_size` due emails at a time and sends them over that
+    connection. Failed deliveries are retried with exponential backoff until
+    `max_attempts` is reached. The outbox lives in `store`, the db module
+    unless another data layer is given.
+    """
+
+    def __init__(self, host, port, sender, use_tls=True, username=None, password=None,
+                 workers=2, batch_size=20, max_attempts=5, backoff=5.0, max_backoff=600.0,
+                 poll_interval=1.0, store=None):
+        self.store = store if store is not None else db
+        self.sender = sender
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.sent = 0
+        self.failed = 0
+        self._connection_options = {
+            'host': host, 'port': port, 'use_tls': use_tls,
+            'username': username, 'password': password,
+        }
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'mail-dispatcher-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=10):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, recipient, subject, body):
+        """
+        Durably queues an email.
+
+        Returns:
+            bool: True if the email was queued, False otherwise.
+        """
+        queued = self.store.enqueue_mail(recipient, subject, body)
+        if queued:
+            self._wakeup.set()
+        return queued
+
+    def build_message(self, document):
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = document['recipient']
+        message['Subject'] = document['subject']
+        message.set_content(document['body'])
+        return message
+
+    def _retry_at(self, attempts):
+        delay = min(self.backoff * 2 ** attempts, self.max_backoff)
+        return datetime.utcnow() + timedelta(seconds=delay)
+
+    def _retry(self, document, error):
+        # Counted when the email was claimed
+        attempts = document.get('attempts', 1)
+        give_up = attempts >= self.max_attempts
+        self.store.reschedule_mail(document['_id'], self._retry_at(attempts), error, failed=give_up)
+        if give_up:
+            self.failed += 1
+
+    def _send_batch(self, connection, batch):
+        sent = []
+        try:
+            for index, document in enumerate(batch):
+                try:
+                    connection.send(self.build_message(document))
+                    sent.append(document['_id'])
+                except smtplib.SMTPRecipientsRefused as e:
+                    # Permanent for this address; retrying will not help.
+                    self.store.reschedule_mail(document['_id'], datetime.utcnow(), str(e), failed=True)
+                    self.failed += 1
+                except (smtplib.SMTPException, OSError) as e:
+                    connection.close()
+                    logger.error("Failed to send mail: %s", e)
+                    self._retry(document, str(e))
+                    # The connection is gone; put the rest of the batch back
+                    # too, without charging the attempt they never had.
+                    for pending in batch[index + 1:]:
+                        self.store.reschedule_mail(pending['_id'], self._retry_at(0), str(e), untried=True)
+                    break
+                except Exception as e:
+                    # Something wrong with this email, not the connection.
+                    logger.exception("Failed to send mail %s", document['_id'])
+                    self._retry(document, str(e))
+        finally:
+            self.store.complete_mail(sent)
+            self.sent += len(sent)
+
+    def _run(self):
+        connection = SMTPConnection(**self._connection_options)
+        try:
+            while not self._stopping.is_set():
+                try:
+                    batch = self.store.claim_mail(self.batch_size, max_attempts=self.max_attempts)
+                    if batch:
+                        self._send_batch(connection, batch)
+                        continue
+                except Exception:
+                    # Keep the worker alive; anything left claimed is picked
+                    # up again when its lease expires.
+                    logger.exception("Mail dispatcher error")
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+        finally:
+            connection.close()
@@ -0,0 +1,181 @@
+# backend/message_writer.py
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import db
+
+
+class MessageWriter:
+    """
+    Write-behind persistence for chat messages.
+
+    Messages are queued by submit() and written by a background thread with
+    insert_many, whenever `batch_size` messages are waiting or
+    `flush_interval` seconds have passed. The queue is bounded: submit()
+    blocks for at most `put_timeout` seconds and then reports the writer as
+    overloaded. Failed writes are retried up to `max_retries` times and then
+    parked in `failed` until retry_failed() is called. Messages are saved
+    through `store`, the db module unless another data layer is given.
+    unsaved() returns a room's messages that are not in the store yet, so
+    readers can merge them into what they load.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=0.05, max_queue=10000,
+                 put_timeout=0.5, max_retries=3, retry_delay=0.5, on_failure=None, store=None):
+        self.store = store if store is not None else db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.on_failure = on_failure
+        self.failed = {}
+        self.written = 0
+        self.batches = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._retry = deque()
+        self._attempts = {}
+        self._unsaved = {}  # roomid -> {_id: document}, until saved or parked
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='message-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, document):
+        """
+        Queues a message document for writing.
+
+        Returns:
+            bool: True if queued, False if the queue stayed full or the
+            writer is shutting down.
+        """
+        if self._stopping.is_set():
+            return False
+        # Tracked before queueing, so the writer cannot save it first
+        with self._lock:
+            self._unsaved.setdefault(document['roomid'], {})[document['_id']] = document
+        try:
+            self._queue.put(document, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            with self._lock:
+                self._forget(document)
+            return False
+
+    def unsaved(self, roomid):
+        """The room's submitted messages that have not been saved yet (retries included)."""
+        with self._lock:
+            return list(self._unsaved.get(roomid, {}).values())
+
+    def _forget(self, document):
+        # Caller holds the lock
+        documents = self._unsaved.get(document['roomid'])
+        if documents is not None:
+            documents.pop(document['_id'], None)
+            if not documents:
+                del self._unsaved[document['roomid']]
+
+    def retry_failed(self):
+        """Requeues every message parked in `failed`."""
+        with self._lock:
+            documents = list(self.failed.values())
+            self.failed.clear()
+            for document in documents:
+                self._attempts.pop(document['_id'], None)
+                self._unsaved.setdefault(document['roomid'], {})[document['_id']] = document
+                self._retry.append(document)
+        return len(documents)
+
+    def pending(self):
+        return self._queue.qsize() + len(self._retry)
+
+    def stop(self, timeout=10):
+        """Stops accepting messages and flushes everything still queued."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _next_batch(self):
+        batch = []
+        with self._lock:
+            while self._retry and len(batch) < self.batch_size:
+                batch.append(self._retry.popleft())
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        failed = self.store.save_messages(batch)
+        self.written += len(batch) - len(failed)
+        self.batches += 1
+        failed_ids = {document['_id'] for document in failed}
+        with self._lock:
+            for document in batch:
+                if document['_id'] not in failed_ids:
+                    self._forget(document)
+        if not failed:
+            return
+
+        parked = []
+        with self._lock:
+            for document in failed:
+                attempts = self._attempts.get(document['_id'], 0) + 1
+                if attempts > self.max_retries:
+                    self._attempts.pop(document['_id'], None)
+                    self._forget(document)
+                    self.failed[document['_id']] = document
+                    parked.append(document)
+                else:
+                    self._attempts[document['_id']] = attempts
+                    self._retry.append(document)
+        # Outside the lock: the callback emits, and submit() and unsaved()
+        # must not wait on a slow client.
+        if self.on_failure:
+            for document in parked:
+                self.on_failure(document)
+        # Give the database a moment before the retried batch goes out.
+        time.sleep(self.retry_delay)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+            elif self._stopping.is_set() and self._queue.empty() and not self._retry:
+                break
+
+
+def create_message_writer(on_failure=None, store=None):
+    """
+    Returns a started MessageWriter if write-behind mode is enabled through
+    MESSAGE_WRITE_BEHIND, otherwise None.
+    """
+    if os.getenv('MESSAGE_WRITE_BEHIND', '').lower() not in ('1', 'true', 'yes'):
+        return None
+    writer = MessageWriter(
+        batch_size=int(os.getenv('MESSAGE_WRITE_BATCH_SIZE', 200)),
+        flush_interval=float(os.getenv('MESSAGE_WRITE_FLUSH_INTERVAL', 0.05)),
+        max_queue=int(os.getenv('MESSAGE_WRITE_MAX_QUEUE', 10000)),
+        on_failure=on_failure,
+        store=store
+    )
+    writer.start()
+    return writer
@@ -0,0 +1,331 @@
+# backend/metrics.py
+
+import functools
+import threading
+import time
+import weakref
+from bisect import bisect_right
+
+from pymongo import monitoring
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Row:
+    __slots__ = ('values', 'owner', '__weakref__')
+
+    def __init__(self, owner, width):
+        self.values = [0] * width
+        self.owner = owner
+
+    def __del__(self):
+        # The thread (or greenlet) that owned this row has ended
+        self.owner._retire(self.values)
+
+
+class _Shards:
+    """
+    Per-thread rows of numbers that are only summed when collected.
+
+    A thread writes to its own row without any locking. Rows belong to a
+    thread-local, so when a thread ends its row is folded into `_retired`
+    and the totals never go backwards.
+    """
+
+    def __init__(self, width):
+        self.width = width
+        self._local = threading.local()
+        self._rows = weakref.WeakSet()
+        self._retired = [0] * width
+        self._lock = threading.RLock()
+
+    def row(self):
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = _Row(self, self.width)
+            with self._lock:
+                self._rows.add(row)
+            self._local.row = row
+        return row.values
+
+    def _retire(self, values):
+        with self._lock:
+            for i, value in enumerate(values):
+                self._retired[i] += value
+
+    def totals(self):
+        with self._lock:
+            totals = list(self._retired)
+            for row in list(self._rows):
+                for i, value in enumerate(row.values):
+                    totals[i] += value
+        return totals
+
+
+class Counter:
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        self._shards.row()[0] += amount
+
+    def collect(self):
+        return self._shards.totals()[0]
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One slot per bucket, one for +Inf, then the sum
+        self._shards = _Shards(len(self.buckets) + 2)
+
+    def observe(self, value):
+        row = self._shards.row()
+        row[bisect_right(self.buckets, value)] += 1
+        row[-1] += value
+
+    def time(self):
+        """Decorator observing the duration of every call."""
+        def decorator(f):
+            @functools.wraps(f)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    def collect(self):
+        totals = self._shards.totals()
+        return totals[:-1], totals[-1]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Family:
+    """A named metric with one child per combination of label values."""
+
+    def __init__(self, kind, name, documentation, labelnames, factory):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """
+        Returns the child for these label values. Hot paths should look
+        children up once and keep them.
+        """
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._factory()
+        return child
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.documentation}')
+        lines.append(f'# TYPE {self.name} {self.kind}')
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            if self.kind == 'counter':
+                lines.append(f'{self.name}{_format_labels(self.labelnames, values)} {child.collect()}')
+                continue
+            counts, total = child.collect()
+            cumulative = 0
+            for bound, count in zip(child.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                labels = _format_labels(self.labelnames, values, 'le="' + le + '"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+
+
+class _Gauge:
+    """A value read from a callback when the metrics are collected."""
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.documentation}')
+        lines.append(f'# TYPE {self.name} gauge')
+        lines.append(f'{self.name} {self.callback()}')
+
+
+class Registry:
+    """
+    Metrics exposed in the Prometheus text format.
+
+    Counters and histograms are written to per-thread rows without locks and
+    summed only by render(), so recording a sample costs a thread-local
+    lookup and a couple of list updates.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name, build):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = build()
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(name, lambda: _Family('counter', name, documentation, labelnames, Counter))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(name, lambda: _Family(
+            'histogram', name, documentation, labelnames, lambda: Histogram(buckets)
+        ))
+
+    def gauge(self, name, documentation, callback):
+        return self._register(name, lambda: _Gauge(name, documentation, callback))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.render(lines)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    'vibee_http_request_duration_seconds', 'Flask route latency', ['route', 'method']
+)
+http_requests_total = registry.counter(
+    'vibee_http_requests_total', 'Flask requests by response status', ['route', 'method', 'status']
+)
+socketio_event_seconds = registry.histogram(
+    'vibee_socketio_event_duration_seconds', 'Socket.IO handler latency', ['event']
+)
+mongo_command_seconds = registry.histogram(
+    'vibee_mongodb_command_duration_seconds', 'MongoDB command latency', ['command', 'collection']
+)
+mongo_command_failures_total = registry.counter(
+    'vibee_mongodb_command_failures_total', 'Failed MongoDB commands', ['command', 'collection']
+)
+mongo_pool_wait_seconds = registry.histogram(
+    'vibee_mongodb_pool_wait_duration_seconds', 'Time spent waiting to check out a pooled MongoDB connection'
+)
+mongo_pool_checkouts_total = registry.counter(
+    'vibee_mongodb_pool_checkouts_total', 'MongoDB connection checkouts by outcome', ['outcome']
+)
+smtp_send_seconds = registry.histogram(
+    'vibee_smtp_send_duration_seconds', 'Time to hand one email to the SMTP server', ['outcome']
+)
+smtp_connect_seconds = registry.histogram(
+    'vibee_smtp_connect_duration_seconds', 'Time to open and authenticate an SMTP session'
+)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command by command name and collection."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        name = event.command_name
+        target = event.command.get('collection') if name == 'getMore' else event.command.get(name)
+        self._collections[(event.request_id, event.connection_id)] = target if isinstance(target, str) else ''
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.request_id, event.connection_id), '')
+        mongo_command_seconds.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.request_id, event.connection_id), '')
+        mongo_command_seconds.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        mongo_command_failures_total.labels(event.command_name, collection).inc()
+
+
+mongo_command_metrics = MongoCommandMetrics()
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Counts connection checkouts and times the wait for a free connection.
+    The in-use and open gauges are differences of counters, so no event
+    takes a lock.
+    """
+
+    def __init__(self):
+        self._wait = mongo_pool_wait_seconds.labels()
+        self._checked_out = mongo_pool_checkouts_total.labels('ok')
+        self._checked_in = Counter()
+        self._created = Counter()
+        self._closed = Counter()
+        registry.gauge(
+            'vibee_mongodb_pool_connections_in_use', 'Pooled MongoDB connections checked out',
+            lambda: self._checked_out.collect() - self._checked_in.collect()
+        )
+        registry.gauge(
+            'vibee_mongodb_pool_connections', 'Open pooled MongoDB connections',
+            lambda: self._created.collect() - self._closed.collect()
+        )
+
+    def connection_checked_out(self, event):
+        self._checked_out.inc()
+        self._wait.observe(event.duration)
+
+    def connection_check_out_failed(self, event):
+        # reason is 'timeout', 'poolClosed' or 'connectionError'
+        mongo_pool_checkouts_total.labels(event.reason).inc()
+        self._wait.observe(event.duration)
+
+    def connection_checked_in(self, event):
+        self._checked_in.inc()
+
+    def connection_created(self, event):
+        self._created.inc()
+
+    def connection_closed(self, event):
+        self._closed.inc()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+mongo_pool_metrics = MongoPoolMetrics()
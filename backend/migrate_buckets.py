@@ -0,0 +1,94 @@
+# backend/migrate_buckets.py
+"""
+Converts per-message documents into bucketed storage (MESSAGE_STORAGE=buckets).
+
+Each room's messages are read in (timestamp, _id) order and written as
+buckets of MESSAGE_BUCKET_SIZE messages, `--batch` buckets per insert. The
+last bucket of a room stays open for new messages. A room's existing buckets
+are replaced, so the tool can be re-run and resumed with --start-after.
+
+Run it while the app still uses per-message storage, then once more right
+before switching MESSAGE_STORAGE to pick up what was written meanwhile. The
+`messages` collection is left in place.
+
+Buckets have no message-level index. The app refuses to start with buckets
+unless search is turned off (MESSAGE_SEARCH=0), and history_export.py
+refuses to import into them, as it could not skip messages that exist
+already; import before migrating.
+
+Usage:
+    python migrate_buckets.py [--rooms lobby,general] [--start-after ROOM] [--batch 50]
+"""
+
+import argparse
+import time
+
+from db import (
+    MESSAGE_BUCKET_SIZE, MESSAGE_STORAGE, build_bucket,
+    message_buckets_collection, messages_collection
+)
+from indexes import ensure_indexes
+
+
+def migrate_room(roomid, batch=50):
+    """
+    Rebuilds the buckets of one room from its per-message documents.
+
+    Args:
+        roomid (str): The ID of the room.
+        batch (int): The number of buckets written per insert.
+
+    Returns:
+        tuple: The number of messages and buckets written.
+    """
+    message_buckets_collection.delete_many({'roomid': roomid})
+    cursor = messages_collection.find({'roomid': roomid}).sort([('timestamp', 1), ('_id', 1)]).batch_size(1000)
+
+    messages = buckets = 0
+    chunk, pending = [], []
+    for document in cursor:
+        chunk.append(document)
+        if len(chunk) == MESSAGE_BUCKET_SIZE:
+            pending.append(build_bucket(chunk))
+            chunk = []
+        if len(pending) >= batch:
+            message_buckets_collection.insert_many(pending, ordered=False)
+            buckets += len(pending)
+            pending = []
+        messages += 1
+    if chunk:
+        pending.append(build_bucket(chunk))
+    if pending:
+        message_buckets_collection.insert_many(pending, ordered=False)
+        buckets += len(pending)
+    return messages, buckets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', help='comma-separated rooms to convert (default: all)')
+    parser.add_argument('--start-after', help='skip rooms up to and including this one')
+    parser.add_argument('--batch', type=int, default=50, help='buckets per insert')
+    args = parser.parse_args()
+
+    if MESSAGE_STORAGE == 'buckets':
+        # Rebuilding a room's buckets would drop what the app appended to them
+        parser.error("stop the app's bucketed writes first: MESSAGE_STORAGE is set to 'buckets'")
+
+    ensure_indexes()
+    rooms = args.rooms.split(',') if args.rooms else sorted(messages_collection.distinct('roomid'))
+    if args.start_after:
+        rooms = [roomid for roomid in rooms if roomid > args.start_after]
+
+    started = time.monotonic()
+    total = 0
+    for roomid in rooms:
+        messages, buckets = migrate_room(roomid, args.batch)
+        total += messages
+        print(f"{roomid}: {messages} messages in {buckets} buckets")
+    elapsed = time.monotonic() - started
+    print(f"Converted {total} messages in {len(rooms)} rooms in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
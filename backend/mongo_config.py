@@ -0,0 +1,126 @@
+# backend/mongo_config.py
+
+import functools
+import os
+
+from pymongo import read_preferences
+from pymongo.write_concern import WriteConcern
+
+# Operation class: (read preference mode, max staleness in seconds or -1)
+DEFAULT_READ_ROUTES = {
+    'default': ('primary', -1),
+    # get_messages, get_messages_since and search_messages
+    'history': ('primary', -1),
+    # get_recent_rooms and get_unread_counts
+    'recent_rooms': ('primary', -1),
+}
+
+# Write profile: (w, journal)
+DEFAULT_WRITE_CONCERNS = {
+    # Messages and room sequence counters: acknowledged by the primary
+    'messages': (1, False),
+    # Read cursors and recent rooms, rewritten on every visit
+    'read_state': (1, False),
+    # Users and OTPs
+    'accounts': ('majority', True),
+    # Queued emails, claimed by several dispatchers
+    'mail': ('majority', True),
+}
+
+_READ_MODES = {
+    'primary': read_preferences.Primary,
+    'primarypreferred': read_preferences.PrimaryPreferred,
+    'secondary': read_preferences.Secondary,
+    'secondarypreferred': read_preferences.SecondaryPreferred,
+    'nearest': read_preferences.Nearest,
+}
+
+# Smallest maxStalenessSeconds MongoDB accepts
+MIN_MAX_STALENESS = 90
+
+
+def _env_int(name):
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def client_options():
+    """
+    MongoClient pool and timeout options from MONGODB_MIN_POOL_SIZE,
+    MONGODB_MAX_POOL_SIZE, MONGODB_MAX_IDLE_TIME_MS,
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS and MONGODB_WAIT_QUEUE_TIMEOUT_MS.
+    Unset variables keep the driver defaults.
+    """
+    options = {
+        'minPoolSize': _env_int('MONGODB_MIN_POOL_SIZE'),
+        'maxPoolSize': _env_int('MONGODB_MAX_POOL_SIZE'),
+        'maxIdleTimeMS': _env_int('MONGODB_MAX_IDLE_TIME_MS'),
+        'serverSelectionTimeoutMS': _env_int('MONGODB_SERVER_SELECTION_TIMEOUT_MS'),
+        'waitQueueTimeoutMS': _env_int('MONGODB_WAIT_QUEUE_TIMEOUT_MS'),
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def _items(spec):
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, value = item.partition('=')
+        yield name.strip(), value.strip()
+
+
+def parse_read_routes(spec):
+    """
+    Parses MONGODB_READ_ROUTING, e.g. 'history=secondaryPreferred:120', on
+    top of DEFAULT_READ_ROUTES. The number is the maximum staleness in
+    seconds; without it secondaries may lag by any amount.
+    """
+    routes = dict(DEFAULT_READ_ROUTES)
+    for operation, value in _items(spec):
+        mode, _, staleness = value.partition(':')
+        mode = mode.lower()
+        if mode not in _READ_MODES:
+            raise ValueError(f"Unknown read preference {mode!r} for {operation}")
+        staleness = int(staleness) if staleness else -1
+        if staleness != -1 and (mode == 'primary' or staleness < MIN_MAX_STALENESS):
+            raise ValueError(
+                f"Max staleness for {operation} needs a non-primary mode and at least {MIN_MAX_STALENESS}s"
+            )
+        routes[operation] = (mode, staleness)
+    return routes
+
+
+def parse_write_concerns(spec):
+    """
+    Parses MONGODB_WRITE_CONCERNS, e.g. 'messages=1,accounts=majority:j', on
+    top of DEFAULT_WRITE_CONCERNS. ':j' waits for the journal.
+    """
+    profiles = dict(DEFAULT_WRITE_CONCERNS)
+    for profile, value in _items(spec):
+        w, _, journal = value.partition(':')
+        profiles[profile] = (int(w) if w.isdigit() else w, journal == 'j')
+    return profiles
+
+
+@functools.lru_cache(maxsize=None)
+def _settings():
+    # Read on first use rather than at import, after .env has been loaded
+    return (
+        parse_read_routes(os.getenv('MONGODB_READ_ROUTING')),
+        parse_write_concerns(os.getenv('MONGODB_WRITE_CONCERNS')),
+        _env_int('MONGODB_WTIMEOUT_MS'),
+    )
+
+
+def read_preference(operation):
+    """The read preference of an operation class, 'default' if unknown."""
+    routes = _settings()[0]
+    mode, staleness = routes.get(operation, routes['default'])
+    if mode == 'primary':
+        return read_preferences.Primary()
+    return _READ_MODES[mode](max_staleness=staleness)
+
+
+def write_concern(profile):
+    """The write concern of a write profile, with MONGODB_WTIMEOUT_MS if set."""
+    _, profiles, wtimeout = _settings()
+    w, journal = profiles[profile]
+    return WriteConcern(w=w, j=journal or None, wtimeout=wtimeout)
@@ -0,0 +1,162 @@
+# backend/outbound_limits.py
+
+import os
+import threading
+from collections import deque
+
+from engineio import packet as eio_packet
+from socketio import packet as sio_packet
+
+
+class _Backlog:
+    __slots__ = ('sizes', 'bytes', 'dropped')
+
+    def __init__(self):
+        # Sizes of the packets we queued that the transport has not taken
+        # yet, oldest first.
+        self.sizes = deque()
+        self.bytes = 0
+        self.dropped = 0
+
+
+class OutboundLimiter:
+    """
+    Per-connection accounting of outbound Socket.IO frames.
+
+    Every packet the server hands to engine.io is counted against the
+    connection it is for. Packets leave the count once the transport has
+    taken them from the connection's queue. A client that falls behind by
+    more than `max_messages` packets or `max_bytes` bytes is handled by
+    `policy`:
+
+    - 'drop_oldest': the oldest queued messages are discarded, down to half
+      of the limits, and a `resync_required` event is sent in their place
+    - 'disconnect': the connection is closed
+    """
+
+    def __init__(self, max_messages=1000, max_bytes=1024 * 1024, policy='drop_oldest'):
+        if policy not in ('drop_oldest', 'disconnect'):
+            raise ValueError(f"Unknown outbound policy: {policy}")
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.dropped = 0
+        self.disconnects = 0
+        self._backlogs = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._send = None
+
+    def install(self, server):
+        """Hooks the limiter into a python-socketio Server."""
+        self._server = server
+        self._send = server._send_eio_packet
+        server._send_eio_packet = self._send_eio_packet
+
+    @staticmethod
+    def _size(pkt):
+        data = pkt.data
+        return len(data) if isinstance(data, (str, bytes)) else 64
+
+    def _reconcile(self, backlog, depth):
+        # The transport drains the queue from the front; anything beyond the
+        # current depth has been sent.
+        while len(backlog.sizes) > depth:
+            backlog.bytes -= backlog.sizes.popleft()
+
+    def _send_eio_packet(self, eio_sid, pkt):
+        try:
+            socket = self._server.eio._get_socket(eio_sid)
+        except KeyError:
+            with self._lock:
+                self._backlogs.pop(eio_sid, None)
+            return self._send(eio_sid, pkt)
+
+        size = self._size(pkt)
+        with self._lock:
+            backlog = self._backlogs.get(eio_sid)
+            if backlog is None:
+                backlog = self._backlogs[eio_sid] = _Backlog()
+            self._reconcile(backlog, socket.queue.qsize())
+            over = (len(backlog.sizes) + 1 > self.max_messages
+                    or backlog.bytes + size > self.max_bytes)
+            if over and self.policy == 'disconnect':
+                self._backlogs.pop(eio_sid, None)
+                self.disconnects += 1
+            elif over:
+                self._drop_oldest(socket, backlog)
+            if not over or self.policy == 'drop_oldest':
+                backlog.sizes.append(size)
+                backlog.bytes += size
+
+        if over and self.policy == 'disconnect':
+            # Closed from a background task: the emit loop calling us must not
+            # run the disconnect handlers, and a stalled transport must not
+            # be waited on.
+            self._server.start_background_task(socket.close, wait=False, abort=True)
+            return
+        return self._send(eio_sid, pkt)
+
+    def _drop_oldest(self, socket, backlog):
+        # Caller holds the lock. Take everything queued, discard the oldest
+        # message packets and put the rest back behind a resync marker.
+        queued = []
+        while True:
+            try:
+                queued.append(socket.queue.get_nowait())
+            except Exception:
+                break
+
+        keep_messages = self.max_messages // 2
+        keep_bytes = self.max_bytes // 2
+        messages = [pkt for pkt in queued if pkt.packet_type == eio_packet.MESSAGE]
+        drop = 0
+        remaining_bytes = sum(self._size(pkt) for pkt in messages)
+        while drop < len(messages) and (len(messages) - drop > keep_messages or remaining_bytes > keep_bytes):
+            remaining_bytes -= self._size(messages[drop])
+            drop += 1
+        dropped = set(id(pkt) for pkt in messages[:drop])
+
+        backlog.dropped += drop
+        self.dropped += drop
+        marker = self._server.packet_class(
+            sio_packet.EVENT,
+            data=['resync_required', {'reason': 'slow_consumer', 'dropped': drop}]
+        )
+        kept = [eio_packet.Packet(eio_packet.MESSAGE, data=marker.encode())]
+        kept.extend(pkt for pkt in queued if id(pkt) not in dropped)
+        for pkt in kept:
+            socket.queue.put(pkt)
+
+        backlog.sizes = deque(self._size(pkt) for pkt in kept)
+        backlog.bytes = sum(backlog.sizes)
+
+    def stats(self):
+        """Queue depth per connection (engine.io sid) plus totals."""
+        with self._lock:
+            connections = {
+                eio_sid: {'messages': len(backlog.sizes), 'bytes': backlog.bytes, 'dropped': backlog.dropped}
+                for eio_sid, backlog in self._backlogs.items()
+            }
+        return {'connections': connections, 'dropped': self.dropped, 'disconnects': self.disconnects}
+
+    def forget(self, eio_sid):
+        with self._lock:
+            self._backlogs.pop(eio_sid, None)
+
+
+def create_outbound_limiter(server):
+    """
+    Installs an OutboundLimiter on a python-socketio Server unless
+    OUTBOUND_MAX_MESSAGES is 0. Returns the limiter or None.
+    """
+    max_messages = int(os.getenv('OUTBOUND_MAX_MESSAGES', 1000))
+    if max_messages <= 0:
+        return None
+    limiter = OutboundLimiter(
+        max_messages=max_messages,
+        max_bytes=int(os.getenv('OUTBOUND_MAX_BYTES', 1024 * 1024)),
+        policy=os.getenv('OUTBOUND_POLICY', 'drop_oldest')
+    )
+    limiter.install(server)
+    return limiter
@@ -0,0 +1,127 @@
+# backend/password_pool.py
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+# werkzeug method string, including the KDF parameters, e.g.
+# 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'. Hashes stored with different
+# parameters are upgraded on the next successful login.
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+PASSWORD_SALT_LENGTH = int(os.getenv('PASSWORD_SALT_LENGTH', 16))
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the pool has no room for another hashing job."""
+
+
+def hash_password(password, method=PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def verify_password(password_hash, password):
+    return check_password_hash(password_hash, password)
+
+
+def _parameters(method):
+    """Splits a werkzeug method string into its parameters, with werkzeug's defaults for omitted ones."""
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        args = [2 ** 15, 8, 1]
+    elif name == 'pbkdf2':
+        args += ['sha256', DEFAULT_PBKDF2_ITERATIONS][len(args):]
+    return (name, *(int(arg) if str(arg).isdigit() else arg for arg in args))
+
+
+def needs_rehash(password_hash, method=PASSWORD_HASH_METHOD):
+    """
+    True if the hash was made with different parameters than `method`.
+
+    Both sides are compared with werkzeug's defaults filled in, so 'scrypt'
+    matches hashes stored as 'scrypt:32768:8:1'.
+    """
+    return _parameters(password_hash.split('$', 1)[0]) != _parameters(method)
+
+
+class PasswordPool:
+    """
+    Runs password hashing and verification in a bounded process pool, away
+    from the GIL of the process serving requests and socket events.
+
+    At most `size` jobs run at once and at most `queue_limit` more may wait.
+    Beyond that, calls fail immediately with PasswordPoolBusy so the caller
+    can answer 503 instead of piling up work. With `size` 0 the work is
+    done inline.
+    """
+
+    def __init__(self, size=2, queue_limit=32, timeout=10.0):
+        self.size = size
+        self.timeout = timeout
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(size + queue_limit) if size else None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the worker processes, forked from the caller. They only run
+        the hashing functions, so they never touch the locks of the caller's
+        other threads (such as the log writer) that a fork copies.
+        """
+        if self.size:
+            executor = self._get_executor()
+            # The executor forks its workers on the first submissions.
+            for future in [executor.submit(abs, 0) for _ in range(self.size)]:
+                future.result()
+
+    def _get_executor(self):
+        # fork keeps worker startup cheap and avoids re-running the app's
+        # entry point, which the spawn start method would import again.
+        with self._lock:
+            if self._executor is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+                self._executor = ProcessPoolExecutor(max_workers=self.size, mp_context=context)
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self.size:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PasswordPoolBusy()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise PasswordPoolBusy()
+
+    def hash(self, password):
+        return self._run(hash_password, password)
+
+    def verify(self, password_hash, password):
+        return self._run(verify_password, password_hash, password)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+
+def create_password_pool():
+    """Builds a PasswordPool configured by PASSWORD_POOL_SIZE, PASSWORD_POOL_QUEUE and PASSWORD_POOL_TIMEOUT."""
+    return PasswordPool(
+        size=int(os.getenv('PASSWORD_POOL_SIZE', min(4, os.cpu_count() or 1))),
+        queue_limit=int(os.getenv('PASSWORD_POOL_QUEUE', 32)),
+        timeout=float(os.getenv('PASSWORD_POOL_TIMEOUT', 10))
+    )
@@ -0,0 +1,265 @@
+# backend/presence.py
+
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import redis
+except ImportError:  # Only needed for the Redis-backed index
+    redis = None
+
+
+class PresenceIndex:
+    """
+    Which users are in which room, counted per session.
+
+    A user is a member of a room while at least one of their sessions (tabs,
+    devices) has joined it. join() and leave() report whether that changed,
+    so callers only announce real membership changes.
+    """
+
+    def join(self, sid, username, roomid):
+        """Adds a session to a room; returns True if the user was not a member yet."""
+        raise NotImplementedError
+
+    def leave(self, sid, roomid):
+        """Removes a session from a room; returns the username if the user is no longer a member, else None."""
+        raise NotImplementedError
+
+    def disconnect(self, sid):
+        """Removes a session from all its rooms; returns the (roomid, username) memberships that ended."""
+        raise NotImplementedError
+
+    def members(self, roomid):
+        raise NotImplementedError
+
+    def count(self, roomid):
+        raise NotImplementedError
+
+
+class MemoryPresenceIndex(PresenceIndex):
+    """
+    Process-local index: a {username: sessions} dict per room, and the rooms
+    of each session for disconnects. Every update is O(1), independent of
+    the size of the room.
+    """
+
+    def __init__(self):
+        self._rooms = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def join(self, sid, username, roomid):
+        with self._lock:
+            rooms = self._sessions.setdefault(sid, {})
+            if roomid in rooms:
+                return False
+            rooms[roomid] = username
+            members = self._rooms.setdefault(roomid, {})
+            count = members.get(username, 0)
+            members[username] = count + 1
+            return count == 0
+
+    def leave(self, sid, roomid):
+        with self._lock:
+            rooms = self._sessions.get(sid)
+            if not rooms or roomid not in rooms:
+                return None
+            username = rooms.pop(roomid)
+            if not rooms:
+                del self._sessions[sid]
+            return username if self._decrement(roomid, username) else None
+
+    def disconnect(self, sid):
+        with self._lock:
+            rooms = self._sessions.pop(sid, {})
+            return [(roomid, username) for roomid, username in rooms.items()
+                    if self._decrement(roomid, username)]
+
+    def members(self, roomid):
+        with self._lock:
+            return list(self._rooms.get(roomid, ()))
+
+    def count(self, roomid):
+        return len(self._rooms.get(roomid, ()))
+
+    def _decrement(self, roomid, username):
+        # Returns True if this was the user's last session in the room
+        members = self._rooms[roomid]
+        count = members[username] - 1
+        if count > 0:
+            members[username] = count
+            return False
+        del members[username]
+        if not members:
+            del self._rooms[roomid]
+        return True
+
+
+class RedisPresenceIndex(PresenceIndex):
+    """
+    Index shared by every worker that points at the same Redis: one hash of
+    {username: sessions} per room and one of {roomid: username} per session.
+    Each update is a single script, so concurrent joins and leaves of the
+    same user on different workers cannot miscount.
+    """
+
+    _JOIN = """
+    if redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2]) == 0 then return 0 end
+    if redis.call('HINCRBY', KEYS[2], ARGV[2], 1) == 1 then return 1 end
+    return 0
+    """
+
+    _LEAVE = """
+    local username = redis.call('HGET', KEYS[1], ARGV[1])
+    if not username then return false end
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    if redis.call('HINCRBY', KEYS[2], username, -1) > 0 then return false end
+    redis.call('HDEL', KEYS[2], username)
+    return username
+    """
+
+    def __init__(self, url, prefix='vibee'):
+        if redis is None:
+            raise RuntimeError("The redis package is required for a Redis presence index")
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._prefix = prefix
+        self._join = self._redis.register_script(self._JOIN)
+        self._leave = self._redis.register_script(self._LEAVE)
+
+    def _room_key(self, roomid):
+        return f'{self._prefix}:room_members:{roomid}'
+
+    def _session_key(self, sid):
+        return f'{self._prefix}:session_rooms:{sid}'
+
+    def join(self, sid, username, roomid):
+        return bool(self._join(keys=[self._session_key(sid), self._room_key(roomid)], args=[roomid, username]))
+
+    def leave(self, sid, roomid):
+        return self._leave(keys=[self._session_key(sid), self._room_key(roomid)], args=[roomid])
+
+    def disconnect(self, sid):
+        ended = []
+        for roomid in self._redis.hkeys(self._session_key(sid)):
+            username = self.leave(sid, roomid)
+            if username is not None:
+                ended.append((roomid, username))
+        return ended
+
+    def members(self, roomid):
+        return self._redis.hkeys(self._room_key(roomid))
+
+    def count(self, roomid):
+        return self._redis.hlen(self._room_key(roomid))
+
+
+class PresenceBroadcaster:
+    """
+    Coalesces membership changes into `presence_delta` events.
+
+    The first change in a room opens a window of `window` seconds, and every
+    change within it is sent in one event:
+        {'roomid': ..., 'joined': [...], 'left': [...], 'count': n}
+    A user who joins and leaves again within the window (a reload, a flaky
+    connection) cancels out and is not sent at all. Clients apply deltas to
+    their snapshot as set operations, so a delta that overlaps the snapshot
+    is harmless.
+    """
+
+    def __init__(self, emit, count=None, window=0.25):
+        self.emit = emit
+        self.count = count
+        self.window = window
+        self.changes = 0
+        self.deltas = 0
+        self._pending = {}  # roomid -> {username: True if joined, False if left}
+        self._deadlines = deque()  # One window for every room, so always in order
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    def joined(self, roomid, username):
+        self._change(roomid, username, True)
+
+    def left(self, roomid, username):
+        self._change(roomid, username, False)
+
+    def _change(self, roomid, username, joined):
+        with self._condition:
+            self.changes += 1
+            changes = self._pending.get(roomid)
+            if changes is None:
+                changes = self._pending[roomid] = {}
+                self._deadlines.append((time.monotonic() + self.window, roomid))
+                self._ensure_thread()
+                self._condition.notify()
+            if changes.get(username) is (not joined):
+                # The opposite change is still pending; together they are none
+                del changes[username]
+            else:
+                changes[username] = joined
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='presence-broadcaster', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    if self._deadlines and (self._stopping or self._deadlines[0][0] <= now):
+                        break
+                    if self._stopping:
+                        return
+                    timeout = self._deadlines[0][0] - now if self._deadlines else None
+                    self._condition.wait(timeout)
+                due = []
+                while self._deadlines and (self._stopping or self._deadlines[0][0] <= now):
+                    _, roomid = self._deadlines.popleft()
+                    due.append((roomid, self._pending.pop(roomid)))
+
+            # Emitted outside the lock by this single thread, so a room's
+            # deltas arrive in order.
+            for roomid, changes in due:
+                if not changes:
+                    continue
+                payload = {
+                    'roomid': roomid,
+                    'joined': [username for username, joined in changes.items() if joined],
+                    'left': [username for username, joined in changes.items() if not joined]
+                }
+                if self.count:
+                    payload['count'] = self.count(roomid)
+                self.deltas += 1
+                self.emit('presence_delta', payload, room=roomid)
+
+    def stop(self):
+        """Sends the pending deltas and stops the flusher thread."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def create_presence_index(url=None):
+    """
+    Builds the presence index selected by PRESENCE_STORE_URL (by default
+    SESSION_STORE_URL): a redis:// URL for an index shared by all workers,
+    or empty for a process-local one.
+    """
+    if url is None:
+        url = os.getenv('PRESENCE_STORE_URL', os.getenv('SESSION_STORE_URL', ''))
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisPresenceIndex(url)
+    return MemoryPresenceIndex()
+
+
+def create_presence_broadcaster(emit, count=None):
+    """Builds a PresenceBroadcaster with the window from PRESENCE_WINDOW (seconds)."""
+    return PresenceBroadcaster(emit, count=count, window=float(os.getenv('PRESENCE_WINDOW', 0.25)))
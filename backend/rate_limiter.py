@@ -0,0 +1,188 @@
+# backend/rate_limiter.py
+
+import os
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # Only needed for the Redis-backed store
+    redis = None
+
+
+# (scope, rate per second, burst) per event. Scopes name the key the bucket
+# is kept under: the socket session, the user (or email), the client IP, and
+# a user at one IP (user_ip), which no other client can drain.
+DEFAULT_RULES = {
+    'send_message': (('sid', 5.0, 20), ('user', 10.0, 40)),
+    'join_room': (('sid', 2.0, 10), ('user', 5.0, 20)),
+    'leave_room': (('sid', 2.0, 10), ('user', 5.0, 20)),
+    'login': (('ip', 10 / 60, 10), ('user_ip', 5 / 60, 5)),
+    'register': (('ip', 5 / 60, 5),),
+    'resend_otp': (('ip', 5 / 60, 5), ('user', 1 / 60, 1)),
+    'search': (('user', 2.0, 10),),
+    'export': (('user', 1 / 60, 3),),
+    'mark_read': (('sid', 2.0, 10),),
+}
+
+
+class RateLimitStore:
+    """
+    Token buckets keyed by string.
+
+    consume_all() takes `cost` tokens from each of several buckets, given as
+    (key, rate, burst) with `rate` tokens per second of refill up to
+    `burst`. It returns 0 if every bucket had the tokens and they were
+    taken; otherwise nothing is taken and it returns the number of seconds
+    until all of them would be available. consume() does the same for one
+    bucket.
+    """
+
+    def consume_all(self, buckets, cost=1):
+        raise NotImplementedError
+
+    def consume(self, key, rate, burst, cost=1):
+        return self.consume_all([(key, rate, burst)], cost)
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """
+    Process-local buckets kept as [tokens, updated_at, full_at] lists in one
+    dict.
+
+    A bucket that has refilled completely is the same as no bucket, so
+    entries are dropped lazily: every `sweep_interval` seconds the next
+    consume_all() removes the buckets that have been idle long enough to be
+    full.
+    """
+
+    def __init__(self, sweep_interval=60.0):
+        self.sweep_interval = sweep_interval
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def consume_all(self, buckets, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            levels = []
+            wait = 0
+            for key, rate, burst in buckets:
+                bucket = self._buckets.get(key)
+                tokens = burst if bucket is None else min(burst, bucket[0] + (now - bucket[1]) * rate)
+                if tokens < cost:
+                    wait = max(wait, (cost - tokens) / rate)
+                levels.append(tokens)
+            if wait:
+                return wait
+            for (key, rate, burst), tokens in zip(buckets, levels):
+                tokens -= cost
+                # Full until the last token is back
+                self._buckets[key] = [tokens, now, now + (burst - tokens) / rate]
+            return 0
+
+    def _sweep(self, now):
+        # Caller holds the lock
+        self._next_sweep = now + self.sweep_interval
+        for key in [key for key, bucket in self._buckets.items() if bucket[2] <= now]:
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """Buckets shared by every worker and node that points at the same Redis."""
+
+    # Refill and check every bucket, then take from all of them or none, in
+    # one round trip. ARGV holds the cost, then rate and burst per key. Keys
+    # expire once their bucket would be full again.
+    SCRIPT = """
+local cost = tonumber(ARGV[1])
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call('HMGET', key, 't', 'u')
+    local tokens = tonumber(bucket[1]) or burst
+    if bucket[2] then
+        tokens = math.min(burst, tokens + (now - tonumber(bucket[2])) * rate)
+    end
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+    levels[i] = tokens
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local tokens = levels[i] - cost
+    redis.call('HSET', key, 't', tokens, 'u', now)
+    redis.call('EXPIRE', key, math.ceil((burst - tokens) / rate) + 1)
+end
+return '0'
+"""
+
+    def __init__(self, url, prefix='vibee:ratelimit'):
+        if redis is None:
+            raise RuntimeError("The redis package is required for a Redis rate limit store")
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(self.SCRIPT)
+        self._prefix = prefix
+
+    def consume_all(self, buckets, cost=1):
+        args = [cost]
+        for _, rate, burst in buckets:
+            args += [rate, burst]
+        return float(self._script(keys=[f'{self._prefix}:{key}' for key, _, _ in buckets], args=args))
+
+
+class RateLimiter:
+    """
+    Applies the token bucket rules of an event to the caller's identities.
+
+    check('send_message', sid=..., user=...) takes one token from the bucket
+    of every scope the event has a rule for and the caller supplied, and
+    returns None. If any of those buckets is empty, no token is taken from
+    any of them, and it returns the seconds to wait until all have one.
+    """
+
+    def __init__(self, store=None, rules=None):
+        self.store = store if store is not None else MemoryRateLimitStore()
+        self.rules = dict(DEFAULT_RULES if rules is None else rules)
+        self.limited = 0
+
+    def check(self, event, **identities):
+        buckets = [
+            (f'{event}:{scope}:{identities[scope]}', rate, burst)
+            for scope, rate, burst in self.rules.get(event, ())
+            if identities.get(scope) is not None
+        ]
+        if not buckets:
+            return None
+        retry_after = self.store.consume_all(buckets)
+        if retry_after:
+            self.limited += 1
+            return retry_after
+        return None
+
+
+def create_rate_limiter(url=None):
+    """
+    Returns a RateLimiter unless RATE_LIMITING is 0, keeping its buckets in
+    Redis when RATE_LIMIT_STORE_URL is a redis:// URL and in memory otherwise.
+    """
+    if os.getenv('RATE_LIMITING', '1').lower() in ('0', 'false', 'no'):
+        return None
+    url = url if url is not None else os.getenv('RATE_LIMIT_STORE_URL', '')
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RateLimiter(RedisRateLimitStore(url))
+    return RateLimiter()
@@ -0,0 +1,93 @@
+# backend/recent_rooms.py
+
+import os
+import threading
+
+import db
+
+
+def _apply(rooms, joined, limit):
+    """Moves each room in `joined` (oldest first) to the front of `rooms`."""
+    for roomid in joined:
+        rooms = [roomid] + [room for room in rooms if room != roomid]
+    return rooms[:limit]
+
+
+class RecentRoomsWriter:
+    """
+    Debounced write-behind for recent-room tracking.
+
+    Joins are collected per user for `flush_interval` seconds; repeated joins
+    by the same user collapse into one move-to-front update, and all users are
+    flushed with a single bulk_write. get() overlays the joins that are not
+    yet written, so a user always reads their own joins. With
+    `flush_interval` 0 every join is written immediately. Rooms are stored
+    through `store`, the db module unless another data layer is set.
+    """
+
+    def __init__(self, flush_interval=2.0, limit=5, store=None):
+        self.store = store if store is not None else db
+        self.flush_interval = flush_interval
+        self.limit = limit
+        self._pending = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def add(self, username, roomid):
+        if self.flush_interval <= 0:
+            return self.store.add_recent_room(username, roomid, self.limit)
+
+        with self._lock:
+            rooms = self._pending.setdefault(username, [])
+            if roomid in rooms:
+                rooms.remove(roomid)
+            rooms.append(roomid)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='recent-rooms-writer', daemon=True)
+                self._thread.start()
+        return True
+
+    def get(self, username):
+        # Taken before the read: a flush that ends in between leaves the
+        # joins in the read, and applying them again changes nothing.
+        with self._lock:
+            joined = self._inflight.get(username, []) + self._pending.get(username, [])
+        rooms = self.store.get_recent_rooms(username, self.limit)
+        return _apply(rooms, joined, self.limit) if joined else rooms
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+            if not batch:
+                return True
+            ok = self.store.add_recent_rooms_bulk(batch, self.limit)
+            with self._lock:
+                if not ok:
+                    # Put the batch back in front of joins that arrived since.
+                    for username, rooms in self._pending.items():
+                        batch[username] = [room for room in batch.get(username, []) if room not in rooms] + rooms
+                    self._pending = batch
+                self._inflight = {}
+            return ok
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+
+
+def create_recent_rooms_writer(store=None, flush_interval=None):
+    """Builds a RecentRoomsWriter, flushing every RECENT_ROOMS_FLUSH_INTERVAL seconds unless given."""
+    if flush_interval is None:
+        flush_interval = float(os.getenv('RECENT_ROOMS_FLUSH_INTERVAL', 2.0))
+    return RecentRoomsWriter(flush_interval=flush_interval, store=store)
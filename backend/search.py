@@ -0,0 +1,70 @@
+# backend/search.py
+
+import re
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+_SUFFIXES = ('ing', 'ed', 'es', 's')
+
+
+def query_terms(query):
+    """
+    Words of a search query as MongoDB's $search reads it, lowercased and
+    without negated words. Phrases in quotes contribute their words.
+    """
+    terms = []
+    for token in re.findall(r'-?"[^"]*"|\S+', query):
+        if token.startswith('-'):
+            continue
+        terms.extend(word.lower() for word in _WORD.findall(token))
+    return terms
+
+
+def _stem(term):
+    # The text index matches word stems; a rough prefix is enough to find
+    # the matching words again for highlighting.
+    for suffix in _SUFFIXES:
+        if term.endswith(suffix) and len(term) - len(suffix) >= 3:
+            term = term[:-len(suffix)]
+            # running -> runn -> run
+            if suffix in ('ing', 'ed') and term[-1] == term[-2] and term[-1] not in 'aeiouls':
+                term = term[:-1]
+            break
+    return term
+
+
+def highlight(text, terms, width=120):
+    """
+    Cuts a snippet of about `width` characters around the first match.
+
+    Args:
+        text (str): The message text.
+        terms (list): Search terms from query_terms.
+        width (int): The approximate snippet length.
+
+    Returns:
+        tuple: The snippet and a list of [start, end) offsets of the matched
+        words within it.
+    """
+    stems = [_stem(term) for term in terms]
+    matches = [
+        (match.start(), match.end()) for match in _WORD.finditer(text)
+        if any(match.group().lower().startswith(stem) for stem in stems)
+    ]
+    if not matches or len(text) <= width:
+        start, end = 0, min(len(text), width)
+    else:
+        first = matches[0][0]
+        start = max(0, min(first - width // 3, len(text) - width))
+        # Start and end the snippet on word boundaries
+        if start > 0:
+            space = text.find(' ', start)
+            start = space + 1 if 0 <= space < first else start
+        end = min(len(text), start + width)
+    snippet = text[start:end]
+    offsets = [[s - start, e - start] for s, e in matches if s >= start and e <= end]
+    if start > 0:
+        snippet = '…' + snippet
+        offsets = [[s + 1, e + 1] for s, e in offsets]
+    if end < len(text):
+        snippet += '…'
+    return snippet, offsets
@@ -0,0 +1,81 @@
+# backend/serialization.py
+
+import json
+
+try:
+    import orjson
+except ImportError:  # Fall back to the standard library encoder
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(obj):
+        """Encodes `obj` as compact UTF-8 JSON bytes."""
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+else:
+    def dumps(obj):
+        """Encodes `obj` as compact UTF-8 JSON bytes."""
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+    loads = json.loads
+
+
+class SocketJSON:
+    """json-module stand-in for python-socketio, backed by the fast encoder."""
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return dumps(obj).decode()
+
+    @staticmethod
+    def loads(data, **kwargs):
+        return loads(data)
+
+
+class SerializedMessage:
+    """
+    A chat message in the shape sent to clients, computed once.
+
+    `payload` is the dict for Socket.IO events and `encoded` its JSON form,
+    used to assemble REST history pages without re-encoding. `id` and
+    `timestamp` are kept raw for pagination cursors.
+    """
+
+    __slots__ = ('id', 'timestamp', 'payload', 'encoded')
+
+    def __init__(self, document):
+        self.id = document['_id']
+        self.timestamp = document['timestamp']
+        self.payload = {
+            'id': str(document['_id']),
+            'username': document['username'],
+            'message': document['message'],
+            'timestamp': document['timestamp'].isoformat() + 'Z'
+        }
+        self.encoded = dumps(self.payload)
+
+    def cursor_fields(self):
+        """The fields db.encode_cursor needs."""
+        return {'_id': self.id, 'timestamp': self.timestamp}
+
+
+def serialize_messages(documents):
+    return [SerializedMessage(document) for document in documents]
+
+
+def encode_history_page(messages, next_cursor=None):
+    """
+    Assembles the /api/messages response body from pre-encoded messages.
+
+    Returns:
+        bytes: The JSON body.
+    """
+    return b''.join((
+        b'{"messages":[',
+        b','.join(message.encoded for message in messages),
+        b'],"next_cursor":',
+        dumps(next_cursor),
+        b'}'
+    ))
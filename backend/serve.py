@@ -0,0 +1,47 @@
+# backend/serve.py
+"""
+Production entry point using gevent cooperative concurrency.
+
+All blocking I/O (pymongo, SMTP, Redis) is monkey-patched before the app is
+imported, so every connection is a greenlet instead of an OS thread and one
+worker can hold tens of thousands of idle websocket connections.
+
+Requires gevent (pip install gevent; gevent-websocket is optional).
+
+Usage:
+    python serve.py
+"""
+
+from gevent import monkey
+
+# Must run before anything imports socket, ssl or threading.
+monkey.patch_all()
+
+import os  # noqa: E402
+import resource  # noqa: E402
+
+os.environ['SOCKETIO_ASYNC_MODE'] = 'gevent'
+
+from app import create_app, socketio  # noqa: E402
+
+
+def raise_fd_limit():
+    """Raises the open-file limit to the hard limit; each connection holds one."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        target = 1048576 if hard == resource.RLIM_INFINITY else hard
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError) as e:
+            print(f"Could not raise the open-file limit: {e}")
+
+
+if __name__ == '__main__':
+    raise_fd_limit()
+    app = create_app()
+    socketio.run(
+        app,
+        host=os.getenv('HOST', '127.0.0.1'),
+        port=int(os.getenv('PORT', 5000)),
+        log_output=False
+    )
@@ -0,0 +1,137 @@
+# backend/session_store.py
+
+import os
+import threading
+
+try:
+    import redis
+except ImportError:  # Only needed for the Redis-backed store
+    redis = None
+
+
+class SessionStore:
+    """
+    Maps Socket.IO session ids to usernames and tracks which users are online.
+
+    A user counts as online while at least one of their sessions is connected,
+    so several tabs or devices per user are handled.
+    """
+
+    def add(self, sid, username):
+        raise NotImplementedError
+
+    def get(self, sid):
+        raise NotImplementedError
+
+    def remove(self, sid):
+        """Removes a session and returns its username, or None."""
+        raise NotImplementedError
+
+    def is_online(self, username):
+        raise NotImplementedError
+
+    def online_users(self):
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store. Shared by every server created in one process."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._presence = {}
+        self._lock = threading.Lock()
+
+    def add(self, sid, username):
+        with self._lock:
+            previous = self._sessions.get(sid)
+            if previous == username:
+                return
+            if previous is not None:
+                self._decrement(previous)
+            self._sessions[sid] = username
+            self._presence[username] = self._presence.get(username, 0) + 1
+
+    def get(self, sid):
+        return self._sessions.get(sid)
+
+    def remove(self, sid):
+        with self._lock:
+            username = self._sessions.pop(sid, None)
+            if username is not None:
+                self._decrement(username)
+            return username
+
+    def is_online(self, username):
+        return username in self._presence
+
+    def online_users(self):
+        with self._lock:
+            return list(self._presence)
+
+    def _decrement(self, username):
+        count = self._presence.get(username, 0) - 1
+        if count > 0:
+            self._presence[username] = count
+        else:
+            self._presence.pop(username, None)
+
+
+class RedisSessionStore(SessionStore):
+    """Store shared by every worker and node that points at the same Redis."""
+
+    def __init__(self, url, prefix='vibee'):
+        if redis is None:
+            raise RuntimeError("The redis package is required for a Redis session store")
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._sessions_key = f'{prefix}:sessions'
+        self._presence_key = f'{prefix}:presence'
+
+    def add(self, sid, username):
+        previous = self._redis.hget(self._sessions_key, sid)
+        if previous == username:
+            return
+        pipe = self._redis.pipeline()
+        if previous is not None:
+            pipe.hincrby(self._presence_key, previous, -1)
+        pipe.hset(self._sessions_key, sid, username)
+        pipe.hincrby(self._presence_key, username, 1)
+        pipe.execute()
+
+    def get(self, sid):
+        return self._redis.hget(self._sessions_key, sid)
+
+    def remove(self, sid):
+        pipe = self._redis.pipeline()
+        pipe.hget(self._sessions_key, sid)
+        pipe.hdel(self._sessions_key, sid)
+        username, removed = pipe.execute()
+        if username is not None and removed:
+            if self._redis.hincrby(self._presence_key, username, -1) <= 0:
+                # Only delete the counter if no other session raced in.
+                self._redis.eval(
+                    "if tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or 0) <= 0 then "
+                    "return redis.call('HDEL', KEYS[1], ARGV[1]) end return 0",
+                    1, self._presence_key, username
+                )
+        return username
+
+    def is_online(self, username):
+        return int(self._redis.hget(self._presence_key, username) or 0) > 0
+
+    def online_users(self):
+        return [
+            username for username, count in self._redis.hgetall(self._presence_key).items()
+            if int(count) > 0
+        ]
+
+
+def create_session_store(url=None):
+    """
+    Builds the session store selected by SESSION_STORE_URL: a redis:// URL
+    for a shared store, or empty for a process-local one.
+    """
+    url = url if url is not None else os.getenv('SESSION_STORE_URL', '')
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisSessionStore(url)
+    return MemorySessionStore()
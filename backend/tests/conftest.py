@@ -0,0 +1,60 @@
+# backend/tests/conftest.py
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import app as chat_app  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+
+TEST_CONFIG = {
+    'DATA_STORE': 'memory://',
+    'JWT_SECRET_KEY': 'test-secret-0123456789abcdef0123456789',
+    'WARM_UP': False,
+}
+
+
+@pytest.fixture
+def app_factory():
+    """Builds apps on their own in-memory data store; keyword arguments override the test config."""
+    def build(**config):
+        return chat_app.create_app({**TEST_CONFIG, **config})
+    return build
+
+
+@pytest.fixture
+def app(app_factory):
+    return app_factory()
+
+
+@pytest.fixture
+def chat(app):
+    return app.extensions['vibee']
+
+
+@pytest.fixture
+def token(app):
+    def issue(username):
+        with app.app_context():
+            return create_access_token(identity=username)
+    return issue
+
+
+@pytest.fixture
+def socket_client(app, token):
+    clients = []
+
+    def connect(username):
+        client = chat_app.socketio.test_client(app, auth={'token': token(username)})
+        clients.append(client)
+        return client
+    yield connect
+    for client in clients:
+        if client.is_connected():
+            client.disconnect()
@@ -0,0 +1,57 @@
+# backend/tests/test_app_factory.py
+
+import pytest
+
+import app as chat_app
+from data_store import MemoryDataStore
+
+
+def fetch(app, token, roomid):
+    response = app.test_client().get(f'/api/messages/{roomid}', headers={'Authorization': f'Bearer {token}'})
+    return [message['message'] for message in response.get_json()['messages']]
+
+
+def test_each_app_has_its_own_services_and_store(app_factory):
+    first, second = app_factory(), app_factory()
+    chat = first.extensions['vibee']
+    assert chat is not second.extensions['vibee']
+    assert chat.store is not second.extensions['vibee'].store
+
+    chat.store.save_message('factory-room', 'ana', 'hello')
+    assert second.extensions['vibee'].store.get_messages('factory-room') == []
+    with first.app_context():
+        assert chat_app.services() is chat
+
+
+def test_apps_do_not_share_caches_or_writers(app_factory, token):
+    first = app_factory()
+    first.extensions['vibee'].store.save_message('factory-room', 'ana', 'hello')
+    assert fetch(first, token('ana'), 'factory-room') == ['hello']
+
+    # A second app, even one set up for several workers, leaves the first alone
+    second = app_factory(SOCKETIO_MESSAGE_QUEUE='memory://')
+    assert fetch(second, token('ana'), 'factory-room') == []
+    chat, other = first.extensions['vibee'], second.extensions['vibee']
+    assert chat.history_cache.enabled and not other.history_cache.enabled
+    assert chat.recent_rooms_writer.flush_interval > 0
+    assert other.recent_rooms_writer.flush_interval == 0
+    assert chat.recent_rooms_writer.store is chat.store
+    assert other.recent_rooms_writer.store is other.store
+
+
+def test_password_pool_starts_on_first_use(app_factory):
+    chat = app_factory().extensions['vibee']
+    assert 'password_pool' not in chat.__dict__
+    assert chat.password_pool.verify(chat.password_pool.hash('secret'), 'secret')
+
+
+def test_bucketed_storage_needs_search_turned_off(app_factory, token):
+    store = MemoryDataStore()
+    store.MESSAGE_STORAGE = 'buckets'
+    with pytest.raises(ValueError):
+        app_factory(DATA_STORE=store)
+
+    app = app_factory(DATA_STORE=store, MESSAGE_SEARCH=False)
+    response = app.test_client().get('/api/search?roomid=lobby&q=hello',
+                                     headers={'Authorization': f"Bearer {token('ana')}"})
+    assert response.status_code == 501
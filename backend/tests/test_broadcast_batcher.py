@@ -0,0 +1,44 @@
+# backend/tests/test_broadcast_batcher.py
+
+import threading
+
+from broadcast_batcher import BroadcastBatcher
+
+
+def test_concurrent_publishes_to_a_quiet_room_keep_their_order():
+    delivered = []
+    batcher = None
+
+    def emit(event, data, room=None):
+        if data == 'first':
+            # Another publisher gets in while the first frame is being sent
+            second = threading.Thread(target=batcher.publish, args=('quiet', 'second'))
+            second.start()
+            second.join(1)
+        delivered.append(data)
+
+    batcher = BroadcastBatcher(emit)
+    batcher.publish('quiet', 'first')
+    batcher.stop()
+    assert delivered == ['first', 'second']
+
+
+def test_batches_follow_immediate_frames_still_being_sent():
+    delivered = []
+    batcher = None
+
+    def emit(event, data, room=None):
+        if data == 'first':
+            # The room turns hot meanwhile; its batch must wait for this frame
+            batcher.hot_rate = 1.0
+            second = threading.Thread(target=batcher.publish, args=('room', 'second'))
+            second.start()
+            second.join(1)
+            # Long enough for the batch window to close
+            threading.Event().wait(0.05)
+        delivered.append(data if event == 'receive_message' else data['messages'])
+
+    batcher = BroadcastBatcher(emit, min_window=0.001, max_window=0.001)
+    batcher.publish('room', 'first')
+    batcher.stop()
+    assert delivered == ['first', ['second']]
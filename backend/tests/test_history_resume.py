@@ -0,0 +1,113 @@
+# backend/tests/test_history_resume.py
+
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+import app as chat_app
+from history_cache import HistoryCache
+from serialization import serialize_messages
+
+
+def messages(roomid, count):
+    started = datetime.utcnow()
+    return serialize_messages({
+        '_id': ObjectId(),
+        'roomid': roomid,
+        'username': 'resume-writer',
+        'message': f'm{i}',
+        'timestamp': started + timedelta(milliseconds=i)
+    } for i in range(count))
+
+
+def texts(page):
+    return [message.payload['message'] for message in page]
+
+
+def test_cache_returns_the_messages_after_the_last_one_seen():
+    cache = HistoryCache(per_room=10)
+    history = messages('resume-room', 5)
+    cache.fill('resume-room', history[:3], requested=10)
+    for message in history[3:]:
+        cache.append('resume-room', message)
+
+    assert texts(cache.get_since('resume-room', history[1].id)) == ['m2', 'm3', 'm4']
+    assert cache.get_since('resume-room', history[4].id) == []
+
+
+def test_cache_misses_when_the_message_left_the_buffer():
+    cache = HistoryCache(per_room=3)
+    history = messages('resume-room', 5)
+    cache.fill('resume-room', history, requested=10)
+
+    # Only m2..m4 are buffered; the caller falls back to the data store
+    assert cache.get_since('resume-room', history[0].id) is None
+    assert cache.get_since('resume-room', ObjectId()) is None
+    assert cache.get_since('other-room', history[4].id) is None
+    assert cache.misses == 3
+
+
+def received(client, event):
+    return [item['args'][0] for item in client.get_received() if item['name'] == event]
+
+
+def test_rejoin_with_since_gets_only_the_missed_messages(socket_client):
+    sender = socket_client('resume-sender')
+    sender.emit('join_room', {'roomid': 'resume-live'})
+    for i in range(3):
+        sender.emit('send_message', {'roomid': 'resume-live', 'message': f'm{i}'})
+    listener = socket_client('resume-listener')
+    listener.emit('join_room', {'roomid': 'resume-live'})
+    last_seen = received(listener, 'previous_messages')[0]['messages'][-1]['id']
+    listener.disconnect()
+
+    for i in range(3, 5):
+        sender.emit('send_message', {'roomid': 'resume-live', 'message': f'm{i}'})
+    listener = socket_client('resume-listener')
+    listener.emit('join_room', {'roomid': 'resume-live', 'since': last_seen})
+    page, = received(listener, 'previous_messages')
+    assert page['since'] == last_seen
+    assert [msg['message'] for msg in page['messages']] == ['m3', 'm4']
+    assert 'gap' not in page
+
+
+def test_unknown_message_or_long_gap_gets_a_fresh_page(socket_client, monkeypatch):
+    sender = socket_client('gap-sender')
+    sender.emit('join_room', {'roomid': 'resume-gap'})
+    for i in range(4):
+        sender.emit('send_message', {'roomid': 'resume-gap', 'message': f'm{i}'})
+    sent = [item['id'] for item in received(sender, 'receive_message')]
+
+    listener = socket_client('gap-listener')
+    listener.emit('join_room', {'roomid': 'resume-gap', 'since': str(ObjectId())})
+    page, = received(listener, 'previous_messages')
+    assert page['gap'] is True
+    assert [msg['message'] for msg in page['messages']] == ['m0', 'm1', 'm2', 'm3']
+
+    monkeypatch.setattr(chat_app, 'RESUME_MAX_MESSAGES', 2)
+    listener.emit('join_room', {'roomid': 'resume-gap', 'since': sent[0]})
+    page, = received(listener, 'previous_messages')
+    assert page['gap'] is True
+    assert len(page['messages']) == 4
+
+
+def test_resync_required_is_answered_by_a_rejoin_from_the_last_message(socket_client):
+    sender = socket_client('resync-sender')
+    sender.emit('join_room', {'roomid': 'resume-resync'})
+    sender.emit('send_message', {'roomid': 'resume-resync', 'message': 'm0'})
+    listener = socket_client('resync-listener')
+    listener.emit('join_room', {'roomid': 'resume-resync'})
+    last_seen = received(listener, 'previous_messages')[0]['messages'][-1]['id']
+
+    # The outbound limiter dropped these frames and sent resync_required;
+    # the client, still connected, rejoins with the last message it has
+    for i in range(1, 4):
+        sender.emit('send_message', {'roomid': 'resume-resync', 'message': f'm{i}'})
+    listener.get_received()
+    listener.emit('join_room', {'roomid': 'resume-resync', 'since': last_seen})
+    page, = received(listener, 'previous_messages')
+    assert [msg['message'] for msg in page['messages']] == ['m1', 'm2', 'm3']
+
+    # Joining again does not double the live delivery
+    sender.emit('send_message', {'roomid': 'resume-resync', 'message': 'm4'})
+    assert [msg['message'] for msg in received(listener, 'receive_message')] == ['m4']
@@ -0,0 +1,81 @@
+# backend/tests/test_inprocess_manager.py
+
+import json
+import queue
+import uuid
+
+import pytest
+import socketio
+
+from inprocess_manager import InProcessManager
+
+
+class Node:
+    """A Socket.IO server attached to a channel, recording what it would send."""
+
+    def __init__(self, channel):
+        self.server = socketio.Server(async_mode='threading', client_manager=InProcessManager(channel))
+        self.sent = queue.Queue()
+        # No transport: capture the packets written to each connection
+        self.server._send_eio_packet = self.record
+        self.server.manager.initialize()
+
+    def record(self, eio_sid, eio_packet):
+        event, *args = json.loads(eio_packet.data[eio_packet.data.index('['):])
+        self.sent.put((eio_sid, event, args))
+
+    def connect(self, name, room):
+        sid = self.server.manager.connect(name, '/')
+        self.server.enter_room(sid, room)
+        return sid
+
+    def deliveries(self):
+        """Everything sent until the 'done' marker: (connection, message) pairs."""
+        received = []
+        while True:
+            eio_sid, event, args = self.sent.get(timeout=5)
+            if event == 'done':
+                return received
+            received.append((eio_sid, args[0]))
+
+
+@pytest.fixture
+def nodes():
+    channel = f'test-{uuid.uuid4().hex}'
+    yield Node(channel), Node(channel)
+    InProcessManager.reset()
+
+
+def finish(node, *sids):
+    # Queued behind the test emits, so the marker arrives after them
+    for sid in sids:
+        node.server.emit('done', to=sid)
+
+
+def test_room_emit_reaches_clients_on_every_node(nodes):
+    a, b = nodes
+    ana = a.connect('ana', 'lobby')
+    bo = b.connect('bo', 'lobby')
+    b.connect('cy', 'elsewhere')
+
+    a.server.emit('receive_message', 'hello', room='lobby', skip_sid=ana)
+    finish(a, ana, bo)
+
+    assert a.deliveries() == []
+    assert b.deliveries() == [('bo', 'hello')]
+
+
+def test_skip_sid_and_to_address_clients_on_another_node(nodes):
+    a, b = nodes
+    ana = a.connect('ana', 'lobby')
+    bo = b.connect('bo', 'lobby')
+    cy = b.connect('cy', 'lobby')
+
+    a.server.emit('receive_message', 'not for bo', room='lobby', skip_sid=bo)
+    a.server.emit('receive_message', 'just for cy', to=cy)
+    finish(a, ana, cy)
+
+    assert a.deliveries() == [('ana', 'not for bo')]
+    # bo's connection gets nothing; its 'done' marker was never sent either
+    assert b.deliveries() == [('cy', 'not for bo'), ('cy', 'just for cy')]
+    assert b.sent.empty()
@@ -0,0 +1,110 @@
+# backend/tests/test_mail_outbox.py
+
+import time
+
+import mail_dispatcher
+from data_store import MemoryDataStore
+from mail_dispatcher import MailDispatcher
+
+
+def test_expired_leases_count_as_attempts_until_the_email_is_parked():
+    store = MemoryDataStore()
+    store.enqueue_mail('ana@example.com', 'Your code', '123456')
+    # A worker that dies while sending never reschedules; the lease just expires
+    for attempt in range(1, 4):
+        claimed = store.claim_mail(10, lease_seconds=-1, max_attempts=3)
+        assert [document['attempts'] for document in claimed] == [attempt]
+
+    assert store.claim_mail(10, lease_seconds=-1, max_attempts=3) == []
+    document, = store._outbox.values()
+    assert document['status'] == 'failed'
+    assert document['attempts'] == 3
+
+
+def test_reschedule_does_not_count_the_attempt_twice():
+    store = MemoryDataStore()
+    store.enqueue_mail('ana@example.com', 'Your code', '123456')
+    claimed, = store.claim_mail(10)
+    store.reschedule_mail(claimed['_id'], claimed['next_attempt_at'], 'connection reset')
+    claimed, = store.claim_mail(10)
+    assert claimed['attempts'] == 2
+
+
+class FakeConnection:
+    def __init__(self, fail_on=None, error=OSError('connection reset')):
+        self.fail_on = fail_on
+        self.error = error
+        self.messages = []
+
+    def send(self, message):
+        if message['To'] == self.fail_on:
+            raise self.error
+        self.messages.append(message)
+
+    def close(self):
+        pass
+
+
+def dispatcher(store):
+    return MailDispatcher('smtp.example.com', 587, 'noreply@example.com', store=store)
+
+
+def outbox(store):
+    return {document['recipient']: document for document in store._outbox.values()}
+
+
+def test_a_dropped_connection_only_charges_the_email_that_was_tried():
+    store = MemoryDataStore()
+    for recipient in ('ana@example.com', 'bo@example.com', 'cy@example.com'):
+        store.enqueue_mail(recipient, 'Your code', '123456')
+    batch = store.claim_mail(10)
+
+    dispatcher(store)._send_batch(FakeConnection(fail_on='bo@example.com'), batch)
+
+    documents = outbox(store)
+    assert documents['ana@example.com']['status'] == 'sent'
+    assert documents['bo@example.com']['status'] == 'pending'
+    assert documents['bo@example.com']['attempts'] == 1
+    assert documents['cy@example.com']['status'] == 'pending'
+    assert documents['cy@example.com']['attempts'] == 0
+
+
+def test_an_unexpected_error_reschedules_the_email_and_sends_the_rest():
+    store = MemoryDataStore()
+    for recipient in ('ana@example.com', 'bo@example.com'):
+        store.enqueue_mail(recipient, 'Your code', '123456')
+    batch = store.claim_mail(10)
+    connection = FakeConnection(fail_on='ana@example.com', error=ValueError('bad header'))
+
+    dispatcher(store)._send_batch(connection, batch)
+
+    documents = outbox(store)
+    assert documents['ana@example.com']['status'] == 'pending'
+    assert documents['ana@example.com']['last_error'] == 'bad header'
+    assert documents['bo@example.com']['status'] == 'sent'
+
+
+def test_the_worker_survives_store_errors(monkeypatch):
+    class FlakyStore(MemoryDataStore):
+        failures = 1
+
+        def claim_mail(self, *args, **kwargs):
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError('server selection timeout')
+            return super().claim_mail(*args, **kwargs)
+
+    monkeypatch.setattr(mail_dispatcher, 'SMTPConnection', lambda **options: FakeConnection())
+    store = FlakyStore()
+    worker = MailDispatcher('smtp.example.com', 587, 'noreply@example.com', workers=1,
+                            poll_interval=0.01, store=store)
+    worker.start()
+    try:
+        worker.enqueue('ana@example.com', 'Your code', '123456')
+        deadline = time.monotonic() + 5
+        while worker.sent == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        worker.stop()
+    assert store.failures == 0
+    assert outbox(store)['ana@example.com']['status'] == 'sent'
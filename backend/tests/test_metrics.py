@@ -0,0 +1,19 @@
+# backend/tests/test_metrics.py
+
+
+def render(app):
+    return app.test_client().get('/metrics').get_data(as_text=True)
+
+
+def test_history_cache_stats_reach_metrics(app):
+    body = render(app)
+    for name in ('vibee_history_cache_hits', 'vibee_history_cache_misses', 'vibee_history_cache_evictions',
+                 'vibee_history_cache_rooms', 'vibee_history_cache_bytes'):
+        assert f'\n{name} ' in body
+
+
+def test_token_cache_stats_reach_metrics(app):
+    body = render(app)
+    for name in ('vibee_token_cache_hits', 'vibee_token_cache_misses', 'vibee_token_cache_evictions',
+                 'vibee_token_cache_entries'):
+        assert f'\n{name} ' in body
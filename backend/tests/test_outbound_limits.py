@@ -0,0 +1,118 @@
+# backend/tests/test_outbound_limits.py
+
+import json
+import queue
+from types import SimpleNamespace
+
+from engineio import packet as eio_packet
+from socketio import packet as sio_packet
+
+from outbound_limits import OutboundLimiter, _Backlog
+
+
+class StalledSocket:
+    """An engine.io socket whose transport never takes anything from its queue."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.closed = False
+
+    def close(self, wait=True, abort=False):
+        self.closed = True
+
+
+class FakeServer:
+    packet_class = sio_packet.Packet
+
+    def __init__(self):
+        self.sockets = {}
+        self.tasks = []
+        self.eio = SimpleNamespace(_get_socket=self.sockets.__getitem__)
+
+    def _send_eio_packet(self, eio_sid, pkt):
+        self.sockets[eio_sid].queue.put(pkt)
+
+    def start_background_task(self, target, *args, **kwargs):
+        self.tasks.append(target)
+        target(*args, **kwargs)
+
+
+def message(text):
+    return eio_packet.Packet(eio_packet.MESSAGE, data=f'2["receive_message","{text}"]')
+
+
+def queued(socket):
+    """The queued events as (name, argument) pairs, oldest first."""
+    events = []
+    while not socket.queue.empty():
+        name, argument = json.loads(socket.queue.get_nowait().data[1:])
+        events.append((name, argument))
+    return events
+
+
+def limited_server(**options):
+    server = FakeServer()
+    limiter = OutboundLimiter(max_bytes=1024 * 1024, **options)
+    limiter.install(server)
+    return server, limiter
+
+
+def test_drop_oldest_keeps_the_newest_messages_behind_a_resync_marker():
+    server, limiter = limited_server(max_messages=10, policy='drop_oldest')
+    socket = server.sockets['slow'] = StalledSocket()
+    for i in range(11):
+        server._send_eio_packet('slow', message(f'm{i}'))
+
+    # Down to half the limit, then the new message
+    assert queued(socket) == [
+        ('resync_required', {'reason': 'slow_consumer', 'dropped': 5}),
+        *(('receive_message', f'm{i}') for i in range(5, 11)),
+    ]
+    stats = limiter.stats()
+    assert stats['dropped'] == 5
+    assert (stats['connections']['slow']['messages'], stats['connections']['slow']['dropped']) == (7, 5)
+    assert not socket.closed
+
+
+def test_disconnect_closes_the_connection_instead_of_queueing():
+    server, limiter = limited_server(max_messages=3, policy='disconnect')
+    socket = server.sockets['slow'] = StalledSocket()
+    for i in range(4):
+        server._send_eio_packet('slow', message(f'm{i}'))
+
+    # Closed from a background task, not by the emitting thread
+    assert server.tasks == [socket.close] and socket.closed
+    assert [argument for _, argument in queued(socket)] == ['m0', 'm1', 'm2']
+    assert limiter.stats() == {'connections': {}, 'dropped': 0, 'disconnects': 1}
+
+
+def test_a_client_that_keeps_up_is_never_limited():
+    server, limiter = limited_server(max_messages=3, policy='disconnect')
+    socket = server.sockets['fast'] = StalledSocket()
+    received = []
+    for i in range(20):
+        server._send_eio_packet('fast', message(f'm{i}'))
+        received.extend(argument for _, argument in queued(socket))
+
+    assert received == [f'm{i}' for i in range(20)]
+    assert not socket.closed
+    assert limiter.stats()['disconnects'] == 0
+
+
+def test_backlog_is_forgotten_on_disconnect(chat, socket_client):
+    limiter = chat.outbound_limiter
+    client = socket_client('outbound-user')
+    # The test client has no engine.io transport, so the send path never
+    # creates a backlog; plant one as a real connection would have.
+    eio_sid = client.eio_sid
+    limiter._backlogs[eio_sid] = _Backlog()
+
+    client.disconnect()
+    assert eio_sid not in limiter.stats()['connections']
+
+
+def test_outbound_stats_reach_metrics(app):
+    body = app.test_client().get('/metrics').get_data(as_text=True)
+    for name in ('vibee_outbound_queued_messages', 'vibee_outbound_max_queue_depth',
+                 'vibee_outbound_dropped_messages', 'vibee_outbound_disconnects'):
+        assert f'\n{name} ' in body
@@ -0,0 +1,18 @@
+# backend/tests/test_password_pool.py
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+
+from password_pool import hash_password, needs_rehash
+
+
+def test_needs_rehash_compares_parameters_with_defaults_filled_in():
+    stored = hash_password('secret', method='pbkdf2:sha256:1000')
+    assert not needs_rehash(stored, 'pbkdf2:sha256:1000')
+    assert needs_rehash(stored, 'pbkdf2')
+    assert needs_rehash(stored, 'scrypt')
+
+    stored = hash_password('secret', method='scrypt:1024:8:1')
+    assert not needs_rehash(stored, 'scrypt:1024:8:1')
+    assert needs_rehash(stored, 'scrypt')
+    assert not needs_rehash('scrypt:32768:8:1$salt$hash', 'scrypt')
+    assert not needs_rehash(f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}$salt$hash', 'pbkdf2:sha256')
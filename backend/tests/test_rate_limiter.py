@@ -0,0 +1,21 @@
+# backend/tests/test_rate_limiter.py
+
+from rate_limiter import DEFAULT_RULES, MemoryRateLimitStore, RateLimiter
+
+
+def test_denied_check_takes_no_tokens():
+    limiter = RateLimiter(MemoryRateLimitStore(), rules={'send': (('sid', 0.001, 5), ('user', 0.001, 1))})
+    assert limiter.check('send', sid='s1', user='ana') is None
+    # The user bucket is empty; the session bucket must keep its 4 tokens
+    for _ in range(10):
+        assert limiter.check('send', sid='s1', user='ana')
+    for _ in range(4):
+        assert limiter.check('send', sid='s1') is None
+    assert limiter.check('send', sid='s1')
+
+
+def test_failed_logins_from_another_ip_do_not_lock_the_user_out():
+    limiter = RateLimiter(MemoryRateLimitStore(), rules={'login': DEFAULT_RULES['login']})
+    for _ in range(20):
+        limiter.check('login', ip='203.0.113.9', user_ip='victim|203.0.113.9')
+    assert limiter.check('login', ip='198.51.100.4', user_ip='victim|198.51.100.4') is None
@@ -0,0 +1,74 @@
+# backend/tests/test_read_state.py
+
+from datetime import timedelta
+
+from db import build_message
+
+
+def received(client, event):
+    return [item['args'][0] for item in client.get_received() if item['name'] == event]
+
+
+def test_mark_read_moves_the_unread_count_forward_only(chat, socket_client):
+    def unread(username):
+        return chat.store.get_unread_counts(username, ['unread-room'])
+
+    writer = socket_client('unread-writer')
+    writer.emit('join_room', {'roomid': 'unread-room'})
+    for i in range(3):
+        writer.emit('send_message', {'roomid': 'unread-room', 'message': f'm{i}'})
+    ids = [message['id'] for message in received(writer, 'receive_message')]
+
+    reader = socket_client('unread-reader')
+    reader.emit('join_room', {'roomid': 'unread-room'})
+    assert unread('unread-reader') == {'unread-room': 3}
+
+    reader.emit('mark_read', {'roomid': 'unread-room', 'id': ids[0]})
+    assert unread('unread-reader') == {'unread-room': 2}
+
+    # Without an id the whole room is read; an older id does not undo that
+    reader.emit('mark_read', {'roomid': 'unread-room'})
+    reader.emit('mark_read', {'roomid': 'unread-room', 'id': ids[1]})
+    assert unread('unread-reader') == {'unread-room': 0}
+
+    writer.emit('send_message', {'roomid': 'unread-room', 'message': 'm3'})
+    assert unread('unread-reader') == {'unread-room': 1}
+    # The sender's own reads are tracked separately
+    assert unread('unread-writer') == {'unread-room': 4}
+
+
+def test_mark_read_rejects_an_invalid_message_id(socket_client):
+    reader = socket_client('unread-invalid')
+    reader.emit('mark_read', {'roomid': 'unread-room', 'id': 'not-an-id'})
+    assert received(reader, 'error') == [{'msg': 'Invalid message ID'}]
+
+
+def test_rooms_without_a_cursor_count_every_message(chat):
+    store = chat.store
+    for i in range(2):
+        store.save_message('unread-counted', 'unread-writer', f'm{i}')
+    assert store.get_unread_counts('unread-nobody', ['unread-counted', 'unread-empty']) == {
+        'unread-counted': 2, 'unread-empty': 0
+    }
+
+
+def test_newest_message_marks_room_read_when_numbered_out_of_order(chat):
+    store = chat.store
+    # Two concurrent sends: the later timestamp got the lower number
+    first = build_message('read-room', 'read-writer', 'first')
+    second = build_message('read-room', 'read-writer', 'second')
+    second['timestamp'] = first['timestamp'] + timedelta(milliseconds=1)
+    first['seq'], second['seq'] = 2, 1
+    store.advance_sequence('read-room', 2)
+    assert store.save_messages([first, second]) == []
+
+    # The client reports the last message it received
+    assert store.mark_read('read-reader', 'read-room', second['_id']) == 2
+    assert store.get_unread_counts('read-reader', ['read-room']) == {'read-room': 0}
+
+
+def test_older_message_keeps_its_number(chat):
+    store = chat.store
+    messages = [store.save_message('read-room-2', 'read-writer', f'm{i}') for i in range(3)]
+    assert store.mark_read('read-reader', 'read-room-2', messages[0]['_id']) == messages[0]['seq']
+    assert store.get_unread_counts('read-reader', ['read-room-2']) == {'read-room-2': 2}
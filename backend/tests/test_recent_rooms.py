@@ -0,0 +1,27 @@
+# backend/tests/test_recent_rooms.py
+
+from data_store import MemoryDataStore
+from recent_rooms import RecentRoomsWriter
+
+
+class FlushDuringRead(MemoryDataStore):
+    """Lets a flush finish right after get_recent_rooms has read."""
+
+    writer = None
+
+    def get_recent_rooms(self, username, limit=5):
+        rooms = super().get_recent_rooms(username, limit)
+        self.writer.flush()
+        return rooms
+
+
+def test_get_sees_own_join_when_a_flush_ends_during_the_read():
+    store = FlushDuringRead()
+    store.save_user('recent-user', 'recent@example.com', None, password_hash='x')
+    writer = store.writer = RecentRoomsWriter(flush_interval=60, store=store)
+    try:
+        writer.add('recent-user', 'lobby')
+        assert writer.get('recent-user') == ['lobby']
+        assert store.get_recent_rooms('recent-user') == ['lobby']
+    finally:
+        writer.stop()
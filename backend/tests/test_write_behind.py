@@ -0,0 +1,82 @@
+# backend/tests/test_write_behind.py
+
+import threading
+import time
+
+from message_writer import MessageWriter
+
+
+class BlockingStore:
+    """Delegates to a store, holding save_messages until released."""
+
+    def __init__(self, store):
+        self.store = store
+        self.release = threading.Event()
+
+    def save_messages(self, documents):
+        self.release.wait(5)
+        return self.store.save_messages(documents)
+
+
+def received(client, event):
+    return [item['args'][0] for item in client.get_received() if item['name'] == event]
+
+
+def test_join_during_flush_window_sees_flushed_messages(chat, socket_client):
+    store = BlockingStore(chat.store)
+    writer = MessageWriter(flush_interval=0.01, store=store)
+    writer.start()
+    previous = chat.__dict__.get('message_writer')
+    chat.__dict__['message_writer'] = writer
+    try:
+        sender = socket_client('wb-sender')
+        for i in range(3):
+            sender.emit('send_message', {'roomid': 'wb-room', 'message': f'm{i}'})
+
+        # Nothing is saved yet; the first join fills the history cache
+        early = socket_client('wb-early')
+        early.emit('join_room', {'roomid': 'wb-room'})
+        page = received(early, 'previous_messages')[0]
+        assert [msg['message'] for msg in page['messages']] == ['m0', 'm1', 'm2']
+
+        store.release.set()
+        deadline = time.monotonic() + 5
+        while writer.pending() or writer.unsaved('wb-room'):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert [msg['message'] for msg in chat.store.get_messages('wb-room')] == ['m0', 'm1', 'm2']
+
+        late = socket_client('wb-late')
+        late.emit('join_room', {'roomid': 'wb-room'})
+        page = received(late, 'previous_messages')[0]
+        assert [msg['message'] for msg in page['messages']] == ['m0', 'm1', 'm2']
+    finally:
+        writer.stop()
+        if previous is None:
+            chat.__dict__.pop('message_writer', None)
+        else:
+            chat.__dict__['message_writer'] = previous
+
+
+class FailingStore:
+    def save_messages(self, documents):
+        return list(documents)
+
+
+def test_failure_callback_runs_without_the_writer_lock():
+    calls = []
+
+    def on_failure(document):
+        # The callback may block on a socket; the writer must stay usable
+        acquired = writer._lock.acquire(blocking=False)
+        if acquired:
+            writer._lock.release()
+        calls.append((document['_id'], acquired))
+
+    writer = MessageWriter(flush_interval=0.01, max_retries=0, retry_delay=0,
+                           on_failure=on_failure, store=FailingStore())
+    writer._flush([{'_id': 1, 'roomid': 'wb-room', 'message': 'lost'}])
+
+    assert calls == [(1, True)]
+    assert list(writer.failed) == [1]
+    assert writer.unsaved('wb-room') == []
@@ -0,0 +1,118 @@
+# backend/token_cache.py
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask_jwt_extended import JWTManager
+from flask_jwt_extended.exceptions import RevokedTokenError
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of verified JWT claims, keyed by a SHA-256 digest of the
+    encoded token.
+
+    An entry is dropped once the token's `exp` passes, or after `max_ttl`
+    seconds if that comes first, so a cached token is never accepted after it
+    would have failed verification. `is_revoked(claims)` is consulted on every
+    lookup, hit or miss, so revocation takes effect immediately.
+    """
+
+    def __init__(self, max_entries=10000, max_ttl=300, is_revoked=None):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.is_revoked = is_revoked
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(encoded_token):
+        if isinstance(encoded_token, str):
+            encoded_token = encoded_token.encode()
+        return hashlib.sha256(encoded_token).digest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, expires_at = entry
+            if now >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return claims
+
+    def put(self, key, claims):
+        expires_at = time.time() + self.max_ttl
+        if 'exp' in claims:
+            expires_at = min(expires_at, claims['exp'])
+        with self._lock:
+            self._entries[key] = (claims, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class CachingJWTManager(JWTManager):
+    """
+    JWTManager that remembers verified claims, so socket reconnects and
+    jwt_required routes skip signature verification for tokens seen before.
+
+    Only plain decodes are cached; CSRF-checked and allow_expired decodes
+    always go through full verification.
+    """
+
+    def __init__(self, app=None, token_cache=None, **kwargs):
+        self.token_cache = token_cache or TokenCache(
+            max_entries=int(os.getenv('TOKEN_CACHE_SIZE', 10000)),
+            max_ttl=int(os.getenv('TOKEN_CACHE_TTL', 300))
+        )
+        super().__init__(app, **kwargs)
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        if csrf_value is not None or allow_expired or not self.token_cache.max_entries:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        cache = self.token_cache
+        key = cache.digest(encoded_token)
+        claims = cache.get(key)
+        if claims is None:
+            claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+            cache.put(key, claims)
+
+        if cache.is_revoked and cache.is_revoked(claims):
+            cache.discard(key)
+            raise RevokedTokenError({}, claims)
+        # Callers may annotate the claims; keep the cached copy pristine.
+        return dict(claims)
@@ -0,0 +1,81 @@
+# backend/user_cache.py
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class UserCache:
+    """
+    TTL + LRU cache of user lookups, keyed by (view, username).
+
+    Each projection-specific accessor in db.py caches under its own view name.
+    Every write that changes a user must call invalidate(username), which
+    drops all views of that user at once. Missing users are never cached.
+    """
+
+    def __init__(self, max_entries=10000, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._views = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, view, username):
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((view, username))
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((view, username))
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, view, username, value):
+        if not self.enabled or value is None:
+            return
+        with self._lock:
+            key = (view, username)
+            self._entries[key] = (dict(value), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            self._views.setdefault(username, set()).add(view)
+            while len(self._entries) > self.max_entries:
+                (old_view, old_username), _ = self._entries.popitem(last=False)
+                views = self._views.get(old_username)
+                if views is not None:
+                    views.discard(old_view)
+                    if not views:
+                        del self._views[old_username]
+
+    def invalidate(self, username):
+        with self._lock:
+            for view in self._views.pop(username, ()):
+                self._entries.pop((view, username), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._views.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# Used by db.py, so shared by every app in the process that uses MongoDB. It
+# only sees writes made through this process and is off by default when
+# workers share a message queue.
+user_cache = UserCache(
+    max_entries=int(os.getenv('USER_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('USER_CACHE_TTL', 0 if os.getenv('SOCKETIO_MESSAGE_QUEUE') else 30))
+)
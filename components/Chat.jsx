@@ -19,10 +19,12 @@ function Chat() {
 
   const messagesEndRef = useRef(null);
   const messagesContainerRef = useRef(null);
+  const lastMessageIdRef = useRef(null);
 
   const [hasMore, setHasMore] = useState(true);
   const [loading, setLoading] = useState(false);
-  const [offset, setOffset] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [members, setMembers] = useState([]);
   const limit = 50; // Number of messages to fetch per request
 
   useEffect(() => {
@@ -50,26 +52,58 @@ function Chat() {
       transports: ['websocket', 'polling'],
     });
 
+    // Id of the newest message we have, so a reconnect only fetches what was missed
+    lastMessageIdRef.current = null;
+
+    // Report what we have read, at most once a second
+    let markReadTimer = null;
+    const scheduleMarkRead = () => {
+      if (markReadTimer) return;
+      markReadTimer = setTimeout(() => {
+        markReadTimer = null;
+        socket.emit('mark_read', { roomid, id: lastMessageIdRef.current });
+      }, 1000);
+    };
+
     socket.on('connect', () => {
       console.log('Connected to Socket.IO server');
-      socket.emit('join_room', { roomid });
+      socket.emit('join_room', { roomid, since: lastMessageIdRef.current });
     });
 
-    // Receive past messages
+    // Receive past messages: either the missed messages after a reconnect
+    // (`since` is set) or a full page that replaces what we have
     socket.on('previous_messages', (data) => {
       if (data.messages && Array.isArray(data.messages)) {
-        setMessages(data.messages);
-        setOffset(offset + limit);
-        if (data.messages.length < limit) {
-          setHasMore(false);
+        if (data.since) {
+          setMessages((prev) => {
+            const known = new Set(prev.map((msg) => msg.id));
+            const merged = [...prev, ...data.messages.filter((msg) => !known.has(msg.id))];
+            // After a resync the missed messages may arrive after newer ones.
+            // Compare parsed times: a whole-second ISO timestamp has no
+            // fraction and would sort after later ones as a string.
+            return merged.sort((a, b) => (
+              new Date(a.timestamp) - new Date(b.timestamp) || (a.id < b.id ? -1 : a.id > b.id ? 1 : 0)
+            ));
+          });
+        } else {
+          setMessages(data.messages);
+          setNextCursor(data.next_cursor);
+          setHasMore(Boolean(data.next_cursor));
+        }
+        if (data.messages.length > 0) {
+          lastMessageIdRef.current = data.messages[data.messages.length - 1].id;
         }
+        scheduleMarkRead();
         scrollToBottom();
       }
     });
 
     // Receive new messages
     socket.on('receive_message', (data) => {
+      lastMessageIdRef.current = data.id;
+      scheduleMarkRead();
       setMessages((prev) => [...prev, {
+        id: data.id,
         username: data.username,
         message: data.message,
         timestamp: data.timestamp,
@@ -77,14 +111,35 @@ function Chat() {
       scrollToBottom();
     });
 
-    // Receive join room announcements
-    socket.on('join_room_announcement', (data) => {
-      setMessages((prev) => [...prev, {
-        username: data.username,
-        message: data.message,
-        timestamp: new Date().toISOString(),
-      }]);
-      scrollToBottom();
+    // Receive a burst of new messages from a busy room, in order
+    socket.on('receive_messages', (data) => {
+      if (data.messages && data.messages.length > 0) {
+        lastMessageIdRef.current = data.messages[data.messages.length - 1].id;
+        scheduleMarkRead();
+        setMessages((prev) => [...prev, ...data.messages]);
+        scrollToBottom();
+      }
+    });
+
+    // The server dropped messages because we fell behind; fetch what we missed
+    socket.on('resync_required', () => {
+      socket.emit('join_room', { roomid, since: lastMessageIdRef.current });
+    });
+
+    // The room's members when we join, then changes to them in batches.
+    // Deltas are applied as set operations, so one that overlaps the
+    // snapshot changes nothing.
+    socket.on('presence_snapshot', (data) => {
+      setMembers([...data.members].sort());
+    });
+
+    socket.on('presence_delta', (data) => {
+      setMembers((prev) => {
+        const next = new Set(prev);
+        data.joined.forEach((member) => next.add(member));
+        data.left.forEach((member) => next.delete(member));
+        return [...next].sort();
+      });
     });
 
     socket.on('error', (data) => {
@@ -92,57 +147,33 @@ function Chat() {
       // Optionally, handle errors (e.g., redirect to login)
     });
 
+    socket.on('rate_limited', (data) => {
+      console.warn(`Rate limited on ${data.event}, retry in ${data.retry_after}s`);
+    });
+
     return () => {
+      clearTimeout(markReadTimer);
       socket.disconnect();
     };
   }, [roomid, navigate, auth.token, logout]);
 
-  useEffect(() => {
-    // Fetch initial messages via API for pagination
-    const fetchInitialMessages = async () => {
-      setLoading(true);
-      const token = auth.token;
-      if (!token) return;
-
-      try {
-        const response = await axios.get(`http://localhost:5000/api/messages/${roomid}?limit=${limit}&offset=${offset}`, {
-          headers: {
-            'Authorization': `Bearer ${token}`,
-          },
-        });
-        const fetchedMessages = response.data.messages;
-        setMessages(fetchedMessages);
-        setOffset(offset + limit);
-        if (fetchedMessages.length < limit) {
-          setHasMore(false);
-        }
-        scrollToBottom();
-      } catch (err) {
-        console.error('Error fetching messages:', err);
-      }
-      setLoading(false);
-    };
-
-    fetchInitialMessages();
-    // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [roomid]);
-
   const loadOlderMessages = async () => {
-    if (loading || !hasMore) return;
+    if (loading || !hasMore || !nextCursor) return;
     setLoading(true);
     const token = auth.token;
     if (!token) return;
 
     try {
-      const response = await axios.get(`http://localhost:5000/api/messages/${roomid}?limit=${limit}&offset=${offset}`, {
+      const response = await axios.get(`http://localhost:5000/api/messages/${roomid}`, {
+        params: { limit, before: nextCursor },
         headers: {
           'Authorization': `Bearer ${token}`,
         },
       });
       const fetchedMessages = response.data.messages;
       setMessages(prev => [...fetchedMessages, ...prev]);
-      setOffset(offset + limit);
-      if (fetchedMessages.length < limit) {
+      setNextCursor(response.data.next_cursor);
+      if (!response.data.next_cursor) {
         setHasMore(false);
       }
     } catch (err) {
@@ -177,9 +208,18 @@ function Chat() {
   return (
     <div className="min-h-screen flex flex-col bg-gray-100 p-6">
       <div className="flex justify-between items-center mb-4">
-        <h1 className="text-2xl">Room: {roomid}</h1>
+        <div>
+          <h1 className="text-2xl">Room: {roomid}</h1>
+          <div className="text-sm text-gray-600" title={members.join(', ')}>
+            {members.length} online
+            {members.length > 0 && `: ${members.slice(0, 10).join(', ')}${members.length > 10 ? ', …' : ''}`}
+          </div>
+        </div>
         <button
-          onClick={() => navigate('/')}
+          onClick={() => {
+            socket.emit('leave_room', { roomid });
+            navigate('/');
+          }}
           className="bg-red-500 text-white px-3 py-1 rounded hover:bg-red-600"
         >
           Leave Room
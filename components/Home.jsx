@@ -11,6 +11,7 @@ function Home() {
   const [username, setUsername] = useState('Guest');
   const [roomid, setRoomid] = useState('');
   const [recentRooms, setRecentRooms] = useState([]);
+  const [unread, setUnread] = useState({});
   const [error, setError] = useState('');
   const navigate = useNavigate();
   const { auth, logout } = useContext(AuthContext);
@@ -40,6 +41,7 @@ function Home() {
           },
         });
         setRecentRooms(response.data.recent_rooms);
+        setUnread(response.data.unread || {});
       } catch (err) {
         console.error('Error fetching recent rooms:', err);
       }
@@ -95,7 +97,14 @@ function Home() {
                 className="bg-white bg-opacity-90 rounded-lg shadow-md p-6 flex flex-col justify-between hover:bg-opacity-100 transition duration-200"
               >
                 <div className="mb-4">
-                  <h3 className="text-xl font-semibold text-gray-800">{room}</h3>
+                  <div className="flex items-center justify-between">
+                    <h3 className="text-xl font-semibold text-gray-800">{room}</h3>
+                    {unread[room] > 0 && (
+                      <span className="bg-red-500 text-white text-sm font-semibold rounded-full px-2 py-0.5">
+                        {unread[room] > 99 ? '99+' : unread[room]}
+                      </span>
+                    )}
+                  </div>
                   <p className="text-gray-600">Join the conversation now!</p>
                 </div>
                 <button